@@ -0,0 +1,357 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+import aiohttp
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from .auth import AuthService, MerchantInfoScanner
+from .auth_cache import AuthCache, MerchantCache
+from .classifier import BonusClassifier
+from .fingerprints import BonusFingerprints
+from .config import AppConfig, Credentials
+from .host_health import HostHealth
+from .logger import Logger
+from .models import AuthData, SiteResult
+from .rate_limit import RateLimiter
+from .scraper import Scraper
+from .storage import Storage
+from .timing import PhaseTimings
+
+_DONE = object() # Queued by run_sites_async's loop thread after the last result
+
+async def limited(rate_limiter: Optional[RateLimiter], url: str, send: Callable[[], Awaitable[aiohttp.ClientResponse]]) -> aiohttp.ClientResponse:
+    """
+    Sends the request made by send() once url's rate limiter slot and token are free, and reports
+    its status back. A throttled request is sent again after its key's pause, up to the limiter's retries.
+    """
+    if not rate_limiter:
+        return await send()
+    await rate_limiter.key_for_async(url) # Resolved off the loop and cached, so observe() does not block
+    attempt = 0
+    while True:
+        async with rate_limiter.slot_async(url):
+            response = await send()
+        throttled = rate_limiter.observe(url, response.status, response.headers.get("Retry-After"))
+        if not throttled or attempt >= rate_limiter.retries:
+            return response
+        response.release()
+        attempt += 1
+
+async def post_json(session: aiohttp.ClientSession, api_url: str, payload: Dict[str, Any], timeout: aiohttp.ClientTimeout, site: Optional[str] = None, rate_limiter: Optional[RateLimiter] = None) -> Dict[str, Any]:
+    # aiohttp only form-encodes strings, requests would have str()-ed e.g. walletIsAdmin=True
+    form = {key: str(value) for key, value in payload.items()}
+    response = await limited(rate_limiter, api_url, lambda: session.post(api_url, data=form, timeout=timeout, trace_request_ctx={"site": site}))
+    async with response:
+        response.raise_for_status()
+        # Merchant APIs do not always send application/json, so skip the content-type check
+        return await response.json(content_type=None)
+
+def client_timeout(request_timeout: float) -> aiohttp.ClientTimeout:
+    # Per-socket limits rather than a total, so time spent queued for a pooled
+    # connection (global / per-host limits) does not count against a site.
+    return aiohttp.ClientTimeout(total=None, sock_connect=request_timeout, sock_read=request_timeout)
+
+def timing_trace_config(timings: PhaseTimings) -> aiohttp.TraceConfig:
+    """
+    Records "dns" and "connect" (TCP + TLS, excluding DNS) spans for new connections, attributed
+    to the site passed as trace_request_ctx={"site": ...}. Reused keep-alive connections record nothing.
+    Every request's network time (sent until its headers are in, less any wait for a pooled
+    connection) goes to record_request.
+    """
+    trace_config = aiohttp.TraceConfig()
+
+    def site_of(ctx) -> str:
+        return (ctx.trace_request_ctx or {}).get("site") or "unknown"
+
+    async def on_request_start(session, ctx, params):
+        ctx.request_started, ctx.queued_seconds = time.perf_counter(), 0.0
+
+    async def on_connection_queued_start(session, ctx, params):
+        ctx.queued_started = time.perf_counter()
+
+    async def on_connection_queued_end(session, ctx, params):
+        ctx.queued_seconds += time.perf_counter() - ctx.queued_started
+
+    async def on_request_end(session, ctx, params):
+        timings.record_request(site_of(ctx), time.perf_counter() - ctx.request_started - ctx.queued_seconds)
+
+    async def on_connection_create_start(session, ctx, params):
+        ctx.connect_started, ctx.dns_seconds = time.perf_counter(), 0.0
+
+    async def on_dns_resolvehost_start(session, ctx, params):
+        ctx.dns_started = time.perf_counter()
+
+    async def on_dns_resolvehost_end(session, ctx, params):
+        ctx.dns_seconds = time.perf_counter() - ctx.dns_started
+        timings.record(site_of(ctx), "dns", ctx.dns_seconds)
+
+    async def on_connection_create_end(session, ctx, params):
+        timings.record(site_of(ctx), "connect", time.perf_counter() - ctx.connect_started - ctx.dns_seconds)
+
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_queued_start.append(on_connection_queued_start)
+    trace_config.on_connection_queued_end.append(on_connection_queued_end)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+    trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    return trace_config
+
+class AsyncAuthService(AuthService):
+    """AuthService that logs in over a shared aiohttp session."""
+    UNREACHABLE_ERRORS = (asyncio.TimeoutError, aiohttp.ClientConnectionError)
+
+    def __init__(self, logger: Logger, session: aiohttp.ClientSession, request_timeout: float, auth_cache: Optional[AuthCache] = None, merchant_cache: Optional[MerchantCache] = None, timings: Optional[PhaseTimings] = None, host_health: Optional[HostHealth] = None, rate_limiter: Optional[RateLimiter] = None):
+        super().__init__(logger, auth_cache=auth_cache, merchant_cache=merchant_cache, timings=timings, request_timeout=request_timeout, host_health=host_health)
+        self.session = session
+        self.rate_limiter = rate_limiter
+
+    async def fetch_merchant_info(self, url: str) -> Tuple[Optional[str], Optional[str]]:
+        cached = self.cached_merchant(url)
+        with self.timings.span(url, "landing_get"): # Until the response headers are in
+            response = await limited(self.rate_limiter, url, lambda: self.session.get(
+                url, headers=self.merchant_request_headers(cached), timeout=client_timeout(self.timeout_for(url)), trace_request_ctx={"site": url}
+            ))
+        async with response:
+            if response.status == 304 and cached:
+                self.logger.emit("merchant_info_cached", {"url": url})
+                return cached["merchant_id"], cached["merchant_name"]
+            response.raise_for_status()
+            body_started = time.perf_counter()
+            scanner = MerchantInfoScanner(response.charset)
+            chunks = response.content.iter_chunked(self.STREAM_CHUNK_SIZE)
+            async for chunk in chunks:
+                if scanner.feed(chunk):
+                    break
+            drained = 0
+            async for chunk in chunks:
+                drained += len(chunk)
+                if drained > self.DRAIN_LIMIT:
+                    break
+            self.record_landing_body(url, body_started, scanner)
+        return self.remember_merchant(url, scanner.result(), response.headers)
+
+    async def merchant_info(self, url: str) -> Union[Tuple[str, str], str, None]:
+        try:
+            merchant_id, merchant_name = await self.fetch_merchant_info(url)
+        except self.UNREACHABLE_ERRORS as e:
+            return self.unresponsive(url, e)
+        except Exception as e:
+            self.logger.emit("exception", {"error": f"Failed to fetch URL {url}: {str(e)}"})
+            return None
+
+        if not merchant_id:
+            self.logger.emit("exception", {"error": f"No merchant ID found for {url}"})
+            return None
+        return merchant_id, merchant_name
+
+    async def login(self, url: str, mobile: str, password: str, merchant: Union[Tuple[str, str], str, None] = None) -> Union[AuthData, str, None]:
+        if merchant is None:
+            merchant = await self.merchant_info(url)
+        if not isinstance(merchant, tuple):
+            return merchant
+        merchant_id, merchant_name = merchant
+
+        api_url = url + self.API_PATH
+        payload = self.login_payload(merchant_id, mobile, password)
+        self.log_login_request(api_url, payload)
+
+        try:
+            with self.timings.span(url, "login_post"):
+                res_json = await post_json(self.session, api_url, payload, client_timeout(self.timeout_for(url)), site=url, rate_limiter=self.rate_limiter)
+            return self.remember(url, mobile, self.parse_login_response(url, api_url, merchant_id, merchant_name, res_json))
+        except self.UNREACHABLE_ERRORS as e:
+            return self.unresponsive(api_url, e)
+        except Exception as e:
+            self.logger.emit("exception", {"error": f"Login failed for {url}: {str(e)}"})
+            return None
+
+class AsyncScraper(Scraper):
+    """Scraper that issues its API calls over a shared aiohttp session. Parsing and CSV output are inherited."""
+    def __init__(self, logger: Logger, request_timeout: float, session: aiohttp.ClientSession, storage: Storage, timings: Optional[PhaseTimings] = None, host_health: Optional[HostHealth] = None, rate_limiter: Optional[RateLimiter] = None, downline_window: int = 1, classifier: Optional[BonusClassifier] = None, fingerprints: Optional[BonusFingerprints] = None):
+        super().__init__(logger, request_timeout, storage=storage, timings=timings, host_health=host_health, downline_window=downline_window, classifier=classifier, fingerprints=fingerprints)
+        self.session = session
+        self.rate_limiter = rate_limiter
+
+    async def _post(self, url: str, auth: AuthData, payload: Dict[str, Any], action: str, phase: str) -> Union[Dict[str, Any], str]:
+        """Posts one API module call, timed as phase. Returns the decoded response or an "UNRESPONSIVE"/"ERROR" sentinel."""
+        if self.logger.enabled("api_request"):
+            self.logger.emit("api_request", {"url": auth.api_url, "module": payload.get("module")})
+        try:
+            with self.timings.span(url, phase):
+                res = await post_json(self.session, auth.api_url, payload, client_timeout(self.timeout_for(url)), site=url, rate_limiter=self.rate_limiter)
+            self.log_api_response(auth.api_url, payload.get("module"), res)
+            return res
+        except asyncio.TimeoutError as e:
+            self.logger.emit("website_unresponsive", {"url": auth.api_url, "error": f"Timeout: {str(e)}"})
+            return "UNRESPONSIVE"
+        except aiohttp.ClientConnectionError as e:
+            self.logger.emit("website_unresponsive", {"url": auth.api_url, "error": f"ConnectionError: {str(e)}"})
+            return "UNRESPONSIVE"
+        except Exception as e: # This includes JSON decode errors if the response is not JSON
+            self.logger.emit("exception", {"error": f"{action} failed for {auth.api_url}: {str(e)}"})
+            return "ERROR"
+
+    async def fetch_downline_page(self, url: str, auth: AuthData, page: int) -> Union[Dict[str, Any], str]:
+        return await self._post(url, auth, self.downline_payload(auth, page), "Downline fetch", "downline_page")
+
+    async def fetch_downlines(self, url: str, auth: AuthData) -> Union[int, str]:
+        """Async counterpart of Scraper.fetch_downlines, with the window of pages as tasks."""
+        total_new_rows = self.store_downline_page(url, await self.fetch_downline_page(url, auth, 0))
+        if isinstance(total_new_rows, str):
+            return total_new_rows
+        if not total_new_rows: # Nothing new since the last run: one request, no window
+            return self.downlines_fetched(url, 0, 1)
+        page = 1
+        window = deque(asyncio.ensure_future(self.fetch_downline_page(url, auth, page + offset)) for offset in range(self.downline_window))
+        try:
+            while True:
+                res = await window.popleft()
+                if not isinstance(res, str) and res.get("status") == "SUCCESS":
+                    window.append(asyncio.ensure_future(self.fetch_downline_page(url, auth, page + self.downline_window)))
+                new_count = self.store_downline_page(url, res)
+                if isinstance(new_count, str):
+                    return new_count
+                if not new_count:
+                    return self.downlines_fetched(url, total_new_rows, page + 1)
+                total_new_rows += new_count
+                page += 1
+        finally:
+            for task in window: # Pages past the end
+                task.cancel()
+            await asyncio.gather(*window, return_exceptions=True)
+
+    async def fetch_bonuses(self, url: str, auth: AuthData, account: str = "") -> Union[Tuple[int, float, dict[str, bool]], str]:
+        res = await self._post(url, auth, self.bonus_payload(auth), "Bonus fetch", "sync_data_post")
+        if isinstance(res, str):
+            return res
+        return self.process_bonus_response(url, auth, res, account)
+
+async def process_account_async(url: str, account: Credentials, config: AppConfig, logger: Logger, auth_service: AsyncAuthService, scraper: AsyncScraper, merchant_for_login: Callable[[], Awaitable[Any]]) -> SiteResult:
+    """Async counterpart of main.process_account."""
+    result = SiteResult(url=url, cleaned_url=url)
+    try:
+        mobile, password = account.mobile, account.password
+        auth_data = auth_service.cached_login(url, mobile)
+        from_cache = auth_data is not None
+        if not from_cache:
+            auth_data = await auth_service.login(url, mobile, password, await merchant_for_login())
+        if not isinstance(auth_data, AuthData):
+            result.errors = 1
+            result.unresponsive = auth_data == "UNRESPONSIVE"
+            logger.emit("exception", {"error": f"Authentication failed for {url} ({account.name})"})
+        else:
+            async def fetch(auth: AuthData):
+                if config.settings.downline_enabled:
+                    return await scraper.fetch_downlines(url, auth)
+                return await scraper.fetch_bonuses(url, auth, account.name)
+
+            fetch_result = await fetch(auth_data)
+            if from_cache and fetch_result == "ERROR":
+                # The cached token was most likely rejected: log in for real and retry once
+                auth_service.invalidate(url, mobile)
+                auth_data = await auth_service.login(url, mobile, password, await merchant_for_login())
+                if isinstance(auth_data, AuthData):
+                    fetch_result = await fetch(auth_data)
+            if config.settings.downline_enabled:
+                result.record_downlines(fetch_result)
+            else:
+                result.record_bonuses(fetch_result)
+    except Exception as e:
+        result.errors = 1
+        logger.emit("exception", {"error": f"Outer loop exception for {url} ({account.name}): {str(e)}"})
+    return result
+
+async def process_site_async(url: str, config: AppConfig, logger: Logger, auth_service: AsyncAuthService, scraper: AsyncScraper, deadline: Optional[float] = None) -> SiteResult:
+    """Async counterpart of main.process_site; the site's accounts run concurrently on the shared session."""
+    site_start_time = time.time()
+    cleaned_url = url
+    result = SiteResult(url=url, cleaned_url=cleaned_url)
+    if deadline is not None and site_start_time >= deadline:
+        result.skipped = True
+        return result
+    merchant_lock = asyncio.Lock()
+    merchant: Dict[str, Any] = {}
+
+    async def merchant_for_login():
+        async with merchant_lock: # The first account to need it fetches the landing page, the rest reuse it
+            if "info" not in merchant:
+                merchant["info"] = await auth_service.merchant_info(cleaned_url)
+            return merchant["info"]
+
+    result.add_accounts(await asyncio.gather(*(
+        process_account_async(cleaned_url, account, config, logger, auth_service, scraper, merchant_for_login)
+        for account in config.accounts
+    )))
+    result.duration = time.time() - site_start_time
+    auth_service.timings.record(cleaned_url, "site_total", result.duration)
+    return result
+
+def run_sites_async(urls: List[str], config: AppConfig, logger: Logger, request_timeout: float, storage: Storage, auth_cache: Optional[AuthCache] = None, merchant_cache: Optional[MerchantCache] = None, timings: Optional[PhaseTimings] = None, host_health: Optional[HostHealth] = None, deadline: Optional[float] = None, rate_limiter: Optional[RateLimiter] = None, fingerprints: Optional[BonusFingerprints] = None) -> Iterator[SiteResult]:
+    """
+    Processes every site on a single event loop and yields SiteResults in urls order.
+
+    All sites are scheduled up front; at most max_in_flight are active at once and the
+    connector caps open connections globally (max_in_flight) and per host (per_host_limit).
+    The loop runs in its own thread and hands finished results over through a queue, so
+    requests stay in flight while the caller merges and displays results synchronously.
+    Closing the generator cancels the sites still running.
+    """
+    timings = timings or PhaseTimings(logger)
+    results: "queue.SimpleQueue" = queue.SimpleQueue()
+    loop = asyncio.new_event_loop()
+
+    async def run_all() -> None:
+        connector = aiohttp.TCPConnector(
+            limit=config.settings.max_in_flight, limit_per_host=config.settings.per_host_limit,
+            force_close=not config.http.keep_alive
+        )
+        async with aiohttp.ClientSession(connector=connector, trace_configs=[timing_trace_config(timings)]) as session:
+            auth_service = AsyncAuthService(logger, session, request_timeout, auth_cache, merchant_cache, timings, host_health, rate_limiter)
+            scraper = AsyncScraper(logger, request_timeout, session, storage, timings, host_health, rate_limiter, config.settings.downline_window, BonusClassifier(config.categories), fingerprints)
+            site_slots = asyncio.Semaphore(config.settings.max_in_flight)
+
+            async def bounded(url: str) -> SiteResult:
+                async with site_slots:
+                    return await process_site_async(url, config, logger, auth_service, scraper, deadline)
+
+            tasks = [asyncio.ensure_future(bounded(url)) for url in urls]
+            try:
+                for task in tasks:
+                    results.put(await task)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    runner = loop.create_task(run_all())
+
+    def run_loop() -> None:
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(runner)
+            results.put(_DONE)
+        except BaseException as e: # Raised to the caller, as if the loop ran in its thread
+            results.put(e)
+        finally:
+            loop.close()
+
+    thread = threading.Thread(target=run_loop, name="AsyncEngine", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        if thread.is_alive():
+            try:
+                loop.call_soon_threadsafe(runner.cancel)
+            except RuntimeError: # The loop closed in the meantime
+                pass
+        thread.join()
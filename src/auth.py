@@ -1,15 +1,80 @@
 import re
+import time
 import requests
-from typing import Optional
+from typing import Any, Dict, Mapping, Optional, Tuple, Union
 from .models import AuthData
 from .logger import Logger
+from .http_pool import SessionPool
+from .auth_cache import AuthCache, MerchantCache
+from .host_health import HostHealth
+from .timing import PhaseTimings
+
+MERCHANT_INFO_PATTERN = r'var MERCHANTID = (\d+);\s*var MERCHANTNAME = "(.*?)";'
+
+class MerchantInfoScanner:
+    """Searches a landing page for the MERCHANTID/MERCHANTNAME constants as it streams in."""
+    PATTERN = re.compile(MERCHANT_INFO_PATTERN.encode())
+    OVERLAP = 512 # Bytes re-scanned from the previous chunk in case the pattern straddles two chunks
+
+    def __init__(self, encoding: Optional[str]):
+        self.encoding = encoding or "utf-8"
+        self.buffer = bytearray()
+        self.match = None
+        self.scan_seconds = 0.0 # Time spent in the regex, as opposed to waiting for chunks
+
+    def feed(self, chunk: bytes) -> bool:
+        """Adds a chunk and returns True once the constants have been found."""
+        started = time.perf_counter()
+        start = max(0, len(self.buffer) - self.OVERLAP)
+        self.buffer += chunk
+        self.match = self.PATTERN.search(self.buffer, start)
+        self.scan_seconds += time.perf_counter() - started
+        return self.match is not None
+
+    def result(self) -> Tuple[Optional[str], Optional[str]]:
+        if not self.match:
+            return None, None
+        return tuple(group.decode(self.encoding, errors="replace") for group in self.match.groups())
 
 class AuthService:
     """Manages authentication and URL processing."""
     API_PATH = "/api/v1/index.php"
+    STREAM_CHUNK_SIZE = 8192
+    # After the constants are found, read at most this much more so the keep-alive
+    # connection can be reused for the login POST; bigger pages are cut off instead.
+    DRAIN_LIMIT = 32 * 1024
+    UNREACHABLE_ERRORS = (requests.exceptions.Timeout, requests.exceptions.ConnectionError)
 
-    def __init__(self, logger: Logger):
+    def __init__(self, logger: Logger, session_pool: Optional[SessionPool] = None, auth_cache: Optional[AuthCache] = None, merchant_cache: Optional[MerchantCache] = None, timings: Optional[PhaseTimings] = None, request_timeout: Optional[float] = None, host_health: Optional[HostHealth] = None):
         self.logger = logger
+        self.session_pool = session_pool or SessionPool()
+        self.auth_cache = auth_cache
+        self.merchant_cache = merchant_cache
+        self.timings = timings or PhaseTimings(logger)
+        self.request_timeout = request_timeout
+        self.host_health = host_health
+
+    def timeout_for(self, url: str) -> Optional[float]:
+        return self.host_health.timeout_for(url) if self.host_health else self.request_timeout
+
+    def cached_login(self, url: str, mobile: str) -> Optional[AuthData]:
+        """Returns the AuthData saved by a previous login for this site/account, if still within its TTL."""
+        if not self.auth_cache:
+            return None
+        auth = self.auth_cache.get(url, mobile)
+        if auth:
+            self.logger.emit("login_cached", {"url": url})
+        return auth
+
+    def remember(self, url: str, mobile: str, auth: Optional[AuthData]) -> Optional[AuthData]:
+        if auth and self.auth_cache:
+            self.auth_cache.put(url, mobile, auth)
+        return auth
+
+    def invalidate(self, url: str, mobile: str) -> None:
+        if self.auth_cache:
+            self.auth_cache.invalidate(url, mobile)
+            self.logger.emit("auth_token_rejected", {"url": url})
 
     @staticmethod
     def clean_url(url: str) -> str:
@@ -17,25 +82,105 @@ class AuthService:
 
     @staticmethod
     def extract_merchant_info(html: str) -> tuple[Optional[str], Optional[str]]:
-        match = re.search(r'var MERCHANTID = (\d+);\s*var MERCHANTNAME = "(.*?)";', html)
+        match = re.search(MERCHANT_INFO_PATTERN, html)
         return match.groups() if match else (None, None)
 
-    def login(self, url: str, mobile: str, password: str) -> Optional[AuthData]:
-        try:
-            response = requests.get(url)
+    def cached_merchant(self, url: str) -> Optional[Dict[str, Any]]:
+        return self.merchant_cache.get(url) if self.merchant_cache else None
+
+    def merchant_request_headers(self, cached: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        return MerchantCache.conditional_headers(cached) if cached else {}
+
+    def record_landing_body(self, url: str, started: float, scanner: MerchantInfoScanner) -> None:
+        """Splits the time since started into body transfer ("landing_body") and regex ("merchant_regex")."""
+        elapsed = time.perf_counter() - started
+        self.timings.record(url, "landing_body", max(0.0, elapsed - scanner.scan_seconds))
+        self.timings.record(url, "merchant_regex", scanner.scan_seconds)
+
+    def remember_merchant(self, url: str, merchant_info: Tuple[Optional[str], Optional[str]], headers: Mapping[str, str]) -> Tuple[Optional[str], Optional[str]]:
+        merchant_id, merchant_name = merchant_info
+        if merchant_id and self.merchant_cache:
+            self.merchant_cache.put(url, merchant_id, merchant_name, headers.get("ETag"), headers.get("Last-Modified"))
+        return merchant_info
+
+    def fetch_merchant_info(self, url: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Returns (merchant_id, merchant_name) for a site. A cached entry is revalidated with a
+        conditional GET; otherwise the landing page is streamed only until the constants appear.
+        """
+        cached = self.cached_merchant(url)
+        with self.timings.span(url, "landing_get"): # Until the response headers are in
+            response = self.session_pool.get(url, headers=self.merchant_request_headers(cached), stream=True, timeout=self.timeout_for(url), site=url)
+        with response:
+            if response.status_code == 304 and cached:
+                self.logger.emit("merchant_info_cached", {"url": url})
+                return cached["merchant_id"], cached["merchant_name"]
             response.raise_for_status()
-            html = response.text
+            body_started = time.perf_counter()
+            scanner = MerchantInfoScanner(response.encoding)
+            chunks = response.iter_content(chunk_size=self.STREAM_CHUNK_SIZE)
+            for chunk in chunks:
+                if scanner.feed(chunk):
+                    break
+            drained = 0
+            for chunk in chunks:
+                drained += len(chunk)
+                if drained > self.DRAIN_LIMIT:
+                    break
+            self.record_landing_body(url, body_started, scanner)
+        return self.remember_merchant(url, scanner.result(), response.headers)
+
+    def merchant_info(self, url: str) -> Union[Tuple[str, str], str, None]:
+        """(merchant_id, merchant_name), "UNRESPONSIVE" if the site could not be reached, otherwise None."""
+        try:
+            merchant_id, merchant_name = self.fetch_merchant_info(url)
+        except self.UNREACHABLE_ERRORS as e:
+            return self.unresponsive(url, e)
         except Exception as e:
             self.logger.emit("exception", {"error": f"Failed to fetch URL {url}: {str(e)}"})
             return None
 
-        merchant_id, merchant_name = self.extract_merchant_info(html)
         if not merchant_id:
             self.logger.emit("exception", {"error": f"No merchant ID found for {url}"})
             return None
+        return merchant_id, merchant_name
+
+    def login(self, url: str, mobile: str, password: str, merchant: Union[Tuple[str, str], str, None] = None) -> Union[AuthData, str, None]:
+        """
+        AuthData on success, "UNRESPONSIVE" if the site could not be reached, otherwise None.
+        merchant is a merchant_info() result already fetched for this site (shared by its
+        accounts); without it the landing page is fetched first.
+        """
+        if merchant is None:
+            merchant = self.merchant_info(url)
+        if not isinstance(merchant, tuple):
+            return merchant
+        merchant_id, merchant_name = merchant
 
         api_url = url + self.API_PATH
-        payload = {
+        payload = self.login_payload(merchant_id, mobile, password)
+        self.log_login_request(api_url, payload)
+
+        try:
+            with self.timings.span(url, "login_post"):
+                response = self.session_pool.post(api_url, data=payload, timeout=self.timeout_for(url), site=url)
+                response.raise_for_status()
+                # Assuming the response is JSON. If not, this will raise an error caught by the except block.
+                res_json = response.json() 
+            return self.remember(url, mobile, self.parse_login_response(url, api_url, merchant_id, merchant_name, res_json))
+        except self.UNREACHABLE_ERRORS as e:
+            return self.unresponsive(api_url, e)
+        except Exception as e:
+            self.logger.emit("exception", {"error": f"Login failed for {url}: {str(e)}"})
+            return None
+
+    def unresponsive(self, url: str, error: Exception) -> str:
+        self.logger.emit("website_unresponsive", {"url": url, "error": f"{type(error).__name__}: {str(error)}"})
+        return "UNRESPONSIVE"
+
+    @staticmethod
+    def login_payload(merchant_id: str, mobile: str, password: str) -> Dict[str, str]:
+        return {
             "module": "/users/login",
             "mobile": mobile,
             "password": password,
@@ -46,6 +191,9 @@ class AuthService:
             "walletIsAdmin": ""
         }
 
+    def log_login_request(self, api_url: str, payload: Dict[str, str]) -> None:
+        if not self.logger.enabled("api_request"):
+            return
         # Log the API request with non-sensitive parts of the payload
         self.logger.emit("api_request", {
             "url": api_url,
@@ -54,36 +202,28 @@ class AuthService:
             "mobile": payload.get("mobile") # Non-sensitive identifier
         })
 
-        try:
-            response = requests.post(api_url, data=payload)
-            response.raise_for_status()
-            # Assuming the response is JSON. If not, this will raise an error caught by the except block.
-            res_json = response.json() 
-
-            # Log the API response
-            response_details = {"url": api_url, "action": "login", "status": res_json.get("status")}
-            if res_json.get("status") != "SUCCESS":
-                if res_json.get("message"):
-                    response_details["error_message"] = res_json.get("message")
-                if isinstance(res_json.get("data"), dict) and res_json.get("data", {}).get("description"):
-                     response_details["error_description"] = res_json.get("data").get("description")
-                elif isinstance(res_json.get("data"), str):
-                     response_details["error_data_string"] = res_json.get("data")
-            self.logger.emit("api_response", response_details)
-            
-            data = res_json.get("data", {})
-            if not data.get("token"): # Check based on expected success criteria
-                self.logger.emit("login_failed", {"url": url, "reason": res_json.get("message", "No token in response")})
-                return None
-            
-            self.logger.emit("login_success", {"url": url})
-            return AuthData(
-                merchant_id=merchant_id,
-                merchant_name=merchant_name,
-                access_id=data.get("id"),
-                token=data.get("token"),
-                api_url=api_url
-            )
-        except Exception as e:
-            self.logger.emit("exception", {"error": f"Login failed for {url}: {str(e)}"})
+    def parse_login_response(self, url: str, api_url: str, merchant_id: str, merchant_name: str, res_json: Dict[str, Any]) -> Optional[AuthData]:
+        # Log the API response
+        response_details = {"url": api_url, "action": "login", "status": res_json.get("status")}
+        if res_json.get("status") != "SUCCESS":
+            if res_json.get("message"):
+                response_details["error_message"] = res_json.get("message")
+            if isinstance(res_json.get("data"), dict) and res_json.get("data", {}).get("description"):
+                 response_details["error_description"] = res_json.get("data").get("description")
+            elif isinstance(res_json.get("data"), str):
+                 response_details["error_data_string"] = res_json.get("data")
+        self.logger.emit("api_response", response_details)
+
+        data = res_json.get("data") or {}
+        if not isinstance(data, dict) or not data.get("token"): # Check based on expected success criteria
+            self.logger.emit("login_failed", {"url": url, "reason": res_json.get("message", "No token in response")})
             return None
+
+        self.logger.emit("login_success", {"url": url})
+        return AuthData(
+            merchant_id=merchant_id,
+            merchant_name=merchant_name,
+            access_id=data.get("id"),
+            token=data.get("token"),
+            api_url=api_url
+        )
@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+from .models import AuthData
+from .utils import atomic_write_json
+
+AUTH_CACHE_FILE_PATH = "data/auth_cache.json"
+MERCHANT_CACHE_FILE_PATH = "data/merchant_cache.json"
+
+class _JsonFileCache:
+    """Thread-safe dict persisted as one JSON file, loaded once and written back atomically by save()."""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: Could not read cache file '{self.path}': {e}. Starting with an empty cache.")
+            return {}
+
+    def _entries_to_save(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self._entries)
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = self._entries_to_save()
+            self._dirty = False
+        try:
+            atomic_write_json(self.path, entries, separators=(",", ":"))
+        except Exception as e:
+            print(f"Error: Could not save cache file '{self.path}': {e}")
+
+class AuthCache(_JsonFileCache):
+    """
+    On-disk cache of AuthData per site and account, so a token from a previous run is
+    reused instead of scraping the landing page and posting /users/login again.
+    Entries expire after ttl_seconds; callers drop an entry early when the API rejects it.
+    """
+    def __init__(self, path: str = AUTH_CACHE_FILE_PATH, ttl_seconds: float = 12 * 3600):
+        self.ttl_seconds = ttl_seconds
+        super().__init__(path)
+
+    @staticmethod
+    def _key(url: str, mobile: str) -> str:
+        return f"{mobile}|{url}"
+
+    def get(self, url: str, mobile: str) -> Optional[AuthData]:
+        with self._lock:
+            entry = self._entries.get(self._key(url, mobile))
+            if not entry:
+                return None
+            if time.time() - entry.get("saved_at", 0) > self.ttl_seconds:
+                del self._entries[self._key(url, mobile)]
+                self._dirty = True
+                return None
+            try:
+                return AuthData(**entry["auth"])
+            except (KeyError, TypeError):
+                return None
+
+    def put(self, url: str, mobile: str, auth: AuthData) -> None:
+        with self._lock:
+            self._entries[self._key(url, mobile)] = {"saved_at": time.time(), "auth": auth._asdict()}
+            self._dirty = True
+
+    def invalidate(self, url: str, mobile: str) -> None:
+        with self._lock:
+            if self._entries.pop(self._key(url, mobile), None) is not None:
+                self._dirty = True
+
+    def _entries_to_save(self) -> Dict[str, Dict[str, Any]]:
+        now = time.time()
+        return {k: v for k, v in self._entries.items() if now - v.get("saved_at", 0) <= self.ttl_seconds}
+
+class MerchantCache(_JsonFileCache):
+    """
+    Merchant id/name per cleaned URL together with the landing page's ETag/Last-Modified,
+    so the page can be revalidated with a conditional GET instead of downloaded again.
+    """
+    def __init__(self, path: str = MERCHANT_CACHE_FILE_PATH):
+        super().__init__(path)
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(url)
+            return dict(entry) if entry else None
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url: str, merchant_id: str, merchant_name: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        with self._lock:
+            self._entries[url] = {
+                "merchant_id": merchant_id, "merchant_name": merchant_name,
+                "etag": etag, "last_modified": last_modified, "saved_at": time.time()
+            }
+            self._dirty = True
@@ -0,0 +1,181 @@
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+from .mock_merchant import add_options_arguments
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 # bytes on macOS, KiB elsewhere
+
+def start_mock_server(args: argparse.Namespace) -> Tuple[subprocess.Popen, List[str]]:
+    """Runs src.mock_merchant in its own process, so serving does not compete with the scraper for the GIL."""
+    command = [
+        sys.executable, "-m", "src.mock_merchant", "--hosts", str(args.hosts), "--sites", str(args.sites),
+        "--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+        "--bonuses", str(args.bonuses), "--downline-pages", str(args.downline_pages),
+        "--downlines-per-page", str(args.downlines_per_page), "--page-bytes", str(args.page_bytes), "--seed", str(args.seed)
+    ]
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = subprocess.Popen(command, cwd=package_root, stdout=subprocess.PIPE, text=True)
+    line = server.stdout.readline()
+    if not line:
+        server.kill()
+        raise RuntimeError("Mock merchant server did not start")
+    return server, json.loads(line)["urls"]
+
+def write_workdir(workdir: str, urls: List[str], args: argparse.Namespace) -> None:
+    with open(os.path.join(workdir, "urls.txt"), "w") as f:
+        f.write("\n".join(urls) + "\n")
+    with open(os.path.join(workdir, "config.ini"), "w") as f:
+        f.write(f"""[credentials]
+mobile = 0000000000
+password = benchmark
+
+[settings]
+file = urls.txt
+downline = {args.downline}
+workers = {args.workers}
+engine = {args.engine}
+max_in_flight = {args.max_in_flight}
+per_host_limit = {args.per_host_limit}
+
+[storage]
+backend = {args.backend}
+
+[logging]
+log_file = logs/scrape.log
+log_level = DEBUG
+console = False
+detail = {args.detail}
+""")
+
+def last_events(log_file: str, events: List[str]) -> Dict[str, Dict[str, Any]]:
+    found = {}
+    with open(log_file) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("event") in events:
+                found[record["event"]] = record.get("details", {})
+    return found
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """Scrapes args.sites mock sites with the full main flow in a scratch directory and returns the measurements."""
+    from .main import execute_scraping_logic
+
+    server, urls = start_mock_server(args)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="scraper-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    write_workdir(workdir, urls, args)
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        if args.tracemalloc:
+            tracemalloc.start()
+        started = time.perf_counter()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            execute_scraping_logic()
+        elapsed = time.perf_counter() - started
+        traced_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if args.tracemalloc else None
+        events = last_events("logs/scrape.log", ["job_complete", "timing_summary"])
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        os.chdir(previous_cwd)
+        server.terminate()
+        server.wait()
+
+    job = events.get("job_complete", {})
+    return {
+        "sites": args.sites, "engine": args.engine, "workers": args.workers, "downline": args.downline,
+        "backend": args.backend, "latency": args.latency, "error_rate": args.error_rate,
+        "wall_seconds": round(elapsed, 3),
+        "sites_per_sec": round(args.sites / elapsed, 2) if elapsed else None,
+        "scrape_seconds": round(job.get("duration", 0.0), 3),
+        "errors": job.get("errors_this_run"),
+        "bonuses": job.get("bonuses_fetched_this_run"),
+        "downlines": job.get("downlines_fetched_this_run"),
+        "peak_rss_mb": round(peak_rss_mb(), 1) if resource else None,
+        "tracemalloc_peak_mb": round(traced_peak, 1) if traced_peak is not None else None,
+        "phases": events.get("timing_summary", {}).get("phases", {}),
+        "workdir": workdir,
+    }
+
+def format_results(results: Dict[str, Any]) -> str:
+    lines = [
+        f"{results['sites']} sites, engine={results['engine']} workers={results['workers']} downline={results['downline']} backend={results['backend']}",
+        f"  wall {results['wall_seconds']:.2f}s ({results['sites_per_sec']} sites/sec), scrape loop {results['scrape_seconds']:.2f}s",
+        f"  errors {results['errors']}, bonuses {results['bonuses']}, downlines {results['downlines']}",
+        f"  peak RSS {results['peak_rss_mb']} MB" + (f", tracemalloc peak {results['tracemalloc_peak_mb']} MB" if results['tracemalloc_peak_mb'] is not None else ""),
+        f"  {'phase':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'total s':>10}",
+    ]
+    for phase, stats in results["phases"].items():
+        lines.append(f"  {phase:<16}{stats['count']:>8}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['total_ms'] / 1000:>10.2f}")
+    return "\n".join(lines)
+
+def regressions(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Differences from a previous --json result that exceed tolerance (0.3 = 30%)."""
+    found = []
+    if baseline.get("sites_per_sec") and results["sites_per_sec"] < baseline["sites_per_sec"] * (1 - tolerance):
+        found.append(f"sites/sec {results['sites_per_sec']} vs baseline {baseline['sites_per_sec']}")
+    if baseline.get("peak_rss_mb") and results["peak_rss_mb"] and results["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        found.append(f"peak RSS {results['peak_rss_mb']} MB vs baseline {baseline['peak_rss_mb']} MB")
+    for phase, stats in results["phases"].items():
+        base = baseline.get("phases", {}).get(phase)
+        if base and base.get("p95_ms") and stats["p95_ms"] > base["p95_ms"] * (1 + tolerance) and stats["p95_ms"] - base["p95_ms"] > 1.0:
+            found.append(f"{phase} p95 {stats['p95_ms']} ms vs baseline {base['p95_ms']} ms")
+    return found
+
+def main():
+    """python -m src.benchmark --sites 200 [--engine asyncio] [--json out.json] [--baseline old.json]"""
+    parser = argparse.ArgumentParser(description="Runs the full scraping flow against local mock merchants.")
+    parser.add_argument("--sites", type=int, default=100)
+    parser.add_argument("--hosts", type=int, help="Loopback addresses to spread the sites over (default: one per site up to 250 on Linux, else 1)")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--max-in-flight", type=int, default=200)
+    parser.add_argument("--per-host-limit", type=int, default=4)
+    parser.add_argument("--downline", action="store_true", help="Fetch downlines instead of bonuses")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--detail", default="MORE", help="[logging] detail for the run")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report the Python heap peak (slows the run down)")
+    parser.add_argument("--workdir", help="Directory for config, logs and data (default: a new temp dir)")
+    parser.add_argument("--json", dest="json_path", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results of an earlier --json run; exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed slowdown against the baseline (default 0.3)")
+    add_options_arguments(parser)
+    args = parser.parse_args()
+    if args.hosts is None:
+        args.hosts = min(args.sites, 250) if sys.platform == "linux" else 1
+
+    results = run_benchmark(args)
+    print(format_results(results))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for regression in found:
+            print(f"REGRESSION: {regression}")
+        if found:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
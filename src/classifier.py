@@ -0,0 +1,47 @@
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Bonus categories and the keywords that put a bonus in them (overridable in [categories])
+DEFAULT_CATEGORIES = {
+    "C": ["commission", "affiliate"],
+    "D": ["downline first deposit"],
+    "S": ["share bonus", "referrer"],
+}
+OTHER = "O" # Category of a bonus that matched no keyword
+
+class BonusClassifier:
+    """
+    Sorts bonuses into categories by keywords found (case-insensitively) in their name or
+    claim config. All keywords are compiled into one regex that is run once per bonus; a
+    keyword also counts wherever a longer keyword containing it matched, so the result is
+    the same as testing every keyword on its own. A bonus gets every category it matched,
+    in configured order, or OTHER if none. Results are cached: names repeat across sites.
+    """
+    def __init__(self, categories: Optional[Dict[str, List[str]]] = None, cache_size: int = 4096):
+        self.categories = {category: [k.lower() for k in keywords if k] for category, keywords in (categories or DEFAULT_CATEGORIES).items()}
+        keywords = sorted({k for ks in self.categories.values() for k in ks}, key=len, reverse=True)
+        # Longest keyword first, so a match is the longest keyword starting at its position
+        self._pattern = re.compile("|".join(map(re.escape, keywords))) if keywords else None
+        self._keyword_categories = {
+            keyword: frozenset(c for c, ks in self.categories.items() if any(k in keyword for k in ks))
+            for keyword in keywords
+        }
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    def empty_flags(self) -> Dict[str, bool]:
+        """Site flags before any bonus was seen: every category (and OTHER) False."""
+        return dict.fromkeys([*self.categories, OTHER], False)
+
+    def _classify(self, name: str, claim_config: str) -> Tuple[str, ...]:
+        """The categories of a bonus with this name and claim config, e.g. ("C", "S") or (OTHER,)."""
+        if self._pattern is None:
+            return (OTHER,)
+        text = f"{name.lower() if name else ''}\x00{claim_config.lower() if claim_config else ''}"
+        found = set()
+        search = self._pattern.search
+        match = search(text)
+        while match:
+            found |= self._keyword_categories[match.group()]
+            match = search(text, match.start() + 1) # Matches may overlap
+        return tuple(c for c in self.categories if c in found) or (OTHER,)
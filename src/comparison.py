@@ -0,0 +1,174 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from datetime import date, datetime, timedelta
+from typing import Optional
+from pandas.api.types import infer_dtype, is_float_dtype
+from .config import ConfigLoader
+from .history import HISTORICAL_EXCEL_PATH, HistoryArchive
+from .logger import Logger
+from .storage import BONUS_COLUMNS, Storage, create_storage
+
+KEY_COLUMNS = ['merchant_name', 'name', 'amount']
+REPORT_COLUMNS = ['status', 'change_details'] + BONUS_COLUMNS
+
+def comparison_report_path(today: date, data_dir: str = "data") -> str:
+    return os.path.join(data_dir, f"comparison_report_{today.strftime('%m-%d')}.csv")
+
+def _accounts(df: pd.DataFrame) -> bool:
+    """Whether a day of bonuses is tagged by account (days scraped before accounts existed are not)."""
+    return 'account' in df.columns and bool((df['account'].fillna('').astype(str) != '').any())
+
+def _prepare(df: pd.DataFrame, by_account: bool = False) -> pd.DataFrame:
+    """
+    Normalises one day of bonuses to BONUS_COLUMNS and adds its '_comparison_key'
+    (merchant_name, name, amount, plus account if by_account).
+    """
+    if df.empty:
+        prepared = pd.DataFrame(columns=BONUS_COLUMNS)
+        prepared['_comparison_key'] = pd.Series(dtype='object')
+        return prepared
+    prepared = df.copy()
+    for col in BONUS_COLUMNS:
+        if col not in prepared.columns: prepared[col] = pd.NA
+    prepared = prepared[BONUS_COLUMNS]
+    prepared['amount'] = pd.to_numeric(prepared['amount'], errors='coerce').round(5)
+    for col in ('merchant_name', 'name'):
+        prepared[col] = prepared[col].astype(str).fillna('')
+    prepared['account'] = prepared['account'].fillna('').astype(str)
+    prepared = prepared.dropna(subset=KEY_COLUMNS)
+    prepared['_comparison_key'] = prepared['merchant_name'] + "_" + prepared['name'] + "_" + prepared['amount'].astype(str)
+    if by_account:
+        prepared['_comparison_key'] += "_" + prepared['account']
+    return prepared
+
+def _is_float(values: np.ndarray) -> np.ndarray:
+    return np.fromiter((isinstance(v, float) for v in values), dtype=bool, count=len(values))
+
+def _rounded(values: pd.Series) -> np.ndarray:
+    return pd.to_numeric(values, errors='coerce').round(5).to_numpy(dtype=float, na_value=np.nan)
+
+def _changed(today: pd.Series, yesterday: pd.Series) -> np.ndarray:
+    """
+    Element-wise "did this column change": values whose str() differ, except that pairs
+    involving a float only count when they differ after rounding to 5 places.
+    Missing on both sides is unchanged; missing on one side is a change.
+    """
+    today_na, yesterday_na = today.isna().to_numpy(), yesterday.isna().to_numpy()
+    present = ~(today_na & yesterday_na)
+    if is_float_dtype(today) or is_float_dtype(yesterday):
+        # Every pair involves a float, and equal str() implies equal numbers, so only the rounded values matter
+        return present & (_rounded(today) != _rounded(yesterday)) # NaN never equals, as with the scalar comparison
+    today_vals, yesterday_vals = today.to_numpy(dtype=object), yesterday.to_numpy(dtype=object)
+    if infer_dtype(today, skipna=True) in ('string', 'empty') and infer_dtype(yesterday, skipna=True) in ('string', 'empty'):
+        differs = np.where(today_na, "", today_vals) != np.where(yesterday_na, "", yesterday_vals)
+        return present & (today_na | yesterday_na | differs)
+
+    changed = present & (today_na | yesterday_na | (today_vals.astype(str) != yesterday_vals.astype(str)))
+    candidates = np.flatnonzero(changed)
+    if not len(candidates):
+        return changed
+    t, y = today_vals[candidates], yesterday_vals[candidates]
+    numeric = _is_float(t) | _is_float(y)
+    if numeric.any():
+        changed[candidates[numeric]] = _rounded(pd.Series(t[numeric])) != _rounded(pd.Series(y[numeric]))
+    return changed
+
+def compare_bonuses(today_df: pd.DataFrame, yesterday_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Day-over-day report of two days of bonuses, matched on (merchant_name, name, amount), and
+    on account as well when both days are tagged with one. Each row is "New" (only today),
+    "Used" (only yesterday), "Persistent_Changed" or "Persistent_Unchanged", with the changed
+    columns listed in change_details as "col: 'yesterday' -> 'today'" joined by "; ".
+    Returns REPORT_COLUMNS, empty if both days are.
+    """
+    by_account = _accounts(today_df) and _accounts(yesterday_df)
+    today, yesterday = _prepare(today_df, by_account), _prepare(yesterday_df, by_account)
+    if today.empty and yesterday.empty:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+
+    merged = pd.merge(today, yesterday, on='_comparison_key', how='outer', suffixes=('_today', '_yesterday'), indicator=True)
+    merge_state = merged['_merge'].to_numpy(dtype=object)
+    is_new, is_used, is_persistent = merge_state == 'left_only', merge_state == 'right_only', merge_state == 'both'
+
+    columns = {}
+    change_details = np.full(len(merged), "", dtype=object)
+    for col in BONUS_COLUMNS:
+        today_col, yesterday_col = merged[col + '_today'], merged[col + '_yesterday']
+        today_vals, yesterday_vals = today_col.to_numpy(dtype=object), yesterday_col.to_numpy(dtype=object)
+        columns[col] = np.where(is_used, yesterday_vals, today_vals)
+        if col == 'account':
+            continue # Part of the key when both days have it; a day without accounts is not a change
+        if col == 'categories':
+            continue # Follows from name and claim_config (diffed already) and the configured keywords
+
+        changed = _changed(today_col, yesterday_col) & is_persistent
+        if changed.any():
+            texts = [f"{col}: '{y}' -> '{t}'" for t, y in zip(today_vals[changed], yesterday_vals[changed])]
+            previous = change_details[changed]
+            change_details[changed] = np.where(previous == "", texts, previous + "; " + np.array(texts, dtype=object))
+
+    status = np.select(
+        [is_new, is_used, change_details != ""], ["New", "Used", "Persistent_Changed"], default="Persistent_Unchanged"
+    ).astype(object)
+    report = pd.DataFrame({'status': status, 'change_details': change_details, **columns}, columns=REPORT_COLUMNS)
+    # Let pandas pick column dtypes from the values, so numbers are written to CSV the way they were read
+    return report.infer_objects()
+
+def load_day(storage: Storage, day: date, logger: Logger, archive: Optional[HistoryArchive] = None, excel_path: str = HISTORICAL_EXCEL_PATH) -> pd.DataFrame:
+    """Bonuses of day from the history archive, else the storage backend, else that day's sheet of the legacy workbook."""
+    day_df = archive.load_day(day) if archive else pd.DataFrame()
+    if day_df.empty:
+        day_df = storage.load_bonuses(day)
+    if day_df.empty and os.path.exists(excel_path):
+        # Days archived before the history archive existed only live in the workbook
+        sheet_name = day.strftime('%m-%d')
+        try:
+            day_df = pd.read_excel(excel_path, sheet_name=sheet_name)
+        except Exception as e:
+            logger.emit("comparison_info", {"message": f"Could not read the {sheet_name} sheet for comparison: {str(e)}"})
+    return day_df
+
+def write_comparison_report(today_df: pd.DataFrame, yesterday_df: pd.DataFrame, report_path: str, logger: Logger) -> Optional[pd.DataFrame]:
+    """Writes the compare_bonuses report to report_path. Returns it, or None if there was nothing to compare."""
+    report_df = compare_bonuses(today_df, yesterday_df)
+    if report_df.empty:
+        logger.emit("comparison_info", {"message": "Both today's and yesterday's bonus data are empty. No comparison report generated."})
+        return None
+    os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+    report_df.to_csv(report_path, index=False, encoding='utf-8')
+    logger.emit("comparison_report_generated", {"path": report_path, "rows": len(report_df)})
+    return report_df
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def main():
+    """Compares the bonuses of any two days: python -m src.comparison [TODAY] [YESTERDAY] (YYYY-MM-DD)."""
+    parser = argparse.ArgumentParser(description="Day-over-day bonus comparison report.")
+    parser.add_argument("today", nargs="?", type=_parse_date, default=date.today(), help="Newer day, YYYY-MM-DD (default: today)")
+    parser.add_argument("yesterday", nargs="?", type=_parse_date, help="Older day, YYYY-MM-DD (default: the day before TODAY)")
+    parser.add_argument("--output", help="Report path (default: data/comparison_report_<mm-dd>.csv)")
+    args = parser.parse_args()
+    yesterday = args.yesterday or args.today - timedelta(days=1)
+
+    config = ConfigLoader(path="config.ini").load()
+    logger = Logger(log_file=config.logging.log_file, log_level=config.logging.log_level, console=config.logging.console, detail=config.logging.detail)
+    storage = create_storage(config.storage.backend, args.today, config.storage.sqlite_path, export_csv=False)
+    archive = HistoryArchive(config.storage.history_dir)
+    try:
+        report_path = args.output or comparison_report_path(args.today)
+        report_df = write_comparison_report(
+            load_day(storage, args.today, logger, archive), load_day(storage, yesterday, logger, archive), report_path, logger
+        )
+        if report_df is None:
+            print(f"No bonuses recorded for {args.today} or {yesterday}.")
+        else:
+            counts = ", ".join(f"{status}: {n}" for status, n in report_df['status'].value_counts().items())
+            print(f"Wrote {report_path} ({counts})")
+    finally:
+        storage.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,85 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, List, Optional
 import configparser
 import os
 import sys
+from .classifier import DEFAULT_CATEGORIES
 
 @dataclass
 class Credentials:
     mobile: str
     password: str
+    name: str = "" # Account label in the output; defaults to the mobile number
 
 @dataclass
 class Settings:
     url_file: str
     downline_enabled: bool
+    workers: int = 1
+    engine: str = "threads"
+    max_in_flight: int = 200
+    per_host_limit: int = 4
+    downline_window: int = 4
+
+@dataclass
+class HttpConfig:
+    pool_size: int = 10
+    max_retries: int = 2
+    backoff_factor: float = 0.3
+    keep_alive: bool = True
+    timeout: float = 30.0
+
+@dataclass
+class HealthConfig:
+    enabled: bool = True
+    file: str = "data/host_health.json"
+    min_timeout: float = 5.0
+    timeout_multiplier: float = 4.0
+    samples: int = 20
+    down_runs: int = 3
+    probe_every: int = 5
+
+@dataclass
+class RateLimitConfig:
+    rate: float = 0.0
+    burst: int = 5
+    max_concurrent: int = 0
+    key: str = "host"
+    backoff_base: float = 1.0
+    backoff_max: float = 60.0
+
+@dataclass
+class AuthConfig:
+    token_cache: bool = True
+    token_ttl_hours: float = 12.0
+    token_cache_file: str = "data/auth_cache.json"
+    merchant_cache: bool = True
+    merchant_cache_file: str = "data/merchant_cache.json"
+
+@dataclass
+class StorageConfig:
+    backend: str = "csv"
+    sqlite_path: str = "data/scraper.sqlite"
+    export_csv: bool = True
+    history_dir: str = "data/history"
+    journal_file: str = "data/run_journal.jsonl"
+    run_cache_file: str = "data/run_metrics_cache.sqlite"
+    fsync_interval: float = 5.0
+
+@dataclass
+class ChangesConfig:
+    enabled: bool = True
+    fingerprint_file: str = "data/bonus_fingerprints.sqlite"
+    log_file: str = "data/bonus_changes.jsonl"
+
+@dataclass
+class ScheduleConfig:
+    order: str = "yield"
+    max_sites: int = 0
+    time_budget: float = 0.0
+    staleness_weight: float = 1.0
+    error_penalty: float = 5.0
+    empty_penalty: float = 1.0
 
 @dataclass
 class LoggingConfig:
@@ -20,12 +87,22 @@ class LoggingConfig:
     log_level: str
     console: bool
     detail: str
+    queued: bool = True
 
 @dataclass
 class AppConfig:
-    credentials: Credentials
+    credentials: Credentials # The first of accounts
+    accounts: List[Credentials]
     settings: Settings
     logging: LoggingConfig
+    http: HttpConfig
+    auth: AuthConfig
+    storage: StorageConfig
+    health: HealthConfig
+    schedule: ScheduleConfig
+    rate_limit: RateLimitConfig
+    categories: Dict[str, List[str]] # Bonus category -> keywords, see BonusClassifier
+    changes: ChangesConfig
 
 class ConfigLoader:
     """Loads and validates configuration from a .ini file."""
@@ -35,22 +112,123 @@ class ConfigLoader:
         self.config = configparser.ConfigParser()
         self.config.read(path)
 
+    def _typed(self, getter, kind: str, section: str, key: str, fallback):
+        """getter(section, key), exiting with a configuration error that names the key if its value does not parse."""
+        try:
+            return getter(section, key, fallback=fallback)
+        except ValueError:
+            sys.exit(f"Configuration error: [{section}] {key} must be {kind}, not {self.config.get(section, key)!r}")
+
+    def getint(self, section: str, key: str, fallback: int) -> int:
+        return self._typed(self.config.getint, "a whole number", section, key, fallback)
+
+    def getfloat(self, section: str, key: str, fallback: float) -> float:
+        return self._typed(self.config.getfloat, "a number", section, key, fallback)
+
+    def getboolean(self, section: str, key: str, fallback: bool) -> bool:
+        return self._typed(self.config.getboolean, "True or False", section, key, fallback)
+
+    def _credentials(self, section: str, name: str = "") -> Credentials:
+        mobile = self.config[section]["mobile"]
+        return Credentials(
+            mobile=mobile,
+            password=self.config[section]["password"],
+            name=self.config[section].get("name", name) or mobile
+        )
+
+    def load_accounts(self) -> List[Credentials]:
+        """[credentials] followed by every [credentials.<name>] section, in file order."""
+        accounts = [self._credentials("credentials")]
+        for section in self.config.sections():
+            if section.startswith("credentials."):
+                accounts.append(self._credentials(section, section[len("credentials."):]))
+        return accounts
+
+    def load_categories(self) -> Dict[str, List[str]]:
+        """[categories] as {CATEGORY: [keyword, ...]} (comma-separated keywords), or the built-in categories."""
+        if not self.config.has_section("categories"):
+            return DEFAULT_CATEGORIES
+        return {
+            category.upper(): [keyword.strip() for keyword in keywords.split(",") if keyword.strip()]
+            for category, keywords in self.config.items("categories", raw=True)
+            if category not in self.config.defaults()
+        }
+
     def load(self) -> AppConfig:
         try:
+            accounts = self.load_accounts()
             return AppConfig(
-                credentials=Credentials(
-                    mobile=self.config["credentials"]["mobile"],
-                    password=self.config["credentials"]["password"]
-                ),
+                credentials=accounts[0],
+                accounts=accounts,
                 settings=Settings(
                     url_file=self.config["settings"]["file"],
-                    downline_enabled=self.config["settings"].getboolean("downline", fallback=False)
+                    downline_enabled=self.getboolean("settings", "downline", fallback=False),
+                    workers=max(1, self.getint("settings", "workers", fallback=1)),
+                    engine=self.config["settings"].get("engine", "threads").lower(),
+                    max_in_flight=max(1, self.getint("settings", "max_in_flight", fallback=200)),
+                    per_host_limit=max(1, self.getint("settings", "per_host_limit", fallback=4)),
+                    downline_window=max(1, self.getint("settings", "downline_window", fallback=4))
                 ),
                 logging=LoggingConfig(
                     log_file=self.config["logging"]["log_file"],
                     log_level=self.config["logging"]["log_level"],
-                    console=self.config["logging"].getboolean("console", fallback=True),
-                    detail=self.config["logging"].get("detail", "LESS").upper()
+                    console=self.getboolean("logging", "console", fallback=True),
+                    detail=self.config["logging"].get("detail", "LESS").upper(),
+                    queued=self.getboolean("logging", "queued", fallback=True)
+                ),
+                http=HttpConfig(
+                    pool_size=max(1, self.getint("http", "pool_size", fallback=10)),
+                    max_retries=max(0, self.getint("http", "max_retries", fallback=2)),
+                    backoff_factor=self.getfloat("http", "backoff_factor", fallback=0.3),
+                    keep_alive=self.getboolean("http", "keep_alive", fallback=True),
+                    timeout=max(1.0, self.getfloat("http", "timeout", fallback=30.0))
+                ),
+                auth=AuthConfig(
+                    token_cache=self.getboolean("auth", "token_cache", fallback=True),
+                    token_ttl_hours=self.getfloat("auth", "token_ttl_hours", fallback=12.0),
+                    token_cache_file=self.config.get("auth", "token_cache_file", fallback="data/auth_cache.json"),
+                    merchant_cache=self.getboolean("auth", "merchant_cache", fallback=True),
+                    merchant_cache_file=self.config.get("auth", "merchant_cache_file", fallback="data/merchant_cache.json")
+                ),
+                storage=StorageConfig(
+                    backend=self.config.get("storage", "backend", fallback="csv").lower(),
+                    sqlite_path=self.config.get("storage", "sqlite_path", fallback="data/scraper.sqlite"),
+                    export_csv=self.getboolean("storage", "export_csv", fallback=True),
+                    history_dir=self.config.get("storage", "history_dir", fallback="data/history"),
+                    journal_file=self.config.get("storage", "journal_file", fallback="data/run_journal.jsonl"),
+                    run_cache_file=self.config.get("storage", "run_cache_file", fallback="data/run_metrics_cache.sqlite"),
+                    fsync_interval=max(0.0, self.getfloat("storage", "fsync_interval", fallback=5.0))
+                ),
+                health=HealthConfig(
+                    enabled=self.getboolean("health", "enabled", fallback=True),
+                    file=self.config.get("health", "file", fallback="data/host_health.json"),
+                    min_timeout=max(0.5, self.getfloat("health", "min_timeout", fallback=5.0)),
+                    timeout_multiplier=self.getfloat("health", "timeout_multiplier", fallback=4.0),
+                    samples=max(1, self.getint("health", "samples", fallback=20)),
+                    down_runs=max(1, self.getint("health", "down_runs", fallback=3)),
+                    probe_every=max(1, self.getint("health", "probe_every", fallback=5))
+                ),
+                schedule=ScheduleConfig(
+                    order=self.config.get("schedule", "order", fallback="yield").lower(),
+                    max_sites=max(0, self.getint("schedule", "max_sites", fallback=0)),
+                    time_budget=max(0.0, self.getfloat("schedule", "time_budget", fallback=0.0)),
+                    staleness_weight=self.getfloat("schedule", "staleness_weight", fallback=1.0),
+                    error_penalty=self.getfloat("schedule", "error_penalty", fallback=5.0),
+                    empty_penalty=self.getfloat("schedule", "empty_penalty", fallback=1.0)
+                ),
+                rate_limit=RateLimitConfig(
+                    rate=max(0.0, self.getfloat("rate_limit", "rate", fallback=0.0)),
+                    burst=max(1, self.getint("rate_limit", "burst", fallback=5)),
+                    max_concurrent=max(0, self.getint("rate_limit", "max_concurrent", fallback=0)),
+                    key=self.config.get("rate_limit", "key", fallback="host").lower(),
+                    backoff_base=max(0.0, self.getfloat("rate_limit", "backoff_base", fallback=1.0)),
+                    backoff_max=max(0.0, self.getfloat("rate_limit", "backoff_max", fallback=60.0))
+                ),
+                categories=self.load_categories(),
+                changes=ChangesConfig(
+                    enabled=self.getboolean("changes", "enabled", fallback=True),
+                    fingerprint_file=self.config.get("changes", "fingerprint_file", fallback="data/bonus_fingerprints.sqlite"),
+                    log_file=self.config.get("changes", "log_file", fallback="data/bonus_changes.jsonl")
                 )
             )
         except KeyError as e:
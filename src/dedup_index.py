@@ -0,0 +1,72 @@
+import csv
+import os
+import sqlite3
+import threading
+from typing import Iterable, List, Set
+
+class DownlineIndex:
+    """
+    Persistent (url, id) index of the downlines already written to a CSV file.
+
+    Lives next to the CSV (``<csv_file>.index.sqlite``) and is queried per page instead of
+    reading the whole CSV into memory for every site, so dedup cost does not grow with
+    the size of the output. The first open bootstraps it from an existing CSV.
+    """
+    QUERY_CHUNK = 500 # Stay well below SQLite's host-parameter limit
+
+    def __init__(self, csv_file: str):
+        self.csv_file = csv_file
+        self.path = f"{csv_file}.index.sqlite"
+        self._lock = threading.Lock()
+        is_new = not os.path.exists(self.path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen (url TEXT NOT NULL, id TEXT NOT NULL, PRIMARY KEY (url, id)) WITHOUT ROWID"
+        )
+        csv_has_rows = os.path.exists(csv_file) and os.path.getsize(csv_file) > 0
+        if not csv_has_rows:
+            # The CSV was removed or never written; an index left behind would suppress every row
+            with self.conn:
+                self.conn.execute("DELETE FROM seen")
+        elif is_new:
+            self._bootstrap_from_csv()
+
+    def _bootstrap_from_csv(self) -> None:
+        with open(self.csv_file, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if not header or "url" not in header or "id" not in header:
+                return
+            url_idx, id_idx = header.index("url"), header.index("id")
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO seen (url, id) VALUES (?, ?)",
+                    ((row[url_idx], row[id_idx]) for row in reader if len(row) > max(url_idx, id_idx))
+                )
+
+    def filter_new(self, url: str, ids: Iterable[str]) -> Set[str]:
+        """Returns the ids not yet recorded for url."""
+        candidates = list(dict.fromkeys(ids))
+        seen: Set[str] = set()
+        with self._lock:
+            for start in range(0, len(candidates), self.QUERY_CHUNK):
+                chunk = candidates[start:start + self.QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT id FROM seen WHERE url = ? AND id IN ({placeholders})", [url, *chunk]
+                )
+                seen.update(row[0] for row in rows)
+        return set(candidates) - seen
+
+    def add(self, url: str, ids: List[str]) -> None:
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO seen (url, id) VALUES (?, ?)", ((url, i) for i in ids))
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
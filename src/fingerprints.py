@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, Iterable, List
+from .models import Bonus
+
+FINGERPRINT_DB_PATH = "data/bonus_fingerprints.sqlite"
+CHANGE_LOG_PATH = "data/bonus_changes.jsonl"
+# The fields a bonus is compared on: not its identity (url, account, id), nor what is derived from other fields
+FINGERPRINT_FIELDS = tuple(f for f in Bonus._fields if f not in ("url", "account", "id", "withdraw_to_bonus_ratio", "categories"))
+
+class BonusFingerprints:
+    """
+    The last seen state of every bonus, by url, account and id, in SQLite (WAL): a hash of its
+    FINGERPRINT_FIELDS plus the field values. detect() compares one site's fresh bonuses with
+    it while the run is going, so each bonus is classified as it is scraped: "New", "Changed"
+    (with change_details in the comparison report's format) or unchanged, and the bonuses the
+    site no longer lists as "Used". Only these deltas are written, to the store and as JSON
+    lines appended to the change log; sites that are not scraped keep their state.
+    """
+    def __init__(self, path: str = FINGERPRINT_DB_PATH, log_path: str = CHANGE_LOG_PATH):
+        self.path = path
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        for directory in {os.path.dirname(path), os.path.dirname(log_path)}:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS bonuses (
+                url TEXT NOT NULL, account TEXT NOT NULL, id TEXT NOT NULL, fingerprint TEXT NOT NULL,
+                fields TEXT NOT NULL, first_seen TEXT NOT NULL, changed TEXT NOT NULL,
+                PRIMARY KEY (url, account, id)
+            ) WITHOUT ROWID
+        """)
+        self._log = None
+        self.counts = {"New": 0, "Changed": 0, "Used": 0}
+
+    @staticmethod
+    def fields(bonus: Bonus) -> List[Any]:
+        return [getattr(bonus, f) for f in FINGERPRINT_FIELDS]
+
+    @staticmethod
+    def fingerprint(fields: List[Any]) -> str:
+        return hashlib.blake2b(repr(fields).encode(), digest_size=8).hexdigest()
+
+    @staticmethod
+    def change_details(old: List[Any], new: List[Any]) -> str:
+        return "; ".join(f"{f}: '{o}' -> '{n}'" for f, o, n in zip(FINGERPRINT_FIELDS, old, new) if o != n)
+
+    def detect(self, url: str, account: str, bonuses: List[Bonus], run_date: date, unparsed_ids: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """
+        Classifies one site's bonuses (as fetched with account) against their stored state and
+        records the result. unparsed_ids are bonuses the site listed but that could not be
+        parsed: their stored state is kept as is, not reported "Used". Returns the changes, each
+        {"status", "url", "account", "id", "name", "amount", "change_details"}; unchanged
+        bonuses are left out.
+        """
+        day = run_date.isoformat()
+        changes, upserts, seen = [], [], set()
+        with self._lock:
+            stored = {bonus_id: (fingerprint, fields) for bonus_id, fingerprint, fields in self.conn.execute(
+                "SELECT id, fingerprint, fields FROM bonuses WHERE url = ? AND account = ?", (url, account)
+            )}
+            for bonus in bonuses:
+                bonus_id = str(bonus.id)
+                if bonus_id in seen:
+                    continue
+                seen.add(bonus_id)
+                fields = self.fields(bonus)
+                fingerprint = self.fingerprint(fields)
+                previous = stored.get(bonus_id)
+                if previous is None:
+                    changes.append(self._change("New", url, account, bonus_id, bonus.name, bonus.amount))
+                    upserts.append((url, account, bonus_id, fingerprint, json.dumps(fields), day, day))
+                elif previous[0] != fingerprint:
+                    details = self.change_details(json.loads(previous[1]), fields)
+                    changes.append(self._change("Changed", url, account, bonus_id, bonus.name, bonus.amount, details))
+                    upserts.append((url, account, bonus_id, fingerprint, json.dumps(fields), day, day))
+            listed = seen.union(map(str, unparsed_ids))
+            gone = [bonus_id for bonus_id in stored if bonus_id not in listed]
+            for bonus_id in gone:
+                old = dict(zip(FINGERPRINT_FIELDS, json.loads(stored[bonus_id][1])))
+                changes.append(self._change("Used", url, account, bonus_id, old.get("name"), old.get("amount")))
+            if upserts or gone:
+                with self.conn:
+                    self.conn.executemany("""
+                        INSERT INTO bonuses VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (url, account, id) DO UPDATE SET -- first_seen is kept
+                            fingerprint = excluded.fingerprint, fields = excluded.fields, changed = excluded.changed
+                    """, upserts)
+                    self.conn.executemany("DELETE FROM bonuses WHERE url = ? AND account = ? AND id = ?", [(url, account, bonus_id) for bonus_id in gone])
+                self._append(day, changes)
+            for change in changes:
+                self.counts[change["status"]] += 1
+        return changes
+
+    @staticmethod
+    def _change(status: str, url: str, account: str, bonus_id: str, name: Any, amount: Any, change_details: str = "") -> Dict[str, Any]:
+        return {"status": status, "url": url, "account": account, "id": bonus_id, "name": name, "amount": amount, "change_details": change_details}
+
+    def _append(self, day: str, changes: List[Dict[str, Any]]) -> None:
+        """Appends changes to the change log, flushed so a watcher sees them right away."""
+        if self._log is None:
+            self._log = open(self.log_path, "a", encoding="utf-8")
+        detected_at = round(time.time(), 3)
+        self._log.write("".join(json.dumps({"run_date": day, "detected_at": detected_at, **change}) + "\n" for change in changes))
+        self._log.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            self.conn.close()
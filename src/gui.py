@@ -10,8 +10,8 @@ from kivy.uix.gridlayout import GridLayout
 from kivy.uix.checkbox import CheckBox
 from kivy.uix.scrollview import ScrollView
 from kivy.clock import Clock
-from src.logger import Logger
 from src.config import ConfigLoader
+from src.metrics_index import MetricsIndex
 from kivy.properties import BooleanProperty # For NavButton is_active state
 # from src.main import execute_scraping_logic as actual_run_scraper_main # Already imported later
 import threading
@@ -58,6 +58,7 @@ class ConfigScreen(Screen):
             ("Password:", "password", "credentials.password", True, False),
             ("URL File:", "url_file", "settings.url_file", False, False),
             ("Downline Enabled:", "downline_enabled", "settings.downline_enabled", False, True),
+            ("Workers:", "workers", "settings.workers", False, False),
             ("Log File:", "log_file", "logging.log_file", False, False),
             ("Log Level:", "log_level", "logging.log_level", False, False),
             ("Console Logging:", "console", "logging.console", False, True),
@@ -111,21 +112,28 @@ class ConfigScreen(Screen):
     def save_config(self, instance):
         # Access status_label via self.config_status_label now
         config_parser = configparser.ConfigParser()
+        # Start from the existing file so sections not shown in the GUI are preserved
+        config_parser.read('config.ini')
 
         config_parser['credentials'] = {
             'mobile': self.inputs['mobile'].text,
             'password': self.inputs['password'].text
         }
-        config_parser['settings'] = {
+        if not config_parser.has_section('settings'):
+            config_parser.add_section('settings')
+        config_parser['settings'].update({
             'file': self.inputs['url_file'].text,
-            'downline': str(self.inputs['downline_enabled'].active)
-        }
-        config_parser['logging'] = {
+            'downline': str(self.inputs['downline_enabled'].active),
+            'workers': self.inputs['workers'].text
+        })
+        if not config_parser.has_section('logging'):
+            config_parser.add_section('logging')
+        config_parser['logging'].update({
             'log_file': self.inputs['log_file'].text,
             'log_level': self.inputs['log_level'].text,
             'console': str(self.inputs['console'].active),
             'detail': self.inputs['detail'].text
-        }
+        })
 
         try:
             with open('config.ini', 'w') as configfile:
@@ -245,8 +253,8 @@ class HistoryScreen(Screen):
             cfg_loader = ConfigLoader() 
             app_cfg = cfg_loader.load() 
             log_file_path = app_cfg.logging.log_file
-            logger_instance = Logger(log_file=log_file_path, log_level='INFO', console=False, detail='LESS')
-            metrics = logger_instance.load_metrics(log_file_path)
+            # Reads only the log lines appended since the last checkpoint
+            metrics = MetricsIndex(log_file_path).load()
             self.display_metrics(metrics)
         except FileNotFoundError:
             metrics_layout_widget.clear_widgets()
@@ -0,0 +1,139 @@
+import argparse
+import os
+import re
+import pandas as pd
+import pyarrow as pa
+from datetime import date, datetime
+from typing import List, Optional
+from .config import ConfigLoader
+from .models import Bonus
+from .storage import BONUS_COLUMNS
+
+HISTORY_DIR = "data/history"
+HISTORICAL_EXCEL_PATH = "data/historical_bonuses.xlsx"
+PARTITION_PATTERN = re.compile(r"^run_date=(\d{4}-\d{2}-\d{2})$")
+# Parsed as floats from the API; every other column is archived as text
+NUMBER_COLUMNS = frozenset(f for f, annotation in Bonus.__annotations__.items() if annotation in (float, Optional[float]))
+
+class HistoryArchive:
+    """
+    Columnar archive of every day's bonuses, one Parquet file per day in a Hive-style
+    partition (``<root>/run_date=YYYY-MM-DD/bonuses.parquet``). Reading a day opens only
+    that day's file, so it costs the same however many days are archived, and the whole
+    root can still be read as one dataset (``pd.read_parquet(root)``) for analysis.
+    """
+    FILE_NAME = "bonuses.parquet"
+
+    def __init__(self, root: str = HISTORY_DIR):
+        self.root = root
+
+    def path_for(self, day: date) -> str:
+        return os.path.join(self.root, f"run_date={day.isoformat()}", self.FILE_NAME)
+
+    @staticmethod
+    def schema(bonuses: pd.DataFrame) -> pa.Schema:
+        return pa.schema([(str(c), pa.float64() if c in NUMBER_COLUMNS else pa.string()) for c in bonuses.columns])
+
+    @staticmethod
+    def normalize(bonuses: pd.DataFrame) -> pd.DataFrame:
+        """
+        bonuses with one type per column, as schema() has it: the raw API values (ids, names, ...)
+        come back from SQLite or a workbook as a mix of ints and strings, which Parquet rejects.
+        """
+        normalized = bonuses.copy()
+        for col in normalized.columns:
+            if col in NUMBER_COLUMNS:
+                normalized[col] = pd.to_numeric(normalized[col], errors='coerce').astype('float64')
+            else:
+                values = normalized[col]
+                normalized[col] = values.astype(str).where(values.notna(), None).astype(object)
+        return normalized
+
+    def write_day(self, day: date, bonuses: pd.DataFrame) -> str:
+        """Replaces day's partition with bonuses and returns its path."""
+        path = self.path_for(day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        normalized = self.normalize(bonuses)
+        normalized.to_parquet(temp_path, index=False, schema=self.schema(normalized))
+        os.replace(temp_path, path) # Readers never see a half-written day
+        return path
+
+    def load_day(self, day: date) -> pd.DataFrame:
+        """Bonuses archived for day, with BONUS_COLUMNS; empty if that day was not archived."""
+        path = self.path_for(day)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=BONUS_COLUMNS)
+        return pd.read_parquet(path)
+
+    def days(self) -> List[date]:
+        if not os.path.isdir(self.root):
+            return []
+        found = []
+        for entry in os.listdir(self.root):
+            match = PARTITION_PATTERN.match(entry)
+            if match and os.path.exists(os.path.join(self.root, entry, self.FILE_NAME)):
+                found.append(date.fromisoformat(match.group(1)))
+        return sorted(found)
+
+    def export_excel(self, excel_path: str = HISTORICAL_EXCEL_PATH, start: Optional[date] = None, end: Optional[date] = None) -> int:
+        """Writes the archived days between start and end (inclusive) to one `mm-dd` sheet each. Returns the sheet count."""
+        days = [d for d in self.days() if (start is None or d >= start) and (end is None or d <= end)]
+        if not days:
+            return 0
+        os.makedirs(os.path.dirname(excel_path) or ".", exist_ok=True)
+        with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
+            for day in days:
+                self.load_day(day).to_excel(writer, sheet_name=day.strftime('%m-%d'), index=False)
+        return len(days)
+
+    def import_excel(self, excel_path: str = HISTORICAL_EXCEL_PATH, year: Optional[int] = None) -> int:
+        """
+        Archives the `mm-dd` sheets of a workbook written by earlier versions. Sheet names carry
+        no year, so they are taken as the most recent such date up to today unless year is given.
+        Days already in the archive are left alone. Returns how many days were imported.
+        """
+        today = date.today()
+        imported = 0
+        for sheet_name, sheet_df in pd.read_excel(excel_path, sheet_name=None).items():
+            try:
+                month_day = datetime.strptime(sheet_name, '%m-%d')
+            except ValueError:
+                continue
+            day = date(year or today.year, month_day.month, month_day.day)
+            if year is None and day > today:
+                day = day.replace(year=day.year - 1)
+            if not os.path.exists(self.path_for(day)):
+                self.write_day(day, sheet_df)
+                imported += 1
+        return imported
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def main():
+    """Maintenance commands for the history archive: python -m src.history {list,export-excel,import-excel}."""
+    parser = argparse.ArgumentParser(description="Bonus history archive.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="List the archived days")
+    export_cmd = commands.add_parser("export-excel", help="Write archived days to an Excel workbook, one sheet per day")
+    export_cmd.add_argument("--output", default=HISTORICAL_EXCEL_PATH)
+    export_cmd.add_argument("--from", dest="start", type=_parse_date, help="First day, YYYY-MM-DD")
+    export_cmd.add_argument("--to", dest="end", type=_parse_date, help="Last day, YYYY-MM-DD")
+    import_cmd = commands.add_parser("import-excel", help="Archive the sheets of a workbook written by earlier versions")
+    import_cmd.add_argument("--input", default=HISTORICAL_EXCEL_PATH)
+    import_cmd.add_argument("--year", type=int, help="Year of the sheets (default: most recent)")
+    args = parser.parse_args()
+
+    archive = HistoryArchive(ConfigLoader(path="config.ini").load().storage.history_dir)
+    if args.command == "list":
+        for day in archive.days():
+            print(day.isoformat())
+    elif args.command == "export-excel":
+        count = archive.export_excel(args.output, args.start, args.end)
+        print(f"Wrote {count} day(s) to {args.output}" if count else "No archived days in that range.")
+    else:
+        print(f"Imported {archive.import_excel(args.input, args.year)} day(s) from {args.input}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from .auth_cache import _JsonFileCache
+from .http_pool import SessionPool
+from .timing import PhaseTimings
+
+HOST_HEALTH_FILE_PATH = "data/host_health.json"
+
+class HostHealth(_JsonFileCache):
+    """
+    Per-host request latency and outage history kept across runs, next to the run metrics cache.
+
+    timeout_for() gives each host `timeout_multiplier` times the p95 of its recent request
+    latencies, clamped to [min_timeout, base_timeout]; hosts without enough history, or that
+    were down last run, get the full base_timeout. A host that was down for `down_runs`
+    runs in a row is a tripped circuit: plan() leaves it out, except that every
+    `probe_every` runs it is tried again (at the end of the run) to see if it came back.
+    """
+    MIN_SAMPLES = 3 # Latencies needed before a host's timeout is derived from them
+
+    def __init__(self, path: str = HOST_HEALTH_FILE_PATH, base_timeout: float = 30.0, min_timeout: float = 5.0,
+                 timeout_multiplier: float = 4.0, samples: int = 20, down_runs: int = 3, probe_every: int = 5):
+        self.base_timeout = base_timeout
+        self.min_timeout = min_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.samples = samples
+        self.down_runs = down_runs
+        self.probe_every = probe_every
+        self._run: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"responded": False, "latencies": []})
+        self._timeouts: Dict[str, float] = {}
+        super().__init__(path)
+
+    @staticmethod
+    def host(url: str) -> str:
+        return SessionPool.host_key(url)
+
+    def timeout_for(self, url: str) -> float:
+        host = self.host(url)
+        timeout = self._timeouts.get(host)
+        if timeout is None:
+            with self._lock:
+                entry = self._entries.get(host, {})
+                latencies = sorted(entry.get("latencies", []))
+                if entry.get("down_runs", 0) or len(latencies) < self.MIN_SAMPLES:
+                    timeout = self.base_timeout
+                else:
+                    p95 = PhaseTimings.percentile(latencies, 95)
+                    timeout = min(self.base_timeout, max(self.min_timeout, p95 * self.timeout_multiplier))
+                self._timeouts[host] = timeout # Fixed for the rest of the run
+        return timeout
+
+    def circuit_state(self, url: str, run: int) -> str:
+        """"closed" (scrape as usual), "probe" (tripped, but due a retry) or "open" (skip this run)."""
+        with self._lock:
+            entry = self._entries.get(self.host(url), {})
+        if entry.get("down_runs", 0) < self.down_runs:
+            return "closed"
+        if run - entry.get("last_attempt_run", 0) >= self.probe_every:
+            return "probe"
+        return "open"
+
+    def plan(self, urls: List[str], run: int) -> Tuple[List[str], List[str]]:
+        """Splits urls into (to_scrape, skipped); hosts due a probe are moved to the end of to_scrape."""
+        healthy, probes, skipped = [], [], []
+        for url in urls:
+            {"closed": healthy, "probe": probes, "open": skipped}[self.circuit_state(url, run)].append(url)
+        return healthy + probes, skipped
+
+    def observe(self, url: str, responded: bool, latency: Optional[float] = None) -> None:
+        """Records one site's outcome this run; a host counts as down only if none of its sites responded."""
+        with self._lock:
+            outcome = self._run[self.host(url)]
+            outcome["responded"] = outcome["responded"] or responded
+            if responded and latency is not None:
+                outcome["latencies"].append(round(latency, 4))
+
+    def end_run(self, run: int) -> None:
+        """Folds this run's observations into the per-host history."""
+        with self._lock:
+            for host, outcome in self._run.items():
+                entry = self._entries.setdefault(host, {"latencies": [], "down_runs": 0})
+                entry["last_attempt_run"] = run
+                if outcome["responded"]:
+                    entry["down_runs"] = 0
+                    entry["latencies"] = (entry.get("latencies", []) + outcome["latencies"])[-self.samples:]
+                    entry["last_ok_at"] = time.time()
+                else:
+                    entry["down_runs"] = entry.get("down_runs", 0) + 1
+                    entry["last_down_at"] = time.time()
+            self._run.clear()
+            self._dirty = True
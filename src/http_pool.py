@@ -0,0 +1,105 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import TYPE_CHECKING, Dict, Optional
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    from .rate_limit import RateLimiter
+    from .timing import PhaseTimings
+
+class SessionPool:
+    """
+    Keep-alive requests.Session per merchant host, shared by AuthService and Scraper.
+
+    The landing page GET, the login POST, syncData and every downline page of a site
+    go through the same session and therefore reuse one pooled TCP+TLS connection.
+    With a rate_limiter, every request waits for its host's (or platform's) slot and
+    token first, and its status feeds the limiter's 429/5xx backoff; a throttled request
+    is sent again once its key's pause is over, up to the limiter's retries. Without one,
+    urllib3 retries RETRY_STATUSES itself, honouring Retry-After. With timings, each
+    attempt's network time is recorded for the site passed as site=.
+    """
+    RETRY_STATUSES = (429, 502, 503, 504)
+
+    def __init__(self, pool_size: int = 10, max_retries: int = 2, backoff_factor: float = 0.3, keep_alive: bool = True, rate_limiter: Optional["RateLimiter"] = None, timings: Optional["PhaseTimings"] = None):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.keep_alive = keep_alive
+        self.rate_limiter = rate_limiter
+        self.timings = timings
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host_key(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def _new_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.max_retries,
+            read=0, # A read timeout already cost a full request_timeout; do not repeat it
+            backoff_factor=self.backoff_factor,
+            status_forcelist=() if self.rate_limiter else self.RETRY_STATUSES, # The limiter retries after its pause
+            respect_retry_after_header=True,
+            allowed_methods=frozenset({"GET", "POST"}), # login/syncData/getDownline are safe to repeat
+            raise_on_status=False # Hand the last response back so raise_for_status() reports it
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def session_for(self, url: str) -> requests.Session:
+        key = self.host_key(url)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._new_session()
+                self._sessions[key] = session
+            return session
+
+    def _send(self, method: str, url: str, site: Optional[str], **kwargs) -> requests.Response:
+        response = self.session_for(url).request(method, url, **kwargs)
+        if self.timings and site:
+            self.timings.record_request(site, response.elapsed.total_seconds()) # Sent until headers parsed
+        return response
+
+    def request(self, method: str, url: str, site: Optional[str] = None, **kwargs) -> requests.Response:
+        if not self.rate_limiter:
+            return self._send(method, url, site, **kwargs)
+        attempt = 0
+        while True:
+            with self.rate_limiter.slot(url): # Waits out the pause of a throttled previous attempt
+                response = self._send(method, url, site, **kwargs)
+            throttled = self.rate_limiter.observe(url, response.status_code, response.headers.get("Retry-After"))
+            if not throttled or attempt >= self.rate_limiter.retries:
+                return response
+            response.close()
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def release(self, url: str) -> None:
+        """Closes the host's session once a site is done so idle sockets do not pile up over a run."""
+        with self._lock:
+            session = self._sessions.pop(self.host_key(url), None)
+        if session is not None:
+            session.close()
+
+    def close(self) -> None:
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
@@ -0,0 +1,70 @@
+import json
+import os
+from dataclasses import asdict
+from datetime import date
+from typing import Optional, Set
+from .models import SiteResult
+
+JOURNAL_FILE_PATH = "data/run_journal.jsonl"
+
+class RunJournal:
+    """
+    Append-only record of the sites finished by the current run: a header line with the
+    run date, then one JSON line per site (its SiteResult), written and flushed as soon as
+    the site's results are in storage. A killed run leaves at most a partial last line,
+    which is dropped when the journal is reopened. With resume, the sites that finished
+    without errors today are not scraped again; failed or unresponsive ones are retried.
+    """
+    def __init__(self, path: str = JOURNAL_FILE_PATH):
+        self.path = path
+        self._file = None
+
+    def _read(self, run_date: date) -> Optional[Set[str]]:
+        """Sites completed without errors on run_date, or None if the journal is missing or from another day. Drops a torn last line."""
+        if not os.path.exists(self.path):
+            return None
+        done, valid_bytes = set(), 0
+        with open(self.path, "rb") as f:
+            for number, line in enumerate(f):
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break
+                if number == 0 and record.get("run_date") != run_date.isoformat():
+                    return None
+                if number > 0 and not record.get("errors") and not record.get("unresponsive"):
+                    done.add(record["cleaned_url"])
+                valid_bytes += len(line)
+        if valid_bytes == 0:
+            return None
+        if valid_bytes < os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_bytes)
+        return done
+
+    def open(self, run_date: date, resume: bool = False) -> Set[str]:
+        """Starts today's journal, or with resume continues it. Returns the sites to skip."""
+        done = self._read(run_date) if resume else None
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if done is None:
+            self._file = open(self.path, "w", encoding="utf-8")
+            self._write({"run_date": run_date.isoformat()})
+            return set()
+        self._file = open(self.path, "a", encoding="utf-8")
+        return done
+
+    def _write(self, record) -> None:
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def record(self, result: SiteResult) -> None:
+        self._write(asdict(result))
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
@@ -1,8 +1,13 @@
+import atexit
 import logging
 import json
+import queue
+import threading
+import time
 from typing import Dict, Any
 from datetime import datetime
 import os # Added import os
+from .metrics_index import MetricsIndex
 
 class JsonFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
@@ -16,6 +21,79 @@ class JsonFormatter(logging.Formatter):
         }
         return json.dumps(log_record)
 
+class LogWriter:
+    """
+    Background thread that owns the log file when Logger runs queued. emit() only enqueues;
+    the thread drains whatever has accumulated, writes it with one write/flush and hands
+    the GUI callback one message per batch, so scraping threads never wait on the file.
+    """
+    MAX_BATCH = 500
+
+    def __init__(self, owner: "Logger", log_file: str):
+        self.owner = owner
+        self.log_file = log_file
+        self.formatter = JsonFormatter()
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._file = open(log_file, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, created: float, level: str, event: str, details: Dict[str, Any]) -> None:
+        self._queue.put((created, level, event, details))
+
+    def _record(self, created: float, level: str, event: str, details: Dict[str, Any]) -> logging.LogRecord:
+        # Same module/method fields as a record logged synchronously from Logger.emit
+        record = self.owner.logger.makeRecord(
+            self.owner.logger.name, getattr(logging, level), __file__, 0, event, (), None,
+            func="emit", extra={'details_data': details}
+        )
+        record.created, record.msecs = created, (created - int(created)) * 1000
+        return record
+
+    def _write(self, batch) -> None:
+        lines, gui_messages = [], []
+        for created, level, event, details in batch:
+            record = self._record(created, level, event, details)
+            try:
+                lines.append(self.formatter.format(record) + "\n")
+            except (TypeError, ValueError): # Details that are not JSON serializable
+                record.details_data = {"data": str(details)}
+                lines.append(self.formatter.format(record) + "\n")
+            if self.owner.console_handler:
+                self.owner.console_handler.handle(record)
+            if self.owner.gui_callback:
+                gui_messages.append(Logger.gui_message(event, details, level))
+        self._file.write("".join(lines))
+        self._file.flush()
+        if gui_messages:
+            self.owner.gui_callback("\n".join(gui_messages))
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = any(item is None for item in batch)
+            batch = [item for item in batch if item is not None]
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    print(f"Error: Could not write log batch to '{self.log_file}': {e}")
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if not self._file.closed:
+            self._file.close()
+        atexit.unregister(self.close)
+
 class Logger:
     """Structured logger with verbosity control."""
     VERBOSITY_LEVELS = {"LESS": 0, "MORE": 1, "MAX": 2}
@@ -24,96 +102,106 @@ class Logger:
         "job_complete": "LESS",
         "login_success": "MORE",
         "login_failed": "MORE",
+        "login_cached": "MORE",
+        "merchant_info_cached": "MORE",
+        "auth_token_rejected": "MORE",
         "api_request": "MORE", # Changed from MAX
         "api_response": "MORE", # Changed from MAX
         "bonus_fetched": "MORE",
+        "bonus_change": "MORE",
+        "bonus_changes": "LESS",
         "downline_fetched": "MORE",
         "csv_written": "MORE",
         "exception": "LESS",
         "website_unresponsive": "LESS",
         "down_sites_summary": "LESS",
+        "circuit_open": "LESS",
+        "schedule": "MORE",
+        "time_budget_reached": "LESS",
+        "run_resumed": "LESS",
+        "urls_loaded": "LESS",
+        "throttled": "LESS",
+        "rate_limit_summary": "LESS",
         "bonus_api_error": "MORE",
+        "phase_timing": "MORE",
+        "timing_summary": "LESS",
         "progress_update": "LESS" # Added for progress stats display
     }
 
-    def __init__(self, log_file: str, log_level: str, console: bool, detail: str, gui_callback=None):
+    def __init__(self, log_file: str, log_level: str, console: bool, detail: str, gui_callback=None, queued: bool = False):
         self.logger = logging.getLogger("ScraperLogger")
         self.logger.setLevel(getattr(logging, log_level.upper(), logging.DEBUG)) # ensure log_level is upper
         self.verbosity = self.VERBOSITY_LEVELS.get(detail.upper(), 0) # ensure detail is upper
         self.gui_callback = gui_callback
+        self._enabled_events: Dict[str, bool] = {}
+
+        # Console handler
+        self.console_handler = None
+        if console:
+            self.console_handler = logging.StreamHandler()
+            self.console_handler.setFormatter(logging.Formatter(
+                "%(asctime)s [%(levelname)s] %(message)s"
+            ))
 
-        # File handler
         os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        self._writer = LogWriter(self, log_file) if queued else None
+        if not self._writer:
+            self._add_sync_handlers(log_file)
+
+    def _add_sync_handlers(self, log_file: str) -> None:
+        # File handler
         file_handler = logging.FileHandler(log_file)
         file_handler.setFormatter(JsonFormatter())
         self.logger.addHandler(file_handler)
+        if self.console_handler:
+            self.logger.addHandler(self.console_handler)
 
-        # Console handler
-        if console:
-            console_handler = logging.StreamHandler()
-            console_handler.setFormatter(logging.Formatter(
-                "%(asctime)s [%(levelname)s] %(message)s"
-            ))
-            self.logger.addHandler(console_handler)
+    def enabled(self, event: str, level: str = "INFO") -> bool:
+        """Whether emit(event) would record anything; check it before building costly details."""
+        key = f"{event}|{level}"
+        enabled = self._enabled_events.get(key)
+        if enabled is None:
+            required_level = self.VERBOSITY_LEVELS.get(self.EVENT_VERBOSITY.get(event, "MORE"), 0)
+            enabled = self.verbosity >= required_level and self.logger.isEnabledFor(getattr(logging, level.upper()))
+            self._enabled_events[key] = enabled
+        return enabled
 
     def emit(self, event: str, details: Dict[str, Any], level: str = "INFO") -> None:
-        required_level = self.VERBOSITY_LEVELS.get(self.EVENT_VERBOSITY.get(event, "MORE"), 0)
-        if self.verbosity >= required_level:
-            # Ensure details is a dictionary for the formatter
-            actual_details = details if isinstance(details, dict) else {"data": details}
-            self.logger.log(getattr(logging, level.upper()), event, args=(), extra={'details_data': actual_details})
-
-            if self.gui_callback:
-                # For "progress_update", the details dictionary is expected to have a "message" key
-                # containing the pre-formatted string.
-                if event == "progress_update" and "message" in actual_details:
-                    gui_message = actual_details["message"] # Send the raw message for progress updates
-                else:
-                    # Standard formatting for other events
-                    gui_message = f"[{level.upper()}] {event}"
-                    if actual_details:
-                        try:
-                            details_str = json.dumps(actual_details)
-                        except TypeError: # In case details are not JSON serializable
-                            details_str = str(actual_details)
-                        gui_message += f": {details_str}"
-                self.gui_callback(gui_message)
+        if not self.enabled(event, level):
+            return
+        # Ensure details is a dictionary for the formatter
+        actual_details = details if isinstance(details, dict) else {"data": details}
+        if self._writer:
+            # Formatting, file writes and GUI updates happen on the writer thread
+            self._writer.put(time.time(), level.upper(), event, actual_details)
+            return
+        self.logger.log(getattr(logging, level.upper()), event, extra={'details_data': actual_details})
+        if self.gui_callback:
+            self.gui_callback(self.gui_message(event, actual_details, level))
 
+    @staticmethod
+    def gui_message(event: str, details: Dict[str, Any], level: str = "INFO") -> str:
+        # For "progress_update", the details dictionary is expected to have a "message" key
+        # containing the pre-formatted string.
+        if event == "progress_update" and "message" in details:
+            return details["message"] # Send the raw message for progress updates
+        # Standard formatting for other events
+        gui_message = f"[{level.upper()}] {event}"
+        if details:
+            try:
+                details_str = json.dumps(details)
+            except TypeError: # In case details are not JSON serializable
+                details_str = str(details)
+            gui_message += f": {details_str}"
+        return gui_message
+
+    def close(self) -> None:
+        """Writes out everything still queued. Further events are logged synchronously."""
+        if self._writer:
+            writer = self._writer
+            self._add_sync_handlers(writer.log_file)
+            self._writer = None
+            writer.close()
 
     def load_metrics(self, log_file: str) -> Dict[str, float]:
-        metrics = {
-            "bonuses": 0, # Total count of individual bonus items
-            "downlines": 0,
-            "errors": 0, # General errors + unresponsive + API errors that lead to "ERROR" return
-            "runs": 0,
-            "total_runtime": 0.0,
-            "total_bonus_amount": 0.0,         # Sum of amounts from all bonus_fetched events
-            "successful_bonus_fetches": 0,     # Number of times bonus_fetched event occurred
-            "failed_bonus_api_calls": 0        # Number of times bonus_api_error event occurred
-        }
-        if not os.path.exists(log_file): # Check if log_file exists
-            return metrics
-        with open(log_file, "r") as f:
-            for line in f:
-                try:
-                    log = json.loads(line)
-                    event = log.get("event")
-                    details = log.get("details", {}) # Ensure details is always a dict
-
-                    if event == "bonus_fetched":
-                        metrics["bonuses"] += details.get("count", 0)
-                        metrics["total_bonus_amount"] += details.get("total_amount", 0.0)
-                        metrics["successful_bonus_fetches"] += 1
-                    elif event == "downline_fetched":
-                        metrics["downlines"] += details.get("count", 0)
-                    elif event == "exception" or event == "website_unresponsive": # Count these as errors for historical load
-                        metrics["errors"] += 1
-                    elif event == "bonus_api_error":
-                        metrics["failed_bonus_api_calls"] += 1
-                        metrics["errors"] += 1 # Also count as a general error for overall error tracking
-                    elif event == "job_complete":
-                        metrics["runs"] += 1
-                        metrics["total_runtime"] += details.get("duration", 0.0)
-                except json.JSONDecodeError:
-                    continue
-        return metrics
+        return MetricsIndex(log_file).load()
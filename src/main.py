@@ -1,256 +1,239 @@
-import csv
+import argparse
 import os
 import sys # Added sys import
+import threading
 import time # Added time import
-import requests
-import pandas as pd # Added pandas import
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta # Added import
-from typing import List, Set, Tuple, Union # Union for return types
-from .models import Downline, Bonus, AuthData
+from typing import Any, Callable, Dict, List, Optional
+from .models import AuthData, SiteResult
 from .logger import Logger
 from .auth import AuthService # Added import for AuthService
-from .utils import progress, load_run_cache, save_run_cache # Added cache imports
-
-class Scraper:
-    """Handles scraping of downlines and bonuses."""
-    def __init__(self, logger: Logger, request_timeout: int):
-        self.logger = logger
-        self.request_timeout = request_timeout
-
-    def fetch_downlines(self, url: str, auth: AuthData, csv_file: str = "downlines.csv") -> Union[int, str]:
-        written: Set[Tuple] = set()
-        if os.path.exists(csv_file):
-            with open(csv_file, newline="", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                written = {tuple(row.values()) for row in reader}
-
-        total_new_rows = 0
-        page = 0
-        while True:
-            payload = {
-                "level": "1",
-                "pageIndex": str(page),
-                "module": "/referrer/getDownline",
-                "merchantId": auth.merchant_id,
-                "domainId": "0",
-                "accessId": auth.access_id,
-                "accessToken": auth.token,
-                "walletIsAdmin": True
-            }
-            self.logger.emit("api_request", {"url": auth.api_url, "module": payload.get("module")})
-            try:
-                response = requests.post(auth.api_url, data=payload, timeout=self.request_timeout)
-                response.raise_for_status()
-                res = response.json()
-                
-                response_details = {"url": auth.api_url, "module": payload.get("module"), "status": res.get("status")}
-                if res.get("status") != "SUCCESS":
-                    if res.get("message"):
-                        response_details["error_message"] = res.get("message")
-                    if isinstance(res.get("data"), dict) and res.get("data", {}).get("description"):
-                        response_details["error_description"] = res.get("data").get("description")
-                    elif isinstance(res.get("data"), str):
-                        response_details["error_data_string"] = res.get("data")
-                self.logger.emit("api_response", response_details)
-
-            except requests.exceptions.Timeout as e:
-                self.logger.emit("website_unresponsive", {"url": auth.api_url, "error": f"Timeout: {str(e)}"})
-                return "UNRESPONSIVE"
-            except requests.exceptions.ConnectionError as e:
-                self.logger.emit("website_unresponsive", {"url": auth.api_url, "error": f"ConnectionError: {str(e)}"})
-                return "UNRESPONSIVE"
-            except Exception as e: # This includes JSONDecodeError if response is not JSON
-                self.logger.emit("exception", {"error": f"Downline fetch failed for {auth.api_url}: {str(e)}"})
-                return "ERROR" 
-
-            if res.get("status") != "SUCCESS":
-                return "ERROR" 
-
-            new_rows: List[Downline] = []
-            for d in res["data"].get("downlines", []):
-                row = Downline(
-                    url=url,
-                    id=d.get("id"),
-                    name=d.get("name"),
-                    count=d.get("count", 0),
-                    amount=float(d.get("amount", 0) or 0),
-                    register_date_time=d.get("registerDateTime")
-                )
-                key = (
-                    str(row.url), str(row.id), str(row.name),
-                    str(row.count), str(row.amount), str(row.register_date_time)
-                )
-                if key not in written:
-                    new_rows.append(row)
-                    written.add(key)
-            
-            if not new_rows:
-                break
-
-            file_exists_and_not_empty = os.path.exists(csv_file) and os.path.getsize(csv_file) > 0
-            with open(csv_file, "a", newline="", encoding="utf-8") as f:
-                fieldnames = [field.name for field in Downline.__dataclass_fields__.values()]
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                if not file_exists_and_not_empty:
-                    writer.writeheader()
-                writer.writerows([row.__dict__ for row in new_rows])
-                self.logger.emit("csv_written", {"file": csv_file, "count": len(new_rows)})
-
-            total_new_rows += len(new_rows)
-            page += 1
-
-        self.logger.emit("downline_fetched", {"count": total_new_rows})
-        return total_new_rows
-
-    def fetch_bonuses(self, url: str, auth: AuthData, csv_file: str = "bonuses.csv") -> Union[Tuple[int, float, dict[str, bool]], str]:
-        C_KEYWORDS = ["commission", "affiliate"]
-        D_KEYWORDS = ["downline first deposit"]
-        S_KEYWORDS = ["share bonus", "referrer"]
-        bonus_type_flags = {"C": False, "D": False, "S": False, "O": False}
-
-        payload = {
-            "module": "/users/syncData", "merchantId": auth.merchant_id, "domainId": "0",
-            "accessId": auth.access_id, "accessToken": auth.token, "walletIsAdmin": ""
-        }
-        self.logger.emit("api_request", {"url": auth.api_url, "module": payload.get("module")})
-        try:
-            response = requests.post(auth.api_url, data=payload, timeout=self.request_timeout)
-            response.raise_for_status()
-            res = response.json()
-            response_details = {"url": auth.api_url, "module": payload.get("module"), "status": res.get("status")}
-            if res.get("status") != "SUCCESS":
-                if res.get("message"): response_details["error_message"] = res.get("message")
-                if isinstance(res.get("data"), dict) and res.get("data", {}).get("description"):
-                    response_details["error_description"] = res.get("data").get("description")
-                elif isinstance(res.get("data"), str): response_details["error_data_string"] = res.get("data")
-            self.logger.emit("api_response", response_details)
-        except requests.exceptions.Timeout as e:
-            self.logger.emit("website_unresponsive", {"url": auth.api_url, "error": f"Timeout: {str(e)}"})
-            return "UNRESPONSIVE"
-        except requests.exceptions.ConnectionError as e:
-            self.logger.emit("website_unresponsive", {"url": auth.api_url, "error": f"ConnectionError: {str(e)}"})
-            return "UNRESPONSIVE"
-        except Exception as e:
-            self.logger.emit("exception", {"error": f"Bonus fetch failed for {auth.api_url}: {str(e)}"})
-            return "ERROR"
-
-        if res.get("status") != "SUCCESS":
-            self.logger.emit("bonus_api_error", {"url": auth.api_url, "status": res.get("status"), "error_message": res.get("message", "N/A"), "error_data": res.get("data", "N/A")})
-            return "ERROR"
-
-        bonuses_data_raw = res.get("data", {}).get("bonus", []) + res.get("data", {}).get("promotions", [])
-        if not bonuses_data_raw:
-            self.logger.emit("bonus_fetched", {"count": 0, "total_amount": 0.0})
-            return 0, 0.0, bonus_type_flags
-        
-        rows_to_write_obj: List[Bonus] = []
-        os.makedirs(os.path.dirname(csv_file), exist_ok=True)
-        file_exists_and_not_empty = os.path.exists(csv_file) and os.path.getsize(csv_file) > 0
-        with open(csv_file, "a", newline="", encoding="utf-8") as f:
-            fieldnames = [field.name for field in Bonus.__dataclass_fields__.values()]
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            if not file_exists_and_not_empty:
-                writer.writeheader()
-
-            for b_data in bonuses_data_raw:
-                try:
-                    min_w = float(b_data.get("minWithdraw", 0) or 0)
-                    bonus_f = float(b_data.get("bonusFixed", 0) or 0)
-                    ratio = min_w / bonus_f if bonus_f != 0 else None
-                except (ValueError, TypeError):
-                    self.logger.emit("exception", {"error": f"Type error processing bonus data for {url}: {b_data}"})
-                    continue
-                
-                bonus_instance = Bonus(
-                    url=url, merchant_name=auth.merchant_name, id=b_data.get("id"), name=b_data.get("name"),
-                    transaction_type=b_data.get("transactionType"), bonus_fixed=float(b_data.get("bonusFixed", 0) or 0),
-                    amount=float(b_data.get("amount", 0) or 0), min_withdraw=float(b_data.get("minWithdraw", 0) or 0),
-                    max_withdraw=float(b_data.get("maxWithdraw", 0) or 0), withdraw_to_bonus_ratio=ratio,
-                    rollover=float(b_data.get("rollover", 0) or 0), balance=str(b_data.get("balance", "")),
-                    claim_config=str(b_data.get("claimConfig", "")), claim_condition=str(b_data.get("claimCondition", "")),
-                    bonus=str(b_data.get("bonus", "")), bonus_random=str(b_data.get("bonusRandom", "")),
-                    reset=str(b_data.get("reset", "")), min_topup=float(b_data.get("minTopup", 0) or 0),
-                    max_topup=float(b_data.get("maxTopup", 0) or 0), refer_link=str(b_data.get("referLink", ""))
-                )
-                rows_to_write_obj.append(bonus_instance)
-
-                name_lower = bonus_instance.name.lower() if bonus_instance.name else ""
-                claim_config_lower = bonus_instance.claim_config.lower() if bonus_instance.claim_config else ""
-                matched_c_d_s_for_this_bonus = False
-                if any(keyword in name_lower or keyword in claim_config_lower for keyword in C_KEYWORDS):
-                    bonus_type_flags["C"] = True; matched_c_d_s_for_this_bonus = True
-                if any(keyword in name_lower or keyword in claim_config_lower for keyword in D_KEYWORDS):
-                    bonus_type_flags["D"] = True; matched_c_d_s_for_this_bonus = True
-                if any(keyword in name_lower or keyword in claim_config_lower for keyword in S_KEYWORDS):
-                    bonus_type_flags["S"] = True; matched_c_d_s_for_this_bonus = True
-                if not matched_c_d_s_for_this_bonus:
-                    bonus_type_flags["O"] = True
-            if rows_to_write_obj:
-                writer.writerows([b.__dict__ for b in rows_to_write_obj])
-                self.logger.emit("csv_written", {"file": csv_file, "count": len(rows_to_write_obj)})
-
-        current_fetch_total_amount = sum(b.amount for b in rows_to_write_obj)
-        self.logger.emit("bonus_fetched", {"count": len(rows_to_write_obj), "total_amount": current_fetch_total_amount})
-        return len(rows_to_write_obj), current_fetch_total_amount, bonus_type_flags
-
-def load_urls(url_file: str) -> List[str]:
+from .config import AppConfig, ConfigLoader, Credentials
+from .scraper import Scraper
+from .http_pool import SessionPool
+from .storage import create_storage
+from .auth_cache import AuthCache, MerchantCache
+from .classifier import BonusClassifier
+from .fingerprints import BonusFingerprints
+from .comparison import comparison_report_path, load_day, write_comparison_report
+from .history import HistoryArchive
+from .journal import RunJournal
+from .scheduler import SiteScheduler
+from .host_health import HostHealth
+from .timing import PhaseTimings
+from .rate_limit import RateLimiter
+from .run_cache import RunMetricsStore
+from .url_list import UrlList
+from .utils import progress
+
+def load_urls(url_file: str, logger: Logger) -> List[str]:
+    """The unique merchant endpoints of url_file, in file order (see UrlList)."""
     if not os.path.exists(url_file):
         print(f"URL file not found: {url_file}")
         return []
-    with open(url_file, "r") as f:
-        return [url.strip() for url in f if url.strip()]
+    url_list = UrlList(url_file).load()
+    sites = url_list["sites"]
+    logger.emit("urls_loaded", {
+        "file": url_file, "entries": url_list["entries"], "sites": len(sites),
+        "duplicates": url_list["entries"] - len(sites) - len(url_list["invalid"]),
+        "invalid": url_list["invalid"], "cached": url_list["cached"]
+    })
+    for line in url_list["invalid"]:
+        print(f"Warning: Ignoring invalid URL in {url_file}: {line}")
+    return [site.url for site in sites]
+
+def process_account(url: str, account: Credentials, config: AppConfig, logger: Logger, auth_service: AuthService, scraper: Scraper, merchant_for_login: Callable[[], Any]) -> SiteResult:
+    """Logs one account in to a site and fetches its bonuses (tagged with the account) or downlines."""
+    result = SiteResult(url=url, cleaned_url=url)
+    try:
+        mobile, password = account.mobile, account.password
+        auth_data = auth_service.cached_login(url, mobile)
+        from_cache = auth_data is not None
+        if not from_cache:
+            auth_data = auth_service.login(url, mobile, password, merchant_for_login())
+        if not isinstance(auth_data, AuthData):
+            result.errors = 1
+            result.unresponsive = auth_data == "UNRESPONSIVE"
+            logger.emit("exception", {"error": f"Authentication failed for {url} ({account.name})"})
+        else:
+            def fetch(auth: AuthData):
+                if config.settings.downline_enabled:
+                    return scraper.fetch_downlines(url, auth)
+                return scraper.fetch_bonuses(url, auth, account.name)
+
+            fetch_result = fetch(auth_data)
+            if from_cache and fetch_result == "ERROR":
+                # The cached token was most likely rejected: log in for real and retry once
+                auth_service.invalidate(url, mobile)
+                auth_data = auth_service.login(url, mobile, password, merchant_for_login())
+                if isinstance(auth_data, AuthData):
+                    fetch_result = fetch(auth_data)
+            if config.settings.downline_enabled:
+                result.record_downlines(fetch_result)
+            else:
+                result.record_bonuses(fetch_result)
+    except Exception as e:
+        result.errors = 1
+        logger.emit("exception", {"error": f"Outer loop exception for {url} ({account.name}): {str(e)}"})
+    return result
+
+def process_site(url: str, config: AppConfig, logger: Logger, auth_service: AuthService, scraper: Scraper, deadline: Optional[float] = None, account_executor: Optional[ThreadPoolExecutor] = None) -> SiteResult:
+    """
+    Logs in to one site (a merchant endpoint from load_urls) with every configured account
+    and fetches its bonuses or downlines. The landing page is fetched at most once per site;
+    with account_executor the accounts after the first run concurrently on it, sharing the
+    site's pooled session. Safe to run from worker threads.
+    """
+    site_start_time = time.time()
+    cleaned_url = url
+    result = SiteResult(url=url, cleaned_url=cleaned_url)
+    if deadline is not None and site_start_time >= deadline:
+        result.skipped = True
+        return result
+    merchant_lock = threading.Lock()
+    merchant: Dict[str, Any] = {}
+
+    def merchant_for_login():
+        with merchant_lock: # The first account to need it fetches the landing page, the rest reuse it
+            if "info" not in merchant:
+                merchant["info"] = auth_service.merchant_info(cleaned_url)
+            return merchant["info"]
+
+    def run_account(account: Credentials) -> SiteResult:
+        return process_account(cleaned_url, account, config, logger, auth_service, scraper, merchant_for_login)
 
-def main():
+    try:
+        first, *others = config.accounts
+        # Tasks on account_executor never wait on each other, so it cannot deadlock
+        pending = [account_executor.submit(run_account, account) for account in others] if account_executor else []
+        account_results = [run_account(first)]
+        account_results += [future.result() for future in pending] if account_executor else [run_account(a) for a in others]
+        result.add_accounts(account_results)
+    except Exception as e:
+        result.errors = 1
+        logger.emit("exception", {"error": f"Outer loop exception for {cleaned_url}: {str(e)}"})
+    finally:
+        auth_service.session_pool.release(cleaned_url)
+    result.duration = time.time() - site_start_time
+    auth_service.timings.record(cleaned_url, "site_total", result.duration)
+    return result
+
+def execute_scraping_logic(gui_callback=None, resume: bool = False):
+    """
+    One scraping job as configured in config.ini. gui_callback receives the log lines (batched
+    when logging is queued). With resume, the sites already finished today by an interrupted
+    run are skipped.
+    """
     config_loader = ConfigLoader(path="config.ini")
     config = config_loader.load()
-    run_cache_data = load_run_cache()
+    run_cache = RunMetricsStore(config.storage.run_cache_file)
+    run_cache_data = run_cache.load()
     run_cache_data["total_script_runs"] += 1
-    REQUEST_TIMEOUT = 30
+    run_count = run_cache_data["total_script_runs"]
     unresponsive_sites_this_run = []
-    logger = Logger(log_file=config.logging.log_file, log_level=config.logging.log_level, console=config.logging.console, detail=config.logging.detail)
-    auth_service = AuthService(logger)
-    scraper = Scraper(logger, REQUEST_TIMEOUT)
-    urls = load_urls(config.settings.url_file)
+    logger = Logger(log_file=config.logging.log_file, log_level=config.logging.log_level, console=config.logging.console, detail=config.logging.detail, gui_callback=gui_callback, queued=config.logging.queued)
+    rate_limiter = RateLimiter(
+        config.rate_limit.rate, config.rate_limit.burst, config.rate_limit.max_concurrent, config.rate_limit.key,
+        config.rate_limit.backoff_base, config.rate_limit.backoff_max, config.http.max_retries, logger
+    )
+    timings = PhaseTimings(logger)
+    session_pool = SessionPool(pool_size=config.http.pool_size, max_retries=config.http.max_retries, backoff_factor=config.http.backoff_factor, keep_alive=config.http.keep_alive, rate_limiter=rate_limiter, timings=timings)
+    auth_cache = AuthCache(config.auth.token_cache_file, config.auth.token_ttl_hours * 3600) if config.auth.token_cache else None
+    merchant_cache = MerchantCache(config.auth.merchant_cache_file) if config.auth.merchant_cache else None
+    host_health = HostHealth(
+        config.health.file, config.http.timeout, config.health.min_timeout, config.health.timeout_multiplier,
+        config.health.samples, config.health.down_runs, config.health.probe_every
+    ) if config.health.enabled else None
+    auth_service = AuthService(logger, session_pool, auth_cache, merchant_cache, timings, config.http.timeout, host_health)
+    run_date = datetime.now().date()
+    storage = create_storage(config.storage.backend, run_date, config.storage.sqlite_path, config.storage.export_csv, config.storage.fsync_interval)
+    fingerprints = BonusFingerprints(config.changes.fingerprint_file, config.changes.log_file) if config.changes.enabled else None
+    scraper = Scraper(logger, config.http.timeout, session_pool, storage, timings, host_health, config.settings.downline_window, BonusClassifier(config.categories), fingerprints)
+    urls = load_urls(config.settings.url_file, logger)
+    journal = RunJournal(config.storage.journal_file)
+    completed_sites = journal.open(run_date, resume)
+    if completed_sites:
+        urls = [url for url in urls if url not in completed_sites]
+        logger.emit("run_resumed", {"journal": journal.path, "completed": len(completed_sites), "remaining": len(urls)})
+        print(f"Resuming: {len(completed_sites)} site(s) already done today, {len(urls)} to go.")
+    deferred_sites = []
+    if config.schedule.order == "yield" or config.schedule.max_sites:
+        scheduler = SiteScheduler(run_cache_data["sites"], run_count, config.settings.downline_enabled, config.schedule.staleness_weight, config.schedule.error_penalty, config.schedule.empty_penalty)
+        ordered = scheduler.order(urls) if config.schedule.order == "yield" else urls
+        limit = config.schedule.max_sites or len(ordered)
+        urls, deferred_sites = ordered[:limit], ordered[limit:]
+        logger.emit("schedule", {"order": config.schedule.order, "sites": len(urls), "deferred": len(deferred_sites), "first": urls[:5]})
+    skipped_sites = []
+    if host_health and urls:
+        # Hosts down for the last down_runs runs are skipped until a probe is due; probes go last
+        urls, skipped_sites = host_health.plan(urls, run_count)
 
     def format_stat_display(current_val, prev_val):
         if current_val == 0 and prev_val == 0: return ""
         diff = current_val - prev_val
         return f"{current_val}/{prev_val}({diff:+})"
 
-    if not urls:
-        logger.emit("job_start", {"url_count": 0, "status": "No URLs to process"})
-        print("No URLs to process. Exiting.")
-        return
-        
-    total_urls = len(urls)
-    history = logger.load_metrics(config.logging.log_file)
-    metrics = {
-        "bonuses_old": history.get("bonuses", 0), "downlines_old": history.get("downlines", 0),
-        "errors_old": history.get("errors", 0), "bonuses_new": 0, "downlines_new": 0, "errors_new": 0,
-        "bonus_amount_new": 0.0
-    }
-    metrics["bonuses_total_old"] = history.get("bonuses", 0)
-    metrics["downlines_total_old"] = history.get("downlines", 0)
-    metrics["errors_total_old"] = history.get("errors", 0)
-    metrics["bonus_amount_total_old"] = history.get("total_bonus_amount", 0.0)
-    metrics["bonuses_total_new"] = metrics["bonuses_total_old"]
-    metrics["downlines_total_new"] = metrics["downlines_total_old"]
-    metrics["errors_total_new"] = metrics["errors_total_old"]
-    metrics["bonus_amount_total_new"] = metrics["bonus_amount_total_old"]
-
+    if skipped_sites:
+        logger.emit("circuit_open", {"sites": skipped_sites, "count": len(skipped_sites), "down_runs": config.health.down_runs, "probe_every": config.health.probe_every})
+        print(f"Skipping {len(skipped_sites)} site(s) down for the last {config.health.down_runs}+ runs; they are probed again every {config.health.probe_every} runs.")
+    executor = ThreadPoolExecutor(max_workers=config.settings.workers)
+    # Every worker's site can have all its other accounts in flight at once
+    extra_accounts = len(config.accounts) - 1
+    account_executor = ThreadPoolExecutor(max_workers=config.settings.workers * extra_accounts) if extra_accounts else None
+    site_results = None
     try:
-        logger.emit("job_start", {"url_count": total_urls, "total_script_runs": run_cache_data.get("total_script_runs", "N/A")})
+        if not urls:
+            logger.emit("job_start", {"url_count": 0, "status": "No URLs to process"})
+            print("No URLs to process. Exiting.")
+            if skipped_sites:
+                run_cache.record_run(run_count) # Still count the run, or the skipped hosts' probes never come due
+            return
+
+        total_urls = len(urls)
+        history = logger.load_metrics(config.logging.log_file)
+        metrics = {
+            "bonuses_old": history.get("bonuses", 0), "downlines_old": history.get("downlines", 0),
+            "errors_old": history.get("errors", 0), "bonuses_new": 0, "downlines_new": 0, "errors_new": 0,
+            "bonus_amount_new": 0.0
+        }
+        metrics["bonuses_total_old"] = history.get("bonuses", 0)
+        metrics["downlines_total_old"] = history.get("downlines", 0)
+        metrics["errors_total_old"] = history.get("errors", 0)
+        metrics["bonus_amount_total_old"] = history.get("total_bonus_amount", 0.0)
+        metrics["bonuses_total_new"] = metrics["bonuses_total_old"]
+        metrics["downlines_total_new"] = metrics["downlines_total_old"]
+        metrics["errors_total_new"] = metrics["errors_total_old"]
+        metrics["bonus_amount_total_new"] = metrics["bonus_amount_total_old"]
+
+        logger.emit("job_start", {"url_count": total_urls, "total_script_runs": run_cache_data.get("total_script_runs", "N/A"), "workers": config.settings.workers, "engine": config.settings.engine, "accounts": [account.name for account in config.accounts]})
+        run_cache.record_run(run_count)
         start_time = time.time()
-
-        for idx, url in enumerate(urls, 1):
+        # Sites not yet started at the deadline come back as skipped; the ones in flight finish
+        deadline = start_time + config.schedule.time_budget if config.schedule.time_budget else None
+        out_of_time_sites = []
+
+        # Sites run concurrently (thread pool or one asyncio loop); both yield results in
+        # scheduled order so merging into metrics/run_cache_data and the display stay deterministic.
+        if config.settings.engine == "asyncio":
+            from .async_engine import run_sites_async # aiohttp is only needed for this engine
+            site_results = run_sites_async(urls, config, logger, config.http.timeout, storage, auth_cache, merchant_cache, timings, host_health, deadline, rate_limiter, fingerprints)
+        else:
+            site_results = executor.map(
+                lambda u: process_site(u, config, logger, auth_service, scraper, deadline, account_executor), urls
+            )
+        idx = 0
+        for site_result in site_results:
+            if site_result.skipped:
+                out_of_time_sites.append(site_result.cleaned_url)
+                continue
+            idx += 1
             if idx > 1:
                 sys.stdout.write('\x1b[3A')
                 sys.stdout.write('\x1b[J')
 
-            site_start_time = time.time()
-            cleaned_url = auth_service.clean_url(url)
+            cleaned_url = site_result.cleaned_url
             site_key = cleaned_url
-            cr_bonuses_site, cr_downlines_site, cr_errors_site = 0, 0, 0
             site_cache_entry = run_cache_data["sites"].get(site_key, {})
             pr_bonuses = site_cache_entry.get("last_run_new_bonuses", 0)
             prt_bonuses = site_cache_entry.get("cumulative_total_bonuses", 0)
@@ -259,55 +242,35 @@ def main():
             pr_errors = site_cache_entry.get("last_run_new_errors", 0)
             prt_errors = site_cache_entry.get("cumulative_total_errors", 0)
 
-            try:
-                auth_data = auth_service.login(cleaned_url, config.credentials.mobile, config.credentials.password)
-                current_site_bonus_flags = {"C": False, "D": False, "S": False, "O": False}
-                if not auth_data:
-                    metrics["errors_new"] += 1; metrics["errors_total_new"] += 1; cr_errors_site = 1
-                    logger.emit("exception", {"error": f"Authentication failed for {cleaned_url}"})
-                
-                if auth_data:
-                    if config.settings.downline_enabled:
-                        result_dl = scraper.fetch_downlines(cleaned_url, auth_data)
-                        if isinstance(result_dl, str):
-                            metrics["errors_new"] += 1; metrics["errors_total_new"] += 1; cr_errors_site = 1
-                            if result_dl == "UNRESPONSIVE": unresponsive_sites_this_run.append(cleaned_url)
-                        else:
-                            cr_downlines_site = result_dl
-                            metrics["downlines_new"] += result_dl; metrics["downlines_total_new"] += result_dl
-                    else:
-                        bonus_csv_path = datetime.now().strftime("data/%m-%d bonuses.csv")
-                        result_bonuses = scraper.fetch_bonuses(cleaned_url, auth_data, csv_file=bonus_csv_path)
-                        if isinstance(result_bonuses, str):
-                            metrics["errors_new"] += 1; metrics["errors_total_new"] += 1; cr_errors_site = 1
-                            if result_bonuses == "UNRESPONSIVE": unresponsive_sites_this_run.append(cleaned_url)
-                        else:
-                            count, current_fetch_total_amount, current_site_bonus_flags = result_bonuses
-                            cr_bonuses_site = count
-                            metrics["bonuses_new"] += count; metrics["bonus_amount_new"] += current_fetch_total_amount
-                            metrics["bonuses_total_new"] += count; metrics["bonus_amount_total_new"] += current_fetch_total_amount
-            except Exception as e:
-                metrics["errors_new"] += 1; metrics["errors_total_new"] += 1; cr_errors_site = 1
-                logger.emit("exception", {"error": f"Outer loop exception for {cleaned_url}: {str(e)}"})
+            cr_bonuses_site, cr_downlines_site, cr_errors_site = site_result.bonuses, site_result.downlines, site_result.errors
+            metrics["errors_new"] += cr_errors_site; metrics["errors_total_new"] += cr_errors_site
+            metrics["downlines_new"] += cr_downlines_site; metrics["downlines_total_new"] += cr_downlines_site
+            metrics["bonuses_new"] += cr_bonuses_site; metrics["bonuses_total_new"] += cr_bonuses_site
+            metrics["bonus_amount_new"] += site_result.bonus_amount; metrics["bonus_amount_total_new"] += site_result.bonus_amount
+            if site_result.unresponsive: unresponsive_sites_this_run.append(cleaned_url)
+            if host_health: host_health.observe(cleaned_url, not site_result.unresponsive, timings.slowest_request(cleaned_url))
 
             crt_bonuses = prt_bonuses + cr_bonuses_site
             crt_downlines = prt_downlines + cr_downlines_site
             crt_errors = prt_errors + cr_errors_site
-            run_cache_data["sites"].setdefault(site_key, {})
-            run_cache_data["sites"][site_key].update({
+            site_entry = run_cache_data["sites"].setdefault(site_key, {})
+            site_entry.update(SiteScheduler.history(site_entry, cr_downlines_site if config.settings.downline_enabled else cr_bonuses_site, cr_errors_site))
+            site_entry.update({
                 "last_run_new_bonuses": cr_bonuses_site, "cumulative_total_bonuses": crt_bonuses,
                 "last_run_new_downlines": cr_downlines_site, "cumulative_total_downlines": crt_downlines,
                 "last_run_new_errors": cr_errors_site, "cumulative_total_errors": crt_errors,
-                "bonus_flags": current_site_bonus_flags
+                "bonus_flags": site_result.bonus_flags, "last_scraped_run": run_count
             })
+            run_cache.put_site(site_key, run_cache_data["sites"][site_key])
+            storage.commit() # The site's rows are durable before the journal says it is done
+            journal.record(site_result)
             
-            site_processing_duration = time.time() - site_start_time
+            site_processing_duration = site_result.duration
             percent = (idx / total_urls) * 100
-            run_count = run_cache_data["total_script_runs"]
             sfs = run_cache_data["sites"][site_key] # Use the newly updated cache entry for display stats
             
             bonus_flags = sfs.get('bonus_flags', {})
-            flags_str = f"[C] {'Y' if bonus_flags.get('C') else 'N'} [D] {'Y' if bonus_flags.get('D') else 'N'} [S] {'Y' if bonus_flags.get('S') else 'N'} [O] {'Y' if bonus_flags.get('O') else 'N'}"
+            flags_str = " ".join(f"[{flag}] {'Y' if found else 'N'}" for flag, found in bonus_flags.items())
             progress_bar_str = progress(idx, vmin=0, vmax=total_urls, length=40, title="")
             
             line1 = f"| {progress_bar_str} | [{percent:.2f}%] {idx}/{total_urls} |"
@@ -337,132 +300,77 @@ def main():
             "duration": elapsed, "total_urls_processed": total_urls,
             "bonuses_fetched_this_run": metrics["bonuses_new"], "bonus_amount_this_run": metrics["bonus_amount_new"],
             "avg_bonus_amount_this_run": avg_bonus_amount_this_run, "downlines_fetched_this_run": metrics["downlines_new"],
-            "errors_this_run": metrics["errors_new"], "unresponsive_sites_count_this_run": len(unresponsive_sites_this_run)
+            "errors_this_run": metrics["errors_new"], "unresponsive_sites_count_this_run": len(unresponsive_sites_this_run),
+            "skipped_sites_count_this_run": len(skipped_sites),
+            "deferred_sites_count_this_run": len(deferred_sites) + len(out_of_time_sites)
         }
+        if fingerprints:
+            job_summary_details["bonus_changes_this_run"] = dict(fingerprints.counts)
+        if out_of_time_sites:
+            logger.emit("time_budget_reached", {"time_budget": config.schedule.time_budget, "scraped": idx, "not_started": len(out_of_time_sites), "sites": out_of_time_sites})
+            print(f"Time budget of {config.schedule.time_budget:g}s reached: {len(out_of_time_sites)} site(s) left for the next run.")
+        if host_health:
+            host_health.end_run(run_count)
         
-        today_date_str = datetime.now().strftime('%m-%d')
-        daily_bonus_csv_path = f"data/{today_date_str} bonuses.csv"
-        historical_excel_path = "data/historical_bonuses.xlsx"
+        storage.flush() # Commit this run's records before reading them back for the archive and comparison
+        history_archive = HistoryArchive(config.storage.history_dir)
+        today_bonus_df = storage.load_bonuses(run_date)
         if not config.settings.downline_enabled: 
-            if os.path.exists(daily_bonus_csv_path) and os.path.getsize(daily_bonus_csv_path) > 0:
+            if not today_bonus_df.empty:
                 try:
-                    bonus_df_for_excel = pd.read_csv(daily_bonus_csv_path) # Renamed to avoid conflict
-                    if not bonus_df_for_excel.empty:
-                        os.makedirs(os.path.dirname(historical_excel_path), exist_ok=True)
-                        mode = 'a' if os.path.exists(historical_excel_path) else 'w'
-                        with pd.ExcelWriter(historical_excel_path, engine='openpyxl', mode=mode, if_sheet_exists='replace') as writer:
-                            bonus_df_for_excel.to_excel(writer, sheet_name=today_date_str, index=False)
-                        logger.emit("historical_data_written", {"file": historical_excel_path, "sheet": today_date_str, "rows": len(bonus_df_for_excel)})
-                    else:
-                        logger.emit("historical_data_skipped", {"reason": "Daily bonus CSV is empty", "file": daily_bonus_csv_path})
+                    history_path = history_archive.write_day(run_date, today_bonus_df)
+                    logger.emit("historical_data_written", {"file": history_path, "rows": len(today_bonus_df)})
                 except Exception as e:
-                    logger.emit("historical_data_error", {"file": daily_bonus_csv_path, "excel_file": historical_excel_path, "error": str(e)})
+                    logger.emit("historical_data_error", {"file": storage.target("bonuses"), "history_dir": history_archive.root, "error": str(e)})
+                    print(f"Warning: Could not archive today's bonuses in '{history_archive.root}': {e}")
             else:
-                logger.emit("historical_data_skipped", {"reason": "Daily bonus CSV not found or empty", "file": daily_bonus_csv_path})
-
-        try:
-            today_dt = datetime.now()
-            yesterday_dt = today_dt - timedelta(days=1)
-            today_sheet_name_comp = today_dt.strftime('%m-%d') # Renamed
-            yesterday_sheet_name_comp = yesterday_dt.strftime('%m-%d') # Renamed
-            comparison_report_path = f"data/comparison_report_{today_sheet_name_comp}.csv"
-            
-            today_df_comp = None # Renamed
-            # Use daily_bonus_csv_path if it was for today and bonus_df_for_excel is available
-            if 'bonus_df_for_excel' in locals() and isinstance(bonus_df_for_excel, pd.DataFrame) and not bonus_df_for_excel.empty and \
-               daily_bonus_csv_path == f"data/{today_sheet_name_comp} bonuses.csv":
-                 today_df_comp = bonus_df_for_excel
-            
-            if today_df_comp is None: 
-                current_day_bonus_csv = f"data/{today_sheet_name_comp} bonuses.csv"
-                if os.path.exists(current_day_bonus_csv) and os.path.getsize(current_day_bonus_csv) > 0:
-                    today_df_comp = pd.read_csv(current_day_bonus_csv)
-                else:
-                    today_df_comp = pd.DataFrame() 
+                logger.emit("historical_data_skipped", {"reason": "No bonuses stored for today", "file": storage.target("bonuses")})
 
-            yesterday_df_comp = pd.DataFrame() # Renamed
-            if os.path.exists(historical_excel_path): 
-                try:
-                    yesterday_df_comp = pd.read_excel(historical_excel_path, sheet_name=yesterday_sheet_name_comp)
-                except Exception as e: # Simplified error handling for brevity in this section
-                    logger.emit("comparison_info", {"message": f"Could not read yesterday's sheet ({yesterday_sheet_name_comp}) for comparison: {str(e)}"})
-            
-            expected_columns = [
-                'url', 'merchant_name', 'id', 'name', 'transaction_type', 'bonus_fixed', 'amount',
-                'min_withdraw', 'max_withdraw', 'withdraw_to_bonus_ratio', 'rollover', 'balance',
-                'claim_config', 'claim_condition', 'bonus', 'bonus_random', 'reset',
-                'min_topup', 'max_topup', 'refer_link'
-            ]
-
-            if today_df_comp.empty: today_df_comp = pd.DataFrame(columns=expected_columns)
-            else:
-                for col in expected_columns:
-                    if col not in today_df_comp.columns: today_df_comp[col] = pd.NA
-            if yesterday_df_comp.empty: yesterday_df_comp = pd.DataFrame(columns=expected_columns)
-            else:
-                for col in expected_columns:
-                    if col not in yesterday_df_comp.columns: yesterday_df_comp[col] = pd.NA
-            
-            key_cols = ['merchant_name', 'name', 'amount']
-            for df_ref in [today_df_comp, yesterday_df_comp]:
-                if not df_ref.empty:
-                    for col in key_cols:
-                        if col == 'amount': df_ref[col] = pd.to_numeric(df_ref[col], errors='coerce').round(5)
-                        else: df_ref[col] = df_ref[col].astype(str).fillna('') 
-                    df_ref.dropna(subset=[k for k in key_cols if k in df_ref.columns], how='any', inplace=True)
-
-            if not today_df_comp.empty: today_df_comp['_comparison_key'] = today_df_comp.apply(lambda row: f"{row['merchant_name']}_{row['name']}_{row['amount']}", axis=1)
-            else: today_df_comp['_comparison_key'] = pd.Series(dtype='object')
-            if not yesterday_df_comp.empty: yesterday_df_comp['_comparison_key'] = yesterday_df_comp.apply(lambda row: f"{row['merchant_name']}_{row['name']}_{row['amount']}", axis=1)
-            else: yesterday_df_comp['_comparison_key'] = pd.Series(dtype='object')
-            
-            report_data_list = []
-            if not today_df_comp.empty or not yesterday_df_comp.empty: # Proceed if at least one DF has data
-                merged_df = pd.merge(today_df_comp, yesterday_df_comp, on='_comparison_key', how='outer', suffixes=('_today', '_yesterday'), indicator=True)
-                report_columns = ['status', 'change_details'] + expected_columns
-                for _, row in merged_df.iterrows(): # Renamed idx to _ to avoid clash with outer loop
-                    item_details, status, change_details_str = {}, "", ""
-                    is_new, is_used, is_persistent = row['_merge'] == 'left_only', row['_merge'] == 'right_only', row['_merge'] == 'both'
-                    
-                    if is_new: status = "New"; suffix = '_today'
-                    elif is_used: status = "Used"; suffix = '_yesterday'
-                    else: status = "Persistent_Unchanged"; suffix = '_today' # Default for persistent
-                    
-                    for col in expected_columns: item_details[col] = row.get(col + suffix, pd.NA)
-
-                    if is_persistent:
-                        changes = []
-                        for col in expected_columns:
-                            val_t, val_y = row.get(col + '_today'), row.get(col + '_yesterday')
-                            if pd.isna(val_t) and pd.isna(val_y): continue
-                            if pd.isna(val_t) or pd.isna(val_y) or str(val_t) != str(val_y):
-                                if isinstance(val_t, float) or isinstance(val_y, float): # Numerical comparison
-                                    if round(pd.to_numeric(val_t, errors='coerce'),5) != round(pd.to_numeric(val_y, errors='coerce'),5):
-                                        changes.append(f"{col}: '{val_y}' -> '{val_t}'")
-                                else: # String comparison
-                                    changes.append(f"{col}: '{val_y}' -> '{val_t}'")
-                        if changes: status = "Persistent_Changed"; change_details_str = "; ".join(changes)
-                    
-                    item_details['status'], item_details['change_details'] = status, change_details_str
-                    report_data_list.append({key: item_details.get(key) for key in report_columns})
-
-                if report_data_list:
-                    report_df = pd.DataFrame(report_data_list, columns=report_columns)
-                    os.makedirs(os.path.dirname(comparison_report_path), exist_ok=True)
-                    report_df.to_csv(comparison_report_path, index=False, encoding='utf-8')
-                    logger.emit("comparison_report_generated", {"path": comparison_report_path, "rows": len(report_df)})
-                else: logger.emit("comparison_info", {"message": "No changes for comparison report."})
-            else: logger.emit("comparison_info", {"message": "Both today's and yesterday's bonus data are empty. No comparison report generated."})
-        except Exception as e:
-            import traceback
-            logger.emit("comparison_module_error", {"error_type": type(e).__name__, "error": str(e), "traceback": traceback.format_exc()})
+        # With [changes] enabled the bonuses were classified as they were scraped; src.comparison still diffs any two days
+        if not fingerprints:
+            try:
+                yesterday_df = load_day(storage, run_date - timedelta(days=1), logger, history_archive)
+                write_comparison_report(today_bonus_df, yesterday_df, comparison_report_path(run_date), logger)
+            except Exception as e:
+                import traceback
+                logger.emit("comparison_module_error", {"error_type": type(e).__name__, "error": str(e), "traceback": traceback.format_exc()})
 
         logger.emit("job_complete", job_summary_details)
+        timing_summary = timings.summary()
+        logger.emit("timing_summary", timing_summary)
+        print(PhaseTimings.format_report(timing_summary))
+        rate_limit_summary = rate_limiter.summary()
+        if rate_limit_summary["waited_seconds"] or rate_limit_summary["throttled"]:
+            logger.emit("rate_limit_summary", rate_limit_summary)
         if unresponsive_sites_this_run:
             logger.emit("down_sites_summary", {"sites": unresponsive_sites_this_run, "count": len(unresponsive_sites_this_run)})
     finally:
-        save_run_cache(run_cache_data)
-        logger.emit("cache_saved", {"path": "data/run_metrics_cache.json", "total_script_runs": run_cache_data.get("total_script_runs")})
+        # Drop queued sites on Ctrl-C instead of draining the whole list before exiting
+        if site_results is not None:
+            site_results.close()
+        executor.shutdown(wait=False, cancel_futures=True)
+        if account_executor:
+            account_executor.shutdown(wait=False, cancel_futures=True)
+        session_pool.close()
+        storage.close()
+        journal.close()
+        if fingerprints:
+            fingerprints.close()
+        if auth_cache:
+            auth_cache.save()
+        if merchant_cache:
+            merchant_cache.save()
+        if host_health:
+            host_health.save()
+        run_cache.close()
+        logger.emit("cache_saved", {"path": run_cache.path, "total_script_runs": run_cache_data.get("total_script_runs")})
+        logger.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrapes the sites in the configured URL file.")
+    parser.add_argument("--resume", action="store_true", help="Skip the sites an interrupted run already finished today")
+    args = parser.parse_args()
+    execute_scraping_logic(resume=args.resume)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+from .utils import atomic_write_json
+
+class MetricsIndex:
+    """
+    Running totals of the JSON log (bonuses, downlines, errors, runs, ...) checkpointed next
+    to it (``<log_file>.metrics.json``) with the byte offset they cover, so each load only
+    parses the lines appended since the previous one. A log that shrank or whose first
+    bytes changed (rotated or replaced) is rescanned from the start.
+    """
+    HEAD_BYTES = 256 # Fingerprint of the file the offset belongs to
+
+    def __init__(self, log_file: str, path: Optional[str] = None):
+        self.log_file = log_file
+        self.path = path or f"{log_file}.metrics.json"
+
+    @staticmethod
+    def empty_metrics() -> Dict[str, float]:
+        return {
+            "bonuses": 0, # Total count of individual bonus items
+            "downlines": 0,
+            "errors": 0, # General errors + unresponsive + API errors that lead to "ERROR" return
+            "runs": 0,
+            "total_runtime": 0.0,
+            "total_bonus_amount": 0.0,         # Sum of amounts from all bonus_fetched events
+            "successful_bonus_fetches": 0,     # Number of times bonus_fetched event occurred
+            "failed_bonus_api_calls": 0        # Number of times bonus_api_error event occurred
+        }
+
+    @staticmethod
+    def apply(metrics: Dict[str, float], log: Dict[str, Any]) -> None:
+        """Adds one parsed log record to metrics."""
+        event = log.get("event")
+        details = log.get("details", {}) # Ensure details is always a dict
+
+        if event == "bonus_fetched":
+            metrics["bonuses"] += details.get("count", 0)
+            metrics["total_bonus_amount"] += details.get("total_amount", 0.0)
+            metrics["successful_bonus_fetches"] += 1
+        elif event == "downline_fetched":
+            metrics["downlines"] += details.get("count", 0)
+        elif event == "exception" or event == "website_unresponsive": # Count these as errors for historical load
+            metrics["errors"] += 1
+        elif event == "bonus_api_error":
+            metrics["failed_bonus_api_calls"] += 1
+            metrics["errors"] += 1 # Also count as a general error for overall error tracking
+        elif event == "job_complete":
+            metrics["runs"] += 1
+            metrics["total_runtime"] += details.get("duration", 0.0)
+
+    def _head_digest(self, f, length: int) -> str:
+        f.seek(0)
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r') as f:
+                checkpoint = json.load(f)
+            if isinstance(checkpoint, dict) and isinstance(checkpoint.get("metrics"), dict):
+                return checkpoint
+        except (OSError, json.JSONDecodeError, ValueError):
+            pass
+        return None
+
+    def load(self) -> Dict[str, float]:
+        """Totals for the whole log, parsing only what was appended since the last checkpoint."""
+        metrics = self.empty_metrics()
+        if not os.path.exists(self.log_file):
+            return metrics
+
+        with open(self.log_file, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            offset = 0
+            checkpoint = self._load_checkpoint()
+            if checkpoint:
+                head_len = checkpoint.get("head_len", 0)
+                same_file = (
+                    checkpoint.get("offset", 0) <= size and head_len <= size
+                    and self._head_digest(f, head_len) == checkpoint.get("head_digest")
+                )
+                if same_file:
+                    offset = checkpoint["offset"]
+                    metrics.update(checkpoint["metrics"])
+
+            if offset == size:
+                return metrics
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break # Still being written; picked up by the next load
+                offset += len(line)
+                try:
+                    log = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+                if isinstance(log, dict):
+                    self.apply(metrics, log)
+            head_len = min(offset, self.HEAD_BYTES)
+            head_digest = self._head_digest(f, head_len)
+
+        try:
+            atomic_write_json(self.path, {"offset": offset, "head_len": head_len, "head_digest": head_digest, "metrics": metrics})
+        except OSError as e:
+            print(f"Warning: Could not save metrics checkpoint '{self.path}': {e}")
+        return metrics
@@ -0,0 +1,181 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs
+
+@dataclass
+class MockOptions:
+    latency: float = 0.05 # Seconds before every response
+    jitter: float = 0.0 # Up to this many extra seconds, uniformly random
+    error_rate: float = 0.0 # Fraction of API calls answered with HTTP 500
+    bonuses: int = 6 # Bonuses per syncData response
+    downline_pages: int = 5 # Non-empty getDownline pages per site
+    downlines_per_page: int = 10
+    page_bytes: int = 50_000 # Landing page padding after the merchant constants
+    seed: int = 0
+
+BONUS_NAMES = ["Commission bonus", "Share Bonus", "Daily reload", "Downline first deposit"]
+
+class MockMerchantHandler(BaseHTTPRequestHandler):
+    """
+    One merchant per path prefix: GET /<site>/<ref> is the landing page with the
+    MERCHANTID/MERCHANTNAME constants, POST /<site>/api/v1/index.php serves the
+    /users/login, /users/syncData and /referrer/getDownline modules.
+    """
+    protocol_version = "HTTP/1.1" # Keep-alive, like the real sites
+    server: "MockMerchantServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _site(self) -> str:
+        return f"{self.headers.get('Host')}/{self.path.strip('/').split('/')[0]}"
+
+    def _send(self, body: bytes, content_type: str = "application/json", status: int = 200, headers: Dict[str, str] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, data) -> None:
+        self._send(json.dumps(data).encode())
+
+    def _wait(self) -> None:
+        options = self.server.options
+        time.sleep(options.latency + (self.server.random() * options.jitter if options.jitter else 0.0))
+
+    def do_GET(self):
+        self._wait()
+        site = self._site()
+        etag = f'"{self.server.merchant_id(site)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        head = f'<html><head><script>var MERCHANTID = {self.server.merchant_id(site)};\n var MERCHANTNAME = "Mock {site}";</script></head><body>'
+        self._send((head + "x" * self.server.options.page_bytes + "</body></html>").encode(), "text/html; charset=utf-8", headers={"ETag": etag})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+        self._wait()
+        options = self.server.options
+        if options.error_rate and self.server.random() < options.error_rate:
+            self._send(b"Internal Server Error", "text/plain", status=500)
+            return
+        site, module = self._site(), form.get("module")
+        token = f"token-{self.server.merchant_id(site)}"
+        if module == "/users/login":
+            self._send_json({"status": "SUCCESS", "data": {"id": f"access-{self.server.merchant_id(site)}", "token": token}})
+        elif form.get("accessToken") != token:
+            self._send_json({"status": "FAIL", "message": "Invalid token"})
+        elif module == "/users/syncData":
+            bonuses = [{
+                "id": str(i), "name": BONUS_NAMES[i % len(BONUS_NAMES)], "transactionType": "DEPOSIT",
+                "bonusFixed": "5", "amount": str(10 + i), "minWithdraw": "20", "maxWithdraw": "100",
+                "rollover": "1", "balance": "", "claimConfig": "daily", "claimCondition": "", "bonus": "",
+                "bonusRandom": "", "reset": "", "minTopup": "0", "maxTopup": "0", "referLink": ""
+            } for i in range(options.bonuses)]
+            self._send_json({"status": "SUCCESS", "data": {"bonus": bonuses, "promotions": []}})
+        elif module == "/referrer/getDownline":
+            page = int(form.get("pageIndex", 0))
+            downlines = [{
+                "id": f"{page}-{i}", "name": f"member {page}-{i}", "count": 1, "amount": "1.5",
+                "registerDateTime": "2024-01-01 00:00:00"
+            } for i in range(options.downlines_per_page)] if page < options.downline_pages else []
+            self._send_json({"status": "SUCCESS", "data": {"downlines": downlines}})
+        else:
+            self._send_json({"status": "FAIL", "message": f"Unknown module {module}"})
+
+class MockMerchantServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+    def __init__(self, address: Tuple[str, int], options: MockOptions):
+        super().__init__(address, MockMerchantHandler)
+        self.options = options
+        self._random = random.Random(options.seed)
+        self._random_lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # The scraper hangs up on landing pages once it has what it needs
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def random(self) -> float:
+        with self._random_lock:
+            return self._random.random()
+
+    @staticmethod
+    def merchant_id(site: str) -> int:
+        return sum(site.encode()) % 90000 + 10000
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+def start_servers(options: MockOptions, hosts: int = 1) -> List[MockMerchantServer]:
+    """
+    Serves the mock merchants on `hosts` loopback addresses (127.0.0.1, 127.0.0.2, ...) on
+    background threads, so sites spread over several hosts like in production. Addresses
+    past 127.0.0.1 only exist on Linux; elsewhere use hosts=1.
+    """
+    servers = []
+    for i in range(hosts):
+        server = MockMerchantServer((f"127.0.0.{i + 1}", 0), options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    return servers
+
+def site_urls(servers: List[MockMerchantServer], count: int) -> List[str]:
+    """count synthetic site URLs in urls.txt format, round-robin over the servers."""
+    return [f"{servers[i % len(servers)].base_url}/site{i}/RF{i}" for i in range(count)]
+
+def add_options_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = MockOptions()
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="Seconds before every response")
+    parser.add_argument("--jitter", type=float, default=defaults.jitter, help="Extra random latency, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="Fraction of API calls that get HTTP 500")
+    parser.add_argument("--bonuses", type=int, default=defaults.bonuses, help="Bonuses per syncData response")
+    parser.add_argument("--downline-pages", type=int, default=defaults.downline_pages)
+    parser.add_argument("--downlines-per-page", type=int, default=defaults.downlines_per_page)
+    parser.add_argument("--page-bytes", type=int, default=defaults.page_bytes, help="Landing page size")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+def options_from_args(args: argparse.Namespace) -> MockOptions:
+    return MockOptions(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, bonuses=args.bonuses,
+        downline_pages=args.downline_pages, downlines_per_page=args.downlines_per_page,
+        page_bytes=args.page_bytes, seed=args.seed
+    )
+
+def main():
+    """Runs the mock merchants until interrupted and prints the URLs of `--sites` synthetic sites as JSON."""
+    parser = argparse.ArgumentParser(description="Local stand-in for the merchant sites.")
+    parser.add_argument("--hosts", type=int, default=1, help="Loopback addresses to serve on (Linux only above 1)")
+    parser.add_argument("--sites", type=int, default=10)
+    add_options_arguments(parser)
+    args = parser.parse_args()
+    servers = start_servers(options_from_args(args), args.hosts)
+    print(json.dumps({"urls": site_urls(servers, args.sites)}), flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,17 @@
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
 
-@dataclass
-class AuthData:
+# AuthData, Downline and Bonus are created per site, row and account, so they are NamedTuples:
+# no per-instance __dict__, and storage writes them as the tuples they are.
+
+class AuthData(NamedTuple):
     merchant_id: str
     merchant_name: str
     access_id: str
     token: str
     api_url: str
 
-@dataclass
-class Downline:
+class Downline(NamedTuple):
     url: str
     id: str
     name: str
@@ -18,8 +19,7 @@ class Downline:
     amount: float
     register_date_time: str
 
-@dataclass
-class Bonus:
+class Bonus(NamedTuple):
     url: str
     merchant_name: str
     id: str
@@ -40,3 +40,70 @@ class Bonus:
     min_topup: float
     max_topup: float
     refer_link: str
+    account: str = "" # Name of the credentials the bonus was fetched with
+    categories: str = "" # Comma-separated BonusClassifier categories, e.g. "C,S"
+
+# parse_downline and parse_bonus build a record from one API entry: a number field that is
+# missing or empty becomes 0.0, one that is not a number raises ValueError/TypeError
+
+def parse_downline(url: str, data: Dict[str, Any]) -> Downline:
+    get = data.get
+    return Downline(url, get("id"), get("name"), get("count", 0), float(get("amount") or 0), get("registerDateTime"))
+
+def parse_bonus(url: str, merchant_name: str, account: str, categories: str, data: Dict[str, Any]) -> Bonus:
+    get = data.get
+    bonus_fixed = float(get("bonusFixed") or 0)
+    min_withdraw = float(get("minWithdraw") or 0)
+    return Bonus(
+        url, merchant_name, get("id"), get("name"), get("transactionType"), bonus_fixed, float(get("amount") or 0),
+        min_withdraw, float(get("maxWithdraw") or 0), min_withdraw / bonus_fixed if bonus_fixed != 0 else None,
+        float(get("rollover") or 0), str(get("balance", "")), str(get("claimConfig", "")), str(get("claimCondition", "")),
+        str(get("bonus", "")), str(get("bonusRandom", "")), str(get("reset", "")), float(get("minTopup") or 0),
+        float(get("maxTopup") or 0), str(get("referLink", "")), account, categories
+    )
+
+@dataclass
+class SiteEntry:
+    """One merchant endpoint of the URL file, with the referral codes and line numbers that pointed at it."""
+    url: str
+    referral_codes: List[str] = field(default_factory=list)
+    lines: List[int] = field(default_factory=list)
+
+@dataclass
+class SiteResult:
+    """Outcome of processing a single site, merged into the run totals by the main thread."""
+    url: str
+    cleaned_url: str
+    bonuses: int = 0
+    bonus_amount: float = 0.0
+    downlines: int = 0
+    errors: int = 0
+    unresponsive: bool = False
+    bonus_flags: Dict[str, bool] = field(default_factory=lambda: {"C": False, "D": False, "S": False, "O": False})
+    duration: float = 0.0
+    skipped: bool = False # Not started because the run's time budget ran out
+
+    def add_accounts(self, account_results: List["SiteResult"]) -> None:
+        """Totals this site's per-account results; it is unresponsive only if no account got through."""
+        for account_result in account_results:
+            self.bonuses += account_result.bonuses
+            self.bonus_amount += account_result.bonus_amount
+            self.downlines += account_result.downlines
+            self.errors += account_result.errors
+            for flag, found in account_result.bonus_flags.items():
+                self.bonus_flags[flag] = self.bonus_flags.get(flag, False) or found
+        self.unresponsive = bool(account_results) and all(r.unresponsive for r in account_results)
+
+    def record_downlines(self, result_dl: Union[int, str]) -> None:
+        if isinstance(result_dl, str):
+            self.errors = 1
+            self.unresponsive = result_dl == "UNRESPONSIVE"
+        else:
+            self.downlines = result_dl
+
+    def record_bonuses(self, result_bonuses: Union[Tuple[int, float, Dict[str, bool]], str]) -> None:
+        if isinstance(result_bonuses, str):
+            self.errors = 1
+            self.unresponsive = result_bonuses == "UNRESPONSIVE"
+        else:
+            self.bonuses, self.bonus_amount, self.bonus_flags = result_bonuses
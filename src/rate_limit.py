@@ -0,0 +1,194 @@
+import asyncio
+import socket
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+from .http_pool import SessionPool
+from .logger import Logger
+
+class RateLimiter:
+    """
+    Token bucket plus concurrency cap per merchant host, or per platform (key = "platform":
+    hosts resolving to the same addresses, which are usually one backend behind several
+    domains). Every request first waits for a slot (at most max_concurrent in flight per key)
+    and a token (rate per second, bursts of up to burst). A 429 or 5xx response pauses its key
+    for the Retry-After it sent, or else backoff_base doubled per consecutive throttle, capped
+    at backoff_max seconds, and the throttled request itself is sent again after the pause, up
+    to retries times. rate = 0 and max_concurrent = 0 disable the limits but keep the backoff.
+    Shared by the threads (slot) and asyncio (slot_async) engines.
+    """
+    THROTTLE_STATUSES = (429,) # Plus every 5xx
+
+    def __init__(self, rate: float = 0.0, burst: int = 5, max_concurrent: int = 0, key: str = "host",
+                 backoff_base: float = 1.0, backoff_max: float = 60.0, retries: int = 2, logger: Optional[Logger] = None):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_concurrent = max_concurrent
+        self.key = key
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = max(0, retries)
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Dict[str, float]] = {}
+        self._keys: Dict[str, str] = {}
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._async_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(lambda: {"requests": 0, "waited": 0.0, "throttled": 0})
+
+    @staticmethod
+    def platform(host: str) -> str:
+        """The host's sorted resolved addresses (plus port), or the host itself if it does not resolve."""
+        parts = urlsplit(host)
+        try:
+            infos = socket.getaddrinfo(parts.hostname, parts.port, proto=socket.IPPROTO_TCP)
+        except (OSError, UnicodeError, ValueError):
+            return host
+        return RateLimiter._addresses(infos, parts.port)
+
+    @staticmethod
+    async def platform_async(host: str) -> str:
+        """platform() for the asyncio engine; resolves without blocking the event loop."""
+        parts = urlsplit(host)
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, parts.port, proto=socket.IPPROTO_TCP)
+        except (OSError, UnicodeError, ValueError):
+            return host
+        return RateLimiter._addresses(infos, parts.port)
+
+    @staticmethod
+    def _addresses(infos, port: Optional[int]) -> str:
+        return ",".join(sorted({info[4][0] for info in infos})) + (f":{port}" if port else "")
+
+    def key_for(self, url: str) -> str:
+        host = SessionPool.host_key(url)
+        if self.key != "platform":
+            return host
+        key = self._keys.get(host)
+        if key is None:
+            # Resolved once per host and run (a blocking lookup; the asyncio engine resolves with key_for_async first)
+            key = self._keys.setdefault(host, self.platform(host))
+        return key
+
+    async def key_for_async(self, url: str) -> str:
+        """key_for() for the asyncio engine; a host's first lookup does not block the event loop."""
+        host = SessionPool.host_key(url)
+        if self.key != "platform":
+            return host
+        key = self._keys.get(host)
+        if key is None:
+            key = self._keys.setdefault(host, await self.platform_async(host))
+        return key
+
+    def _bucket(self, key: str, now: float) -> Dict[str, float]:
+        """key's bucket, created full on first use; called with the lock held."""
+        return self._buckets.setdefault(key, {"tokens": float(self.burst), "updated": now, "paused_until": 0.0, "streak": 0})
+
+    def reserve(self, key: str) -> float:
+        """Takes a token for key and returns how long to wait before sending the request."""
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket(key, now)
+            start = max(now, bucket["paused_until"])
+            if self.rate > 0:
+                bucket["tokens"] = min(float(self.burst), bucket["tokens"] + (now - bucket["updated"]) * self.rate)
+                bucket["updated"] = now
+                bucket["tokens"] -= 1 # Goes negative while requests queue up for future tokens
+                if bucket["tokens"] < 0:
+                    start = max(start, now - bucket["tokens"] / self.rate)
+            stats = self._stats[key]
+            stats["requests"] += 1
+            stats["waited"] += start - now
+            return start - now
+
+    def _semaphore(self, key: str) -> Optional[threading.BoundedSemaphore]:
+        if not self.max_concurrent:
+            return None
+        with self._lock:
+            return self._semaphores.setdefault(key, threading.BoundedSemaphore(self.max_concurrent))
+
+    def _async_semaphore(self, key: str) -> Optional[asyncio.Semaphore]:
+        if not self.max_concurrent:
+            return None
+        return self._async_semaphores.setdefault(key, asyncio.Semaphore(self.max_concurrent))
+
+    @contextmanager
+    def slot(self, url: str):
+        """Blocks the calling thread until url's key has a free slot and a token."""
+        key = self.key_for(url)
+        semaphore = self._semaphore(key)
+        if semaphore:
+            semaphore.acquire()
+        try:
+            delay = self.reserve(key)
+            if delay > 0:
+                time.sleep(delay)
+            yield
+        finally:
+            if semaphore:
+                semaphore.release()
+
+    @asynccontextmanager
+    async def slot_async(self, url: str):
+        """slot() for the asyncio engine; waits without blocking the event loop."""
+        key = await self.key_for_async(url)
+        semaphore = self._async_semaphore(key)
+        if semaphore:
+            await semaphore.acquire()
+        try:
+            delay = self.reserve(key)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield
+        finally:
+            if semaphore:
+                semaphore.release()
+
+    @staticmethod
+    def retry_after(value: Optional[str]) -> Optional[float]:
+        """Retry-After in seconds; HTTP-date values are ignored in favour of the backoff."""
+        try:
+            return max(0.0, float(value)) if value else None
+        except ValueError:
+            return None
+
+    def observe(self, url: str, status: int, retry_after: Optional[str] = None) -> bool:
+        """
+        Records a response status: 429/5xx pause url's key, anything below 400 ends the backoff
+        streak. Returns whether the response was throttled, i.e. the request should be retried.
+        """
+        key = self.key_for(url)
+        throttled = status in self.THROTTLE_STATUSES or status >= 500
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket(key, now) # A request sent outside slot() still pauses its key
+            if not throttled:
+                if status < 400:
+                    bucket["streak"] = 0
+                return False
+            bucket["streak"] += 1
+            pause = self.retry_after(retry_after)
+            if pause is None:
+                pause = self.backoff_base * 2 ** (bucket["streak"] - 1)
+            pause = min(pause, self.backoff_max)
+            bucket["paused_until"] = max(bucket["paused_until"], now + pause)
+            self._stats[key]["throttled"] += 1
+        if self.logger:
+            self.logger.emit("throttled", {"url": url, "key": key, "status": status, "pause": round(pause, 2)})
+        return True
+
+    def summary(self) -> Dict[str, Any]:
+        """Requests, seconds waited and throttles per key, busiest waits first, for the rate_limit_summary event."""
+        with self._lock:
+            stats = {key: dict(values) for key, values in self._stats.items()}
+        keys = sorted(stats, key=lambda k: stats[k]["waited"], reverse=True)
+        return {
+            "key": self.key,
+            "requests": sum(s["requests"] for s in stats.values()),
+            "waited_seconds": round(sum(s["waited"] for s in stats.values()), 3),
+            "throttled": sum(s["throttled"] for s in stats.values()),
+            "busiest": [dict(stats[k], key=k, waited=round(stats[k]["waited"], 3)) for k in keys[:5]]
+        }
@@ -0,0 +1,74 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict
+
+RUN_CACHE_DB_PATH = "data/run_metrics_cache.sqlite"
+LEGACY_CACHE_FILE_PATH = "data/run_metrics_cache.json"
+
+class RunMetricsStore:
+    """
+    The run metrics cache (total run count plus each site's last-run and cumulative counts)
+    in SQLite (WAL). Every site's entry is stored as compact JSON in its own row, upserted
+    and committed as soon as the site finishes. An interrupted run keeps everything it
+    finished. A crash cannot leave a half-written cache, and a write costs the same
+    however many sites there are. The first open imports ``run_metrics_cache.json``
+    written by earlier versions.
+    """
+    def __init__(self, path: str = RUN_CACHE_DB_PATH, legacy_json: str = LEGACY_CACHE_FILE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        is_new = not os.path.exists(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS sites (site TEXT PRIMARY KEY, entry TEXT NOT NULL) WITHOUT ROWID;
+        """)
+        if is_new and os.path.exists(legacy_json):
+            self._import_legacy_json(legacy_json)
+
+    def _import_legacy_json(self, legacy_json: str) -> None:
+        try:
+            with open(legacy_json, 'r') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: Could not import cache file '{legacy_json}': {e}. Starting with an empty cache.")
+            return
+        if not isinstance(data, dict) or not isinstance(data.get("sites"), dict):
+            print(f"Warning: Cache file '{legacy_json}' is missing expected keys. Starting with an empty cache.")
+            return
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('total_script_runs', ?)", (int(data.get("total_script_runs", 0)),))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO sites VALUES (?, ?)",
+                ((site, self._encode(entry)) for site, entry in data["sites"].items())
+            )
+
+    @staticmethod
+    def _encode(entry: Dict[str, Any]) -> str:
+        return json.dumps(entry, separators=(",", ":"))
+
+    def load(self) -> Dict[str, Any]:
+        """The whole cache as {"total_script_runs": n, "sites": {site: entry}}."""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'total_script_runs'").fetchone()
+            sites = {site: json.loads(entry) for site, entry in self.conn.execute("SELECT site, entry FROM sites")}
+        return {"total_script_runs": row[0] if row else 0, "sites": sites}
+
+    def record_run(self, total_script_runs: int) -> None:
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('total_script_runs', ?)", (total_script_runs,))
+
+    def put_site(self, site: str, entry: Dict[str, Any]) -> None:
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO sites VALUES (?, ?)", (site, self._encode(entry)))
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,60 @@
+from typing import Any, Dict, List, Optional
+
+class SiteScheduler:
+    """
+    Orders a run's sites by expected yield, from the per-site entries of the run metrics cache.
+
+    A site's score is what it returned last run (bonuses, or downlines in downline mode), plus
+    FLAG_WEIGHTS for each of its C/D/S bonus flags, plus staleness_weight per run since it was
+    last scraped. From that, error_penalty is taken once if its last run failed and once more
+    scaled by the share of its scraped runs that failed, and empty_penalty for every run in a
+    row the site answered with nothing. A failed run is not empty: its errors are penalised
+    already, and it leaves the count of empty runs as it was. Sites without history go first
+    so they get measured; sites that keep coming back empty or failing sink to the end, but
+    their staleness keeps raising them, so a limited or time-boxed run still reaches them
+    eventually.
+    """
+    FLAG_WEIGHTS = {"C": 3.0, "D": 2.0, "S": 2.0}
+
+    def __init__(self, sites: Dict[str, Dict[str, Any]], run: int, downline: bool = False, staleness_weight: float = 1.0, error_penalty: float = 5.0, empty_penalty: float = 1.0):
+        self.sites = sites
+        self.run = run
+        self.downline = downline
+        self.staleness_weight = staleness_weight
+        self.error_penalty = error_penalty
+        self.empty_penalty = empty_penalty
+
+    def score(self, url: str) -> float:
+        entry = self.sites.get(url)
+        if not entry:
+            return float("inf")
+        found = entry.get("last_run_new_downlines" if self.downline else "last_run_new_bonuses", 0)
+        flags = entry.get("bonus_flags", {})
+        score = found + sum(weight for flag, weight in self.FLAG_WEIGHTS.items() if flags.get(flag))
+        score += self.staleness_weight * max(0, self.run - entry.get("last_scraped_run", self.run - 1) - 1)
+        if entry.get("last_run_new_errors", 0):
+            score -= self.error_penalty
+        # Entries written before these counters existed: assume the site ran every earlier run
+        runs_scraped = entry.get("runs_scraped") or max(1, self.run - 1)
+        score -= self.error_penalty * min(1.0, entry.get("cumulative_total_errors", 0) / runs_scraped)
+        score -= self.empty_penalty * entry.get("empty_runs", 0 if found or entry.get("last_run_new_errors", 0) else 1)
+        return score
+
+    @staticmethod
+    def history(entry: Dict[str, Any], found: int, errors: int = 0) -> Dict[str, int]:
+        """
+        The runs_scraped and empty_runs (in a row) counters of a site's cache entry after a run
+        that found found with errors errors; a run that failed and found nothing is not counted as empty.
+        """
+        if found:
+            empty_runs = 0
+        elif errors:
+            empty_runs = entry.get("empty_runs", 0)
+        else:
+            empty_runs = entry.get("empty_runs", 0) + 1
+        return {"runs_scraped": entry.get("runs_scraped", 0) + 1, "empty_runs": empty_runs}
+
+    def order(self, urls: List[str], limit: Optional[int] = None) -> List[str]:
+        """urls from highest to lowest score (file order among equals), cut to the first limit if given."""
+        ranked = sorted(urls, key=self.score, reverse=True)
+        return ranked[:limit] if limit else ranked
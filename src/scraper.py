@@ -0,0 +1,230 @@
+import requests
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union # Union for return types
+from .classifier import BonusClassifier
+from .fingerprints import BonusFingerprints
+from .models import Bonus, AuthData, parse_bonus, parse_downline
+from .logger import Logger
+from .http_pool import SessionPool
+from .host_health import HostHealth
+from .storage import CsvStorage, Storage
+from .timing import PhaseTimings
+
+class Scraper:
+    """Handles scraping of downlines and bonuses."""
+    def __init__(self, logger: Logger, request_timeout: float, session_pool: Optional[SessionPool] = None, storage: Optional[Storage] = None, timings: Optional[PhaseTimings] = None, host_health: Optional[HostHealth] = None, downline_window: int = 1, classifier: Optional[BonusClassifier] = None, fingerprints: Optional[BonusFingerprints] = None):
+        self.logger = logger
+        self.request_timeout = request_timeout
+        self.session_pool = session_pool or SessionPool()
+        # Storage implementations serialise their own writes, so concurrent sites can share one
+        self.storage = storage or CsvStorage(date.today())
+        self.timings = timings or PhaseTimings(logger)
+        self.host_health = host_health
+        # getDownline pages in flight per site: page N+1..N+window-1 are fetched while N is stored
+        self.downline_window = max(1, downline_window)
+        self.classifier = classifier or BonusClassifier()
+        self.fingerprints = fingerprints
+
+    def timeout_for(self, url: str) -> float:
+        return self.host_health.timeout_for(url) if self.host_health else self.request_timeout
+
+    @staticmethod
+    def downline_payload(auth: AuthData, page: int) -> Dict[str, Any]:
+        return {
+            "level": "1",
+            "pageIndex": str(page),
+            "module": "/referrer/getDownline",
+            "merchantId": auth.merchant_id,
+            "domainId": "0",
+            "accessId": auth.access_id,
+            "accessToken": auth.token,
+            "walletIsAdmin": True
+        }
+
+    @staticmethod
+    def bonus_payload(auth: AuthData) -> Dict[str, Any]:
+        return {
+            "module": "/users/syncData", "merchantId": auth.merchant_id, "domainId": "0",
+            "accessId": auth.access_id, "accessToken": auth.token, "walletIsAdmin": ""
+        }
+
+    def log_api_response(self, api_url: str, module: str, res: Dict[str, Any]) -> None:
+        if not self.logger.enabled("api_response"):
+            return
+        response_details = {"url": api_url, "module": module, "status": res.get("status")}
+        if res.get("status") != "SUCCESS":
+            if res.get("message"):
+                response_details["error_message"] = res.get("message")
+            if isinstance(res.get("data"), dict) and res.get("data", {}).get("description"):
+                response_details["error_description"] = res.get("data").get("description")
+            elif isinstance(res.get("data"), str):
+                response_details["error_data_string"] = res.get("data")
+        self.logger.emit("api_response", response_details)
+
+    def process_downline_page(self, url: str, res: Dict[str, Any]) -> int:
+        """Stores the unseen downlines of one page and returns how many were new."""
+        page_rows = [parse_downline(url, d) for d in res["data"].get("downlines", [])]
+
+        if not page_rows:
+            return 0
+        with self.timings.span(url, "storage_write"):
+            new_count = self.storage.add_downlines(page_rows)
+        if new_count:
+            self.logger.emit(self.storage.write_event, {"file": self.storage.target("downlines"), "count": new_count})
+        return new_count
+
+    def process_bonus_response(self, url: str, auth: AuthData, res: Dict[str, Any], account: str = "") -> Union[Tuple[int, float, dict[str, bool]], str]:
+        """Parses a syncData response, stores the bonuses (tagged with account and categories) and flags the categories found."""
+        bonus_type_flags = self.classifier.empty_flags()
+        if res.get("status") != "SUCCESS":
+            self.logger.emit("bonus_api_error", {"url": auth.api_url, "status": res.get("status"), "error_message": res.get("message", "N/A"), "error_data": res.get("data", "N/A")})
+            return "ERROR"
+
+        bonuses_data_raw = res.get("data", {}).get("bonus", []) + res.get("data", {}).get("promotions", [])
+        if not bonuses_data_raw:
+            self.detect_changes(url, account, [])
+            self.logger.emit("bonus_fetched", {"count": 0, "total_amount": 0.0})
+            return 0, 0.0, bonus_type_flags
+
+        parse_started = time.perf_counter()
+        rows_to_write_obj: List[Bonus] = []
+        unparsed_ids: List[str] = [] # Still listed by the site, so not "Used"
+        classify = self.classifier.classify
+        for b_data in bonuses_data_raw:
+            try:
+                categories = classify(b_data.get("name"), str(b_data.get("claimConfig", "")))
+                bonus_instance = parse_bonus(url, auth.merchant_name, account, ",".join(categories), b_data)
+            except (ValueError, TypeError, AttributeError):
+                self.logger.emit("exception", {"error": f"Type error processing bonus data for {url}: {b_data}"})
+                if isinstance(b_data, dict) and b_data.get("id") is not None:
+                    unparsed_ids.append(str(b_data["id"]))
+                continue
+            rows_to_write_obj.append(bonus_instance)
+            for category in categories:
+                bonus_type_flags[category] = True
+        self.timings.record(url, "bonus_parse", time.perf_counter() - parse_started)
+        self.detect_changes(url, account, rows_to_write_obj, unparsed_ids)
+
+        if rows_to_write_obj:
+            with self.timings.span(url, "storage_write"):
+                stored_count = self.storage.add_bonuses(rows_to_write_obj)
+            self.logger.emit(self.storage.write_event, {"file": self.storage.target("bonuses"), "count": stored_count, "already_stored": len(rows_to_write_obj) - stored_count})
+
+        current_fetch_total_amount = sum(b.amount for b in rows_to_write_obj)
+        self.logger.emit("bonus_fetched", {"count": len(rows_to_write_obj), "total_amount": current_fetch_total_amount})
+        return len(rows_to_write_obj), current_fetch_total_amount, bonus_type_flags
+
+    def detect_changes(self, url: str, account: str, bonuses: List[Bonus], unparsed_ids: Sequence[str] = ()) -> None:
+        """Classifies a site's fresh bonuses against the fingerprint store and reports the changes at once."""
+        if not self.fingerprints:
+            return
+        with self.timings.span(url, "change_detection"):
+            changes = self.fingerprints.detect(url, account, bonuses, self.storage.run_date, unparsed_ids)
+        if not changes:
+            return
+        if self.logger.enabled("bonus_change"):
+            for change in changes:
+                self.logger.emit("bonus_change", change)
+        counts = {status: sum(c["status"] == status for c in changes) for status in ("New", "Changed", "Used")}
+        self.logger.emit("bonus_changes", {"url": url, "account": account, **{s.lower(): n for s, n in counts.items()}, "log": self.fingerprints.log_path})
+
+    def fetch_downline_page(self, url: str, auth: AuthData, page: int) -> Union[Dict[str, Any], str]:
+        """One getDownline page as decoded JSON, or an "UNRESPONSIVE"/"ERROR" sentinel."""
+        payload = self.downline_payload(auth, page)
+        if self.logger.enabled("api_request"):
+            self.logger.emit("api_request", {"url": auth.api_url, "module": payload.get("module")})
+        try:
+            with self.timings.span(url, "downline_page"):
+                response = self.session_pool.post(auth.api_url, data=payload, timeout=self.timeout_for(url), site=url)
+                response.raise_for_status()
+                res = response.json()
+            self.log_api_response(auth.api_url, payload.get("module"), res)
+            return res
+        except requests.exceptions.Timeout as e:
+            self.logger.emit("website_unresponsive", {"url": auth.api_url, "error": f"Timeout: {str(e)}"})
+            return "UNRESPONSIVE"
+        except requests.exceptions.ConnectionError as e:
+            self.logger.emit("website_unresponsive", {"url": auth.api_url, "error": f"ConnectionError: {str(e)}"})
+            return "UNRESPONSIVE"
+        except Exception as e: # This includes JSONDecodeError if response is not JSON
+            self.logger.emit("exception", {"error": f"Downline fetch failed for {auth.api_url}: {str(e)}"})
+            return "ERROR"
+
+    def store_downline_page(self, url: str, res: Union[Dict[str, Any], str]) -> Union[int, str]:
+        """New rows stored from one page (0 ends the walk: an empty or already seen page), or a sentinel."""
+        if isinstance(res, str):
+            return res
+        if res.get("status") != "SUCCESS":
+            return "ERROR"
+        return self.process_downline_page(url, res)
+
+    def downlines_fetched(self, url: str, total_new_rows: int, pages: int) -> int:
+        self.logger.emit("downline_fetched", {"count": total_new_rows, "pages": pages, "window": self.downline_window})
+        return total_new_rows
+
+    def fetch_downlines(self, url: str, auth: AuthData) -> Union[int, str]:
+        """
+        Walks the getDownline pages in order until one has no new rows. Pages are stored one
+        append each, in page order. Page 0 is fetched on its own, as a run that finds nothing new
+        stops there; once a page had new rows, up to downline_window pages are requested ahead,
+        and the ones past the last page are discarded.
+        """
+        total_new_rows = self.store_downline_page(url, self.fetch_downline_page(url, auth, 0))
+        if isinstance(total_new_rows, str):
+            return total_new_rows
+        if not total_new_rows: # Nothing new since the last run: one request, no window
+            return self.downlines_fetched(url, 0, 1)
+        page = 1
+        if self.downline_window == 1:
+            while True:
+                new_count = self.store_downline_page(url, self.fetch_downline_page(url, auth, page))
+                if isinstance(new_count, str):
+                    return new_count
+                if not new_count:
+                    return self.downlines_fetched(url, total_new_rows, page + 1)
+                total_new_rows += new_count
+                page += 1
+
+        pool = ThreadPoolExecutor(max_workers=self.downline_window)
+        try:
+            window = deque(pool.submit(self.fetch_downline_page, url, auth, page + offset) for offset in range(self.downline_window))
+            while True:
+                res = window.popleft().result()
+                if not isinstance(res, str) and res.get("status") == "SUCCESS":
+                    # Keep the window full while this page is stored
+                    window.append(pool.submit(self.fetch_downline_page, url, auth, page + self.downline_window))
+                new_count = self.store_downline_page(url, res)
+                if isinstance(new_count, str):
+                    return new_count
+                if not new_count:
+                    return self.downlines_fetched(url, total_new_rows, page + 1)
+                total_new_rows += new_count
+                page += 1
+        finally:
+            # Prefetched pages past the end are never stored; requests already sent just finish
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def fetch_bonuses(self, url: str, auth: AuthData, account: str = "") -> Union[Tuple[int, float, dict[str, bool]], str]:
+        payload = self.bonus_payload(auth)
+        if self.logger.enabled("api_request"):
+            self.logger.emit("api_request", {"url": auth.api_url, "module": payload.get("module")})
+        try:
+            with self.timings.span(url, "sync_data_post"):
+                response = self.session_pool.post(auth.api_url, data=payload, timeout=self.timeout_for(url), site=url)
+                response.raise_for_status()
+                res = response.json()
+            self.log_api_response(auth.api_url, payload.get("module"), res)
+        except requests.exceptions.Timeout as e:
+            self.logger.emit("website_unresponsive", {"url": auth.api_url, "error": f"Timeout: {str(e)}"})
+            return "UNRESPONSIVE"
+        except requests.exceptions.ConnectionError as e:
+            self.logger.emit("website_unresponsive", {"url": auth.api_url, "error": f"ConnectionError: {str(e)}"})
+            return "UNRESPONSIVE"
+        except Exception as e:
+            self.logger.emit("exception", {"error": f"Bonus fetch failed for {auth.api_url}: {str(e)}"})
+            return "ERROR"
+
+        return self.process_bonus_response(url, auth, res, account)
@@ -0,0 +1,348 @@
+import csv
+import io
+import os
+import sqlite3
+import threading
+import time
+import pandas as pd
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import Any, Dict, List, Optional, Set, Tuple
+from .models import Bonus, Downline
+from .dedup_index import DownlineIndex
+from .utils import atomic_write_csv
+
+BONUS_COLUMNS = list(Bonus._fields)
+DOWNLINE_COLUMNS = list(Downline._fields)
+
+class Storage(ABC):
+    """Where scraped Bonus and Downline records are persisted. One instance per run."""
+    write_event = "rows_written"
+
+    def __init__(self, run_date: date):
+        self.run_date = run_date
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def target(self, kind: str) -> str:
+        """Human readable location of the 'bonuses' or 'downlines' records, for logging."""
+
+    @abstractmethod
+    def add_bonuses(self, bonuses: List[Bonus]) -> int:
+        """
+        Stores the bonuses whose (url, account, id) is not already stored for run_date and returns
+        how many that was, so a site scraped again after an interrupted run is not duplicated.
+        """
+
+    @abstractmethod
+    def add_downlines(self, downlines: List[Downline]) -> int:
+        """Stores the downlines not seen before (by url and id) and returns how many that was."""
+
+    @staticmethod
+    def bonus_key(bonus: Bonus) -> Tuple[str, str, str]:
+        return bonus.url, bonus.account or "", str(bonus.id)
+
+    @classmethod
+    def new_bonuses(cls, bonuses: List[Bonus], stored_keys: Set[Tuple[str, str, str]]) -> List[Bonus]:
+        # Only checked against earlier writes: ids repeated within one response are all kept
+        return [b for b in bonuses if cls.bonus_key(b) not in stored_keys]
+
+    @abstractmethod
+    def load_bonuses(self, run_date: date) -> pd.DataFrame:
+        """All bonuses recorded on run_date, with BONUS_COLUMNS; empty if there are none."""
+
+    def commit(self) -> None:
+        """Makes everything added so far durable; called after each site before it is journaled."""
+        pass
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+def daily_bonus_csv_path(run_date: date, data_dir: str = "data") -> str:
+    return os.path.join(data_dir, run_date.strftime("%m-%d bonuses.csv"))
+
+class CsvAppender:
+    """
+    One CSV output kept open for a whole run. The file is opened (and the header written, if it
+    is empty) on the first rows; rows are formatted into a buffer that goes to the file in one
+    write on flush(), or once it exceeds MAX_BUFFER, and is fsynced at most every fsync_interval
+    seconds (and on close). Safe to share between threads.
+    """
+    MAX_BUFFER = 1 << 20 # Characters
+
+    def __init__(self, path: str, columns: List[str], fsync_interval: float = 5.0):
+        self.path = path
+        self.columns = columns
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._last_fsync = time.monotonic()
+
+    def _open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", newline="", encoding="utf-8")
+        if self._file.tell() == 0:
+            self._writer.writerow(self.columns)
+
+    def write(self, records: List[Any]) -> None:
+        """Buffers the records, tuples (Bonus, Downline) with one value per column."""
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._writer.writerows(records)
+            if self._buffer.tell() >= self.MAX_BUFFER:
+                self._flush(fsync=False)
+
+    def _flush(self, fsync: bool) -> None:
+        if self._file is None:
+            return
+        if self._buffer.tell():
+            self._file.write(self._buffer.getvalue())
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        self._file.flush()
+        if fsync or time.monotonic() - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync = time.monotonic()
+
+    def flush(self, fsync: bool = False) -> None:
+        """Hands the buffered rows to the OS; fsyncs too if asked or if fsync_interval has passed."""
+        with self._lock:
+            self._flush(fsync)
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush(fsync=True)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class CsvStorage(Storage):
+    """
+    The original layout: data/<mm-dd> bonuses.csv per day and one downlines.csv deduplicated by
+    DownlineIndex. Both files are written through a CsvAppender kept open for the run; commit()
+    (after every site) writes out the buffered rows, and only then are the new downlines added
+    to the index.
+    """
+    write_event = "csv_written"
+
+    def __init__(self, run_date: date, data_dir: str = "data", downline_file: str = "downlines.csv", fsync_interval: float = 5.0):
+        super().__init__(run_date)
+        self.data_dir = data_dir
+        self.bonus_file = daily_bonus_csv_path(run_date, data_dir)
+        self.downline_file = downline_file
+        self._downline_index: Optional[DownlineIndex] = None
+        self._bonus_keys: Optional[Set[Tuple[str, str, str]]] = None
+        self._bonus_writer = CsvAppender(self.bonus_file, BONUS_COLUMNS, fsync_interval)
+        self._downline_writer = CsvAppender(downline_file, DOWNLINE_COLUMNS, fsync_interval)
+        self._unindexed: Dict[str, Set[str]] = {} # Downline ids written but not yet flushed and indexed, by url
+
+    def target(self, kind: str) -> str:
+        return self.bonus_file if kind == "bonuses" else self.downline_file
+
+    def _load_bonus_keys(self) -> Set[Tuple[str, str, str]]:
+        if not (os.path.exists(self.bonus_file) and os.path.getsize(self.bonus_file) > 0):
+            return set()
+        with open(self.bonus_file, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            rows = list(reader)
+        if reader.fieldnames != BONUS_COLUMNS:
+            # Written by a version with other columns (e.g. before "account"): rewrite it with
+            # the current header so the rows appended now line up, without risking the day's rows
+            atomic_write_csv(self.bonus_file, BONUS_COLUMNS, rows)
+        return {(row["url"], row.get("account") or "", row["id"]) for row in rows}
+
+    def add_bonuses(self, bonuses: List[Bonus]) -> int:
+        with self._lock:
+            if self._bonus_keys is None:
+                self._bonus_keys = self._load_bonus_keys()
+            new_rows = self.new_bonuses(bonuses, self._bonus_keys)
+            if new_rows:
+                self._bonus_writer.write(new_rows)
+                self._bonus_keys.update(self.bonus_key(b) for b in new_rows)
+            return len(new_rows)
+
+    def add_downlines(self, downlines: List[Downline]) -> int:
+        with self._lock:
+            if self._downline_index is None:
+                self._downline_index = DownlineIndex(self.downline_file)
+            by_url: Dict[str, Dict[str, Downline]] = {}
+            for d in downlines:
+                by_url.setdefault(d.url, {}).setdefault(str(d.id), d)
+            new_by_url = {
+                url: self._downline_index.filter_new(url, by_id.keys()) - self._unindexed.get(url, set())
+                for url, by_id in by_url.items()
+            }
+            new_rows = [d for url, by_id in by_url.items() for key, d in by_id.items() if key in new_by_url[url]]
+            if not new_rows:
+                return 0
+            self._downline_writer.write(new_rows)
+            for url, new_ids in new_by_url.items():
+                self._unindexed.setdefault(url, set()).update(new_ids)
+            return len(new_rows)
+
+    def _write_out(self, fsync: bool) -> None:
+        self._bonus_writer.flush(fsync)
+        self._downline_writer.flush(fsync)
+        # Only mark downlines as seen once they are in the CSV
+        if self._downline_index is not None:
+            for url, ids in self._unindexed.items():
+                self._downline_index.add(url, list(ids))
+        self._unindexed.clear()
+
+    def commit(self) -> None:
+        with self._lock:
+            self._write_out(fsync=False)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._write_out(fsync=True)
+
+    def load_bonuses(self, run_date: date) -> pd.DataFrame:
+        path = daily_bonus_csv_path(run_date, self.data_dir)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            return pd.read_csv(path)
+        return pd.DataFrame(columns=BONUS_COLUMNS)
+
+    def close(self) -> None:
+        with self._lock:
+            self._write_out(fsync=True)
+            self._bonus_writer.close()
+            self._downline_writer.close()
+            if self._downline_index is not None:
+                self._downline_index.close()
+                self._downline_index = None
+
+class SqliteStorage(Storage):
+    """
+    Bonuses and downlines in one SQLite database (WAL mode). Inserts go into one transaction
+    that is committed after each site (commit()) and by flush()/close(). Bonuses are indexed by
+    (merchant_name, name, amount), by run_date and by (run_date, url, id), so day-over-day
+    lookups and the duplicate check of add_bonuses are indexed. Bonus columns added since a
+    database was created are added to its table on open.
+    Optionally mirrors the data to the CSV files the rest of the tooling expects.
+    """
+    write_event = "db_written"
+
+    def __init__(self, run_date: date, path: str = "data/scraper.sqlite", export_csv: bool = False, data_dir: str = "data", downline_file: str = "downlines.csv"):
+        super().__init__(run_date)
+        self.path = path
+        self.export_csv = export_csv
+        self.data_dir = data_dir
+        self.downline_file = downline_file
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Transactions are managed explicitly so a whole run is one transaction
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        self._exported_changes = self.conn.total_changes
+        self.conn.execute("BEGIN")
+
+    def _create_schema(self) -> None:
+        bonus_cols = ", ".join(f'"{c}"' for c in BONUS_COLUMNS)
+        self.conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS bonuses (run_date TEXT NOT NULL, {bonus_cols});
+            CREATE INDEX IF NOT EXISTS idx_bonuses_key ON bonuses (merchant_name, name, amount);
+            CREATE INDEX IF NOT EXISTS idx_bonuses_run_date ON bonuses (run_date);
+            CREATE INDEX IF NOT EXISTS idx_bonuses_site ON bonuses (run_date, url, id);
+            CREATE TABLE IF NOT EXISTS downlines (
+                url TEXT NOT NULL, id TEXT NOT NULL, name TEXT, count INTEGER, amount REAL,
+                register_date_time TEXT, first_seen TEXT NOT NULL, PRIMARY KEY (url, id)
+            ) WITHOUT ROWID;
+        """)
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(bonuses)")}
+        for column in BONUS_COLUMNS:
+            if column not in existing:
+                self.conn.execute(f'ALTER TABLE bonuses ADD COLUMN "{column}"')
+
+    def target(self, kind: str) -> str:
+        return f"{self.path}:{kind}"
+
+    def add_bonuses(self, bonuses: List[Bonus]) -> int:
+        columns = ", ".join(f'"{c}"' for c in BONUS_COLUMNS)
+        placeholders = ", ".join("?" * (len(BONUS_COLUMNS) + 1))
+        run_date = self.run_date.isoformat()
+        with self._lock:
+            stored_keys = set()
+            for url in {b.url for b in bonuses}:
+                rows = self.conn.execute("SELECT account, id FROM bonuses WHERE run_date = ? AND url = ?", (run_date, url))
+                stored_keys.update((url, account or "", str(bonus_id)) for account, bonus_id in rows)
+            new_rows = self.new_bonuses(bonuses, stored_keys)
+            self.conn.executemany(
+                f"INSERT INTO bonuses (run_date, {columns}) VALUES ({placeholders})",
+                ((run_date, *b) for b in new_rows)
+            )
+            return len(new_rows)
+
+    def add_downlines(self, downlines: List[Downline]) -> int:
+        first_seen = self.run_date.isoformat()
+        with self._lock:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO downlines VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((d.url, str(d.id), d.name, d.count, d.amount, d.register_date_time, first_seen) for d in downlines)
+            )
+            return self.conn.total_changes - before
+
+    def load_bonuses(self, run_date: date) -> pd.DataFrame:
+        columns = ", ".join(f'"{c}"' for c in BONUS_COLUMNS)
+        with self._lock:
+            return pd.read_sql_query(
+                f"SELECT {columns} FROM bonuses WHERE run_date = ? ORDER BY rowid", self.conn, params=(run_date.isoformat(),)
+            )
+
+    def _commit(self) -> None:
+        with self._lock:
+            if self.conn.in_transaction:
+                self.conn.execute("COMMIT")
+
+    def commit(self) -> None:
+        with self._lock:
+            if self.conn.in_transaction:
+                self.conn.execute("COMMIT")
+            self.conn.execute("BEGIN")
+
+    def flush(self) -> None:
+        self._commit()
+        if self.export_csv:
+            self._export_csv()
+        with self._lock:
+            self.conn.execute("BEGIN")
+
+    def _export_csv(self) -> None:
+        with self._lock:
+            if self.conn.total_changes == self._exported_changes:
+                return
+            self._exported_changes = self.conn.total_changes
+        bonuses = self.load_bonuses(self.run_date)
+        if not bonuses.empty:
+            path = daily_bonus_csv_path(self.run_date, self.data_dir)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            bonuses.to_csv(path, index=False, encoding="utf-8")
+        columns = ", ".join(DOWNLINE_COLUMNS)
+        with self._lock:
+            downlines = pd.read_sql_query(f"SELECT {columns} FROM downlines ORDER BY first_seen, url", self.conn)
+        if not downlines.empty:
+            downlines.to_csv(self.downline_file, index=False, encoding="utf-8")
+
+    def close(self) -> None:
+        self._commit()
+        if self.export_csv:
+            self._export_csv()
+        with self._lock:
+            self.conn.close()
+
+def create_storage(backend: str, run_date: date, sqlite_path: str = "data/scraper.sqlite", export_csv: bool = True, fsync_interval: float = 5.0) -> Storage:
+    if backend == "sqlite":
+        return SqliteStorage(run_date, path=sqlite_path, export_csv=export_csv)
+    return CsvStorage(run_date, fsync_interval=fsync_interval)
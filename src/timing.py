@@ -0,0 +1,98 @@
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from .logger import Logger
+
+class PhaseTimings:
+    """
+    Wall-clock spans of each phase of each site (landing page GET, merchant regex, login
+    POST, syncData POST, downline pages, storage writes, ...). Every span is emitted as a
+    "phase_timing" event; summary() aggregates the run into percentiles per phase and the
+    slowest sites with their per-phase breakdown. Safe to share between worker threads.
+    """
+    def __init__(self, logger: Logger):
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = defaultdict(list)
+        self._sites: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._slowest_requests: Dict[str, float] = {}
+
+    def record(self, site: str, phase: str, seconds: float) -> None:
+        with self._lock:
+            self._samples[phase].append(seconds)
+            self._sites[site][phase] += seconds
+        if self.logger.enabled("phase_timing"):
+            self.logger.emit("phase_timing", {"url": site, "phase": phase, "ms": round(seconds * 1000, 2)})
+
+    @contextmanager
+    def span(self, site: str, phase: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(site, phase, time.perf_counter() - started)
+
+    def record_request(self, site: str, seconds: float) -> None:
+        """
+        Network time of one request attempt of site, from sending it to its response headers.
+        Unlike the phase spans, it leaves out rate limiter waits, throttle pauses and connection pool queueing.
+        """
+        with self._lock:
+            self._slowest_requests[site] = max(seconds, self._slowest_requests.get(site, 0.0))
+
+    def slowest_request(self, site: str) -> Optional[float]:
+        """Longest single request attempt of site so far (see record_request), None if it made none."""
+        with self._lock:
+            return self._slowest_requests.get(site)
+
+    @staticmethod
+    def percentile(sorted_values: List[float], pct: float) -> float:
+        """Nearest-rank percentile of an ascending list."""
+        if not sorted_values:
+            return 0.0
+        rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+        return sorted_values[rank - 1]
+
+    def summary(self, slowest: int = 10) -> Dict[str, Any]:
+        """p50/p95/p99/max (ms) per phase, plus the `slowest` sites by total time spent in their phases."""
+        with self._lock:
+            samples = {phase: sorted(values) for phase, values in self._samples.items()}
+            sites = {site: dict(phases) for site, phases in self._sites.items()}
+        phases = {}
+        for phase, values in sorted(samples.items()):
+            phases[phase] = {
+                "count": len(values),
+                "p50_ms": round(self.percentile(values, 50) * 1000, 1),
+                "p95_ms": round(self.percentile(values, 95) * 1000, 1),
+                "p99_ms": round(self.percentile(values, 99) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1),
+                "total_ms": round(sum(values) * 1000, 1),
+            }
+        ranked = sorted(sites.items(), key=lambda item: item[1].get("site_total", sum(item[1].values())), reverse=True)
+        slowest_sites = [
+            {
+                "url": site,
+                "total_ms": round(site_phases.get("site_total", sum(site_phases.values())) * 1000, 1),
+                "phases_ms": {phase: round(seconds * 1000, 1) for phase, seconds in site_phases.items() if phase != "site_total"},
+            }
+            for site, site_phases in ranked[:slowest]
+        ]
+        return {"phases": phases, "slowest_sites": slowest_sites}
+
+    @staticmethod
+    def format_report(summary: Dict[str, Any]) -> str:
+        if not summary["phases"]:
+            return "No phase timings recorded."
+        lines = [f"{'Phase':<16}{'Count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for phase, stats in summary["phases"].items():
+            lines.append(f"{phase:<16}{stats['count']:>8}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+        lines.append("")
+        lines.append("Slowest sites:")
+        for site in summary["slowest_sites"]:
+            top_phases = sorted(site["phases_ms"].items(), key=lambda item: item[1], reverse=True)[:3]
+            breakdown = ", ".join(f"{phase} {ms:.0f}ms" for phase, ms in top_phases)
+            lines.append(f"  {site['total_ms']:>9.0f}ms  {site['url']}  ({breakdown})")
+        return "\n".join(lines)
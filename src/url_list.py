@@ -0,0 +1,105 @@
+import json
+import os
+import re
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from .models import SiteEntry
+from .utils import atomic_write_json
+
+URL_LIST_CACHE_PATH = "data/url_list_cache.json"
+REFERRAL_SEGMENT = re.compile(r"^\w+$") # Same rule AuthService.clean_url strips
+HOST_NAME = re.compile(r"^[a-z0-9_.-]+$")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def normalize_url(line: str) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    (merchant endpoint, referral code) for one urls.txt line, or None if it is not a URL.
+    The scheme defaults to https, scheme and host are lower-cased, default ports, query and
+    fragment are dropped, and a trailing word-only path segment is taken as the referral code.
+    """
+    line = line.strip()
+    if "://" not in line:
+        line = f"https://{line}"
+    try:
+        parts = urlsplit(line)
+        port = parts.port
+    except ValueError:
+        return None
+    if not parts.hostname or not HOST_NAME.match(parts.hostname):
+        return None
+    scheme = parts.scheme.lower()
+    netloc = parts.hostname.lower()
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{port}"
+    segments = [segment for segment in parts.path.split("/") if segment]
+    referral = segments.pop() if segments and REFERRAL_SEGMENT.match(segments[-1]) else None
+    path = "".join(f"/{segment}" for segment in segments)
+    return f"{scheme}://{netloc}{path}", referral
+
+class UrlList:
+    """
+    The sites of a URL file, normalized and deduplicated to one SiteEntry per merchant
+    endpoint in first-seen order, with every referral code and line number that mapped to
+    it. The parsed result is cached in ``URL_LIST_CACHE_PATH`` and reused while the file's
+    path, size and mtime are unchanged.
+    """
+    def __init__(self, url_file: str, cache_path: str = URL_LIST_CACHE_PATH):
+        self.url_file = url_file
+        self.cache_path = cache_path
+
+    @staticmethod
+    def parse(lines: List[str]) -> Dict[str, Any]:
+        sites: Dict[str, SiteEntry] = {}
+        invalid: List[str] = []
+        entries = 0
+        for number, line in enumerate(lines, 1):
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            entries += 1
+            normalized = normalize_url(line)
+            if normalized is None:
+                invalid.append(line.strip())
+                continue
+            endpoint, referral = normalized
+            site = sites.setdefault(endpoint, SiteEntry(url=endpoint))
+            site.lines.append(number)
+            if referral and referral not in site.referral_codes:
+                site.referral_codes.append(referral)
+        return {"entries": entries, "invalid": invalid, "sites": list(sites.values())}
+
+    def _fingerprint(self) -> Dict[str, Any]:
+        stat = os.stat(self.url_file)
+        return {"file": os.path.abspath(self.url_file), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def _cached(self, fingerprint: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.cache_path, 'r') as f:
+                cached = json.load(f)
+            if cached.get("fingerprint") != fingerprint:
+                return None
+            return dict(cached["parsed"], sites=[SiteEntry(**site) for site in cached["parsed"]["sites"]])
+        except (OSError, json.JSONDecodeError, KeyError, TypeError, AttributeError):
+            return None
+
+    def load(self) -> Dict[str, Any]:
+        """
+        {"entries": non-blank lines, "invalid": lines that are not URLs, "sites": [SiteEntry],
+        "cached": whether the cache was used}; no sites if the file is missing.
+        """
+        if not os.path.exists(self.url_file):
+            return {"entries": 0, "invalid": [], "sites": [], "cached": False}
+        fingerprint = self._fingerprint()
+        parsed = self._cached(fingerprint)
+        if parsed is not None:
+            return dict(parsed, cached=True)
+        with open(self.url_file, "r") as f:
+            parsed = self.parse(f.readlines())
+        try:
+            atomic_write_json(self.cache_path, {
+                "fingerprint": fingerprint,
+                "parsed": dict(parsed, sites=[asdict(site) for site in parsed["sites"]])
+            }, separators=(",", ":"))
+        except OSError as e:
+            print(f"Warning: Could not save URL list cache '{self.cache_path}': {e}")
+        return dict(parsed, cached=False)
@@ -1,50 +1,46 @@
 import sys
+import csv
 import math
 import json
 import os
+import tempfile
 
-CACHE_FILE_PATH = "data/run_metrics_cache.json"
-
-def load_run_cache():
+def atomic_write_json(path, data, **dump_kwargs):
     """
-    Loads run metrics cache from a JSON file.
-    Returns default structure if file not found or JSON is invalid.
+    Writes JSON to a temp file in the target directory and renames it over the target,
+    so a crash mid-write leaves the previous file intact instead of a truncated one.
     """
-    default_cache = {"total_script_runs": 0, "sites": {}}
-    if not os.path.exists(CACHE_FILE_PATH):
-        print(f"Info: Cache file '{CACHE_FILE_PATH}' not found. Returning default cache.")
-        return default_cache
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
     try:
-        with open(CACHE_FILE_PATH, 'r') as f:
-            data = json.load(f)
-            # Basic validation for expected top-level keys
-            if "total_script_runs" not in data or "sites" not in data:
-                print(f"Warning: Cache file '{CACHE_FILE_PATH}' is missing expected keys. Returning default cache.")
-                return default_cache
-            return data
-    except FileNotFoundError: # Should be caught by os.path.exists, but good for robustness
-        print(f"Info: Cache file '{CACHE_FILE_PATH}' not found (FileNotFoundError). Returning default cache.")
-        return default_cache
-    except json.JSONDecodeError:
-        print(f"Warning: Cache file '{CACHE_FILE_PATH}' contains invalid JSON. Returning default cache.")
-        return default_cache
-    except Exception as e:
-        print(f"Warning: An unexpected error occurred while loading cache file '{CACHE_FILE_PATH}': {e}. Returning default cache.")
-        return default_cache
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, **dump_kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
-def save_run_cache(data):
-    """
-    Saves run metrics cache to a JSON file.
-    Ensures the directory exists.
-    """
+def atomic_write_csv(path, fieldnames, rows):
+    """atomic_write_json() for a CSV of dict rows; keys missing from a row are written empty, extra keys dropped."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".csv")
     try:
-        os.makedirs(os.path.dirname(CACHE_FILE_PATH), exist_ok=True)
-        with open(CACHE_FILE_PATH, 'w') as f:
-            json.dump(data, f, indent=4)
-    except Exception as e:
-        # In a real app, this might go to a logger if available
-        print(f"Error: Could not save cache file '{CACHE_FILE_PATH}': {e}")
-
+        with os.fdopen(fd, 'w', newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, restval="", extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
 def progress(value, length=40, title=" ", vmin=0.0, vmax=1.0):
     """
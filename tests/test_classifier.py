@@ -0,0 +1,59 @@
+import random
+import pytest
+from src.classifier import DEFAULT_CATEGORIES, OTHER, BonusClassifier
+
+def keyword_scan(categories: dict, name, claim_config) -> tuple:
+    """The per-keyword scan BonusClassifier replaced: a category matches if any of its keywords is in the name or claim config."""
+    name_lower = name.lower() if name else ""
+    claim_lower = claim_config.lower() if claim_config else ""
+    found = tuple(
+        category for category, keywords in categories.items()
+        if any(k.lower() in name_lower or k.lower() in claim_lower for k in keywords if k)
+    )
+    return found or (OTHER,)
+
+BONUSES = [
+    ("Daily Commission", "claim once a day"),
+    ("AFFILIATE reward", ""),
+    ("Downline First Deposit Bonus", None),
+    ("Share Bonus", "referrer gets 10%"),
+    ("Welcome", "commission on downline first deposit"),
+    ("Weekly Rebate", "none"),
+    ("", ""),
+    (None, None),
+    ("share bonuses", "Affiliate+commission"),
+]
+
+# Keywords nested in other keywords, overlapping matches and a keyword shared by two categories
+NESTED = {
+    "A": ["first deposit", "deposit"],
+    "B": ["downline first deposit"],
+    "C": ["bonus", "share bonus"],
+    "D": ["sharebonus", "bonus"],
+    "E": ["on dep"],
+}
+
+@pytest.mark.parametrize("name, claim_config", BONUSES)
+def test_default_categories_match_keyword_scan(name, claim_config):
+    assert BonusClassifier().classify(name, claim_config) == keyword_scan(DEFAULT_CATEGORIES, name, claim_config)
+
+@pytest.mark.parametrize("name, claim_config", BONUSES + [
+    ("Downline first deposit", ""), ("sharebonus", ""), ("commission on deposit", ""), ("Share Bonus", ""),
+])
+def test_nested_keywords_match_keyword_scan(name, claim_config):
+    assert BonusClassifier(NESTED).classify(name, claim_config) == keyword_scan(NESTED, name, claim_config)
+
+def test_random_text_matches_keyword_scan():
+    rng = random.Random(7)
+    words = ["downline", "first", "deposit", "share", "bonus", "sharebonus", "commission", "referrer", "on", "dep", "x"]
+    classifiers = [(DEFAULT_CATEGORIES, BonusClassifier()), (NESTED, BonusClassifier(NESTED))]
+    for _ in range(2000):
+        name = " ".join(rng.choices(words, k=rng.randint(0, 5)))
+        claim_config = "".join(rng.choices(words, k=rng.randint(0, 3)))
+        for categories, classifier in classifiers:
+            assert classifier.classify(name, claim_config) == keyword_scan(categories, name, claim_config)
+
+def test_no_keywords():
+    classifier = BonusClassifier({"C": [], "S": [""]})
+    assert classifier.classify("Share Bonus", "commission") == (OTHER,)
+    assert classifier.empty_flags() == {"C": False, "S": False, OTHER: False}
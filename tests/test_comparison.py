@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+from src.comparison import compare_bonuses
+from src.storage import BONUS_COLUMNS
+
+# The columns a day had before accounts and categories were added, which the original report diffed
+LEGACY_COLUMNS = [c for c in BONUS_COLUMNS if c not in ('account', 'categories')]
+KEY_COLUMNS = ['merchant_name', 'name', 'amount']
+
+def iterrows_report(today_df: pd.DataFrame, yesterday_df: pd.DataFrame) -> pd.DataFrame:
+    """The row-by-row comparison compare_bonuses replaced, as it was in main.py."""
+    def prepare(df):
+        df = df.copy()
+        for col in LEGACY_COLUMNS:
+            if col not in df.columns: df[col] = pd.NA
+        df = df[LEGACY_COLUMNS]
+        for col in KEY_COLUMNS:
+            if col == 'amount':
+                df[col] = pd.to_numeric(df[col], errors='coerce').round(5)
+            else:
+                df[col] = df[col].astype(str).fillna('')
+        df = df.dropna(subset=KEY_COLUMNS)
+        df['_comparison_key'] = df['merchant_name'] + "_" + df['name'] + "_" + df['amount'].astype(str)
+        return df
+
+    merged = pd.merge(prepare(today_df), prepare(yesterday_df), on='_comparison_key', how='outer', suffixes=('_today', '_yesterday'), indicator=True)
+    rows = []
+    for _, row in merged.iterrows():
+        if row['_merge'] == 'left_only':
+            rows.append({'status': 'New', 'change_details': '', **{c: row[c + '_today'] for c in LEGACY_COLUMNS}})
+        elif row['_merge'] == 'right_only':
+            rows.append({'status': 'Used', 'change_details': '', **{c: row[c + '_yesterday'] for c in LEGACY_COLUMNS}})
+        else:
+            changes = []
+            for col in LEGACY_COLUMNS:
+                val_t, val_y = row[col + '_today'], row[col + '_yesterday']
+                if pd.isna(val_t) and pd.isna(val_y):
+                    continue
+                if pd.isna(val_t) or pd.isna(val_y) or str(val_t) != str(val_y):
+                    if isinstance(val_t, float) or isinstance(val_y, float):
+                        if round(pd.to_numeric(val_t, errors='coerce'), 5) == round(pd.to_numeric(val_y, errors='coerce'), 5):
+                            continue
+                    changes.append(f"{col}: '{val_y}' -> '{val_t}'")
+            status = 'Persistent_Changed' if changes else 'Persistent_Unchanged'
+            rows.append({'status': status, 'change_details': "; ".join(changes), **{c: row[c + '_today'] for c in LEGACY_COLUMNS}})
+    return pd.DataFrame(rows, columns=['status', 'change_details'] + LEGACY_COLUMNS)
+
+def bonus_row(merchant: str, name: str, amount, **fields) -> dict:
+    row = {
+        'url': f"https://{merchant}.example", 'merchant_name': merchant, 'id': f"{merchant}-{name}", 'name': name,
+        'transaction_type': 'BONUS', 'bonus_fixed': 10.0, 'amount': amount, 'min_withdraw': 50.0, 'max_withdraw': 500.0,
+        'withdraw_to_bonus_ratio': 5.0, 'rollover': 3.0, 'balance': '0', 'claim_config': 'daily',
+        'claim_condition': 'none', 'bonus': '', 'bonus_random': '', 'reset': 'DAILY', 'min_topup': 0.0,
+        'max_topup': 0.0, 'refer_link': '',
+    }
+    row.update(fields)
+    return row
+
+def representative_days():
+    """Two days with new, used, unchanged and changed bonuses, missing values and mixed types."""
+    yesterday = [
+        bonus_row('alpha', 'Daily', 10.0),
+        bonus_row('alpha', 'Weekly', 25.0, rollover=5.0),
+        bonus_row('alpha', 'Gone', 1.0),
+        bonus_row('beta', 'Share Bonus', 12.345678, min_withdraw=100.0, claim_config=np.nan),
+        bonus_row('beta', 'Referrer', 3.0, balance=7, reset=None),
+        bonus_row('gamma', 'Tiny', 0.1 + 0.2, withdraw_to_bonus_ratio=np.nan, max_withdraw=500.000001),
+        bonus_row('gamma', 'No Amount', np.nan),
+    ]
+    today = [
+        bonus_row('alpha', 'Daily', 10),
+        bonus_row('alpha', 'Weekly', 25.0, rollover=8.0, claim_condition='vip only'),
+        bonus_row('beta', 'Share Bonus', 12.3456781, min_withdraw='100', claim_config='weekly'),
+        bonus_row('beta', 'Referrer', 3.0, balance='7', reset='NEVER'),
+        bonus_row('gamma', 'Tiny', 0.3, withdraw_to_bonus_ratio=np.nan, max_withdraw=500.0),
+        bonus_row('gamma', 'Fresh', '4.5'),
+        bonus_row('delta', 'Commission', 2.0, bonus_fixed=np.nan),
+    ]
+    return pd.DataFrame(today), pd.DataFrame(yesterday)
+
+def test_matches_iterrows_report():
+    today, yesterday = representative_days()
+    expected = iterrows_report(today, yesterday)
+    report = compare_bonuses(today, yesterday)[['status', 'change_details'] + LEGACY_COLUMNS]
+    assert report.to_csv(index=False) == expected.to_csv(index=False)
+
+def test_statuses():
+    today, yesterday = representative_days()
+    report = compare_bonuses(today, yesterday).set_index(['merchant_name', 'name'])
+    assert report.loc[('alpha', 'Daily'), 'status'] == 'Persistent_Unchanged'
+    assert report.loc[('alpha', 'Weekly'), 'change_details'] == "rollover: '5.0' -> '8.0'; claim_condition: 'none' -> 'vip only'"
+    assert report.loc[('alpha', 'Gone'), 'status'] == 'Used'
+    assert report.loc[('gamma', 'Fresh'), 'status'] == 'New'
+    assert ('gamma', 'No Amount') not in report.index
+
+def test_one_side_empty():
+    today, yesterday = representative_days()
+    for today_df, yesterday_df in ((today, pd.DataFrame()), (pd.DataFrame(), yesterday)):
+        expected = iterrows_report(today_df, yesterday_df)
+        report = compare_bonuses(today_df, yesterday_df)[['status', 'change_details'] + LEGACY_COLUMNS]
+        assert report.to_csv(index=False) == expected.to_csv(index=False)
+    assert compare_bonuses(pd.DataFrame(), pd.DataFrame()).empty
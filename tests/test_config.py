@@ -0,0 +1,29 @@
+import pytest
+from src.config import ConfigLoader
+
+CONFIG = """
+[credentials]
+mobile = 1
+password = p
+[settings]
+file = urls.txt
+workers = {workers}
+[logging]
+log_file = logs/scrape.log
+log_level = INFO
+"""
+
+def load(tmp_path, workers: str):
+    path = tmp_path / "config.ini"
+    path.write_text(CONFIG.format(workers=workers))
+    return ConfigLoader(str(path)).load()
+
+def test_typed_values(tmp_path):
+    config = load(tmp_path, "8")
+    assert config.settings.workers == 8
+    assert config.http.timeout == 30.0 # Sections left out fall back to their defaults
+
+def test_invalid_number_is_a_configuration_error(tmp_path):
+    with pytest.raises(SystemExit) as error:
+        load(tmp_path, "eight")
+    assert str(error.value) == "Configuration error: [settings] workers must be a whole number, not 'eight'"
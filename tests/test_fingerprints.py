@@ -0,0 +1,48 @@
+from datetime import date
+from src.fingerprints import BonusFingerprints
+from src.logger import Logger
+from src.models import AuthData, parse_bonus
+from src.scraper import Scraper
+from src.storage import CsvStorage
+
+URL = "https://alpha.example"
+
+def bonus(bonus_id: str, amount: float = 10.0):
+    return parse_bonus(URL, "Alpha", "main", "O", {"id": bonus_id, "name": f"Bonus {bonus_id}", "amount": amount})
+
+def test_new_changed_and_used(tmp_path):
+    fingerprints = BonusFingerprints(str(tmp_path / "fp.sqlite"), str(tmp_path / "changes.jsonl"))
+    first = fingerprints.detect(URL, "main", [bonus("1"), bonus("2")], date(2024, 1, 1))
+    assert [(c["status"], c["id"]) for c in first] == [("New", "1"), ("New", "2")]
+    second = fingerprints.detect(URL, "main", [bonus("1", 20.0)], date(2024, 1, 2))
+    assert [(c["status"], c["id"], c["change_details"]) for c in second] == [
+        ("Changed", "1", "amount: '10.0' -> '20.0'"), ("Used", "2", ""),
+    ]
+    assert fingerprints.detect(URL, "main", [bonus("1", 20.0)], date(2024, 1, 3)) == []
+    fingerprints.close()
+
+def test_unparsed_bonus_is_not_used(tmp_path):
+    fingerprints = BonusFingerprints(str(tmp_path / "fp.sqlite"), str(tmp_path / "changes.jsonl"))
+    fingerprints.detect(URL, "main", [bonus("1"), bonus("2")], date(2024, 1, 1))
+    # Bonus 2 is still listed but fails to parse: it keeps its state instead of being "Used"
+    assert fingerprints.detect(URL, "main", [bonus("1")], date(2024, 1, 2), unparsed_ids=["2"]) == []
+    # Parsed again the next day, it is unchanged rather than "New"
+    assert fingerprints.detect(URL, "main", [bonus("1"), bonus("2")], date(2024, 1, 3)) == []
+    assert fingerprints.counts == {"New": 2, "Changed": 0, "Used": 0}
+    fingerprints.close()
+
+def test_scraper_passes_unparsed_bonuses_to_detect(tmp_path):
+    fingerprints = BonusFingerprints(str(tmp_path / "fp.sqlite"), str(tmp_path / "changes.jsonl"))
+    storage = CsvStorage(date(2024, 1, 1), data_dir=str(tmp_path), downline_file=str(tmp_path / "downlines.csv"))
+    scraper = Scraper(Logger(str(tmp_path / "scrape.log"), "INFO", False, "LESS"), 5.0, storage=storage, fingerprints=fingerprints)
+    auth = AuthData("1", "Alpha", "a", "t", URL + "/api")
+
+    def sync(*bonuses):
+        return scraper.process_bonus_response(URL, auth, {"status": "SUCCESS", "data": {"bonus": list(bonuses)}}, "main")
+
+    sync({"id": "1", "name": "Daily", "amount": 5}, {"id": "2", "name": "Weekly", "amount": 9})
+    count, _, _ = sync({"id": "1", "name": "Daily", "amount": 5}, {"id": "2", "name": "Weekly", "amount": "n/a"})
+    assert count == 1
+    assert fingerprints.counts == {"New": 2, "Changed": 0, "Used": 0}
+    storage.close()
+    fingerprints.close()
@@ -0,0 +1,75 @@
+import pytest
+from src.models import Bonus, Downline, parse_bonus, parse_downline
+
+URL = "https://alpha.example"
+
+def constructor_bonus(url: str, merchant_name: str, account: str, categories: str, b: dict) -> Bonus:
+    """How the scraper built a Bonus before parse_bonus."""
+    bonus_f = float(b.get("bonusFixed", 0) or 0)
+    min_w = float(b.get("minWithdraw", 0) or 0)
+    return Bonus(
+        url=url, merchant_name=merchant_name, id=b.get("id"), name=b.get("name"),
+        transaction_type=b.get("transactionType"), bonus_fixed=bonus_f,
+        amount=float(b.get("amount", 0) or 0), min_withdraw=min_w,
+        max_withdraw=float(b.get("maxWithdraw", 0) or 0),
+        withdraw_to_bonus_ratio=min_w / bonus_f if bonus_f != 0 else None,
+        rollover=float(b.get("rollover", 0) or 0), balance=str(b.get("balance", "")),
+        claim_config=str(b.get("claimConfig", "")), claim_condition=str(b.get("claimCondition", "")),
+        bonus=str(b.get("bonus", "")), bonus_random=str(b.get("bonusRandom", "")),
+        reset=str(b.get("reset", "")), min_topup=float(b.get("minTopup", 0) or 0),
+        max_topup=float(b.get("maxTopup", 0) or 0), refer_link=str(b.get("referLink", "")),
+        account=account, categories=categories,
+    )
+
+def constructor_downline(url: str, d: dict) -> Downline:
+    """How the scraper built a Downline before parse_downline."""
+    return Downline(
+        url=url, id=d.get("id"), name=d.get("name"), count=d.get("count", 0),
+        amount=float(d.get("amount", 0) or 0), register_date_time=d.get("registerDateTime"),
+    )
+
+BONUSES = [
+    {
+        "id": 101, "name": "Daily Commission", "transactionType": "BONUS", "bonusFixed": 10, "amount": "12.5",
+        "minWithdraw": 50, "maxWithdraw": 500.0, "rollover": 3, "balance": 0, "claimConfig": "daily",
+        "claimCondition": "none", "bonus": True, "bonusRandom": None, "reset": "DAILY", "minTopup": "20",
+        "maxTopup": 1000, "referLink": "https://alpha.example/r/1",
+    },
+    {"id": "102", "name": "Share Bonus", "bonusFixed": 0, "minWithdraw": 30}, # No ratio without a fixed bonus
+    {"id": "103", "name": None, "bonusFixed": "", "amount": None, "rollover": 0.0, "maxTopup": "1e3"},
+    {},
+]
+BAD_BONUSES = [{"amount": "n/a"}, {"bonusFixed": "ten"}, {"rollover": [1]}, {"minTopup": {"value": 20}}]
+
+DOWNLINES = [
+    {"id": "d1", "name": "alice", "count": 3, "amount": "15.75", "registerDateTime": "2024-01-01 10:00:00"},
+    {"id": 2, "name": "bob", "amount": None},
+    {},
+]
+
+@pytest.mark.parametrize("data", BONUSES)
+def test_parse_bonus_matches_constructor(data):
+    parsed = parse_bonus(URL, "Alpha", "main", "C", data)
+    expected = constructor_bonus(URL, "Alpha", "main", "C", data)
+    assert parsed == expected
+    assert [type(v) for v in parsed] == [type(v) for v in expected]
+
+@pytest.mark.parametrize("data", BAD_BONUSES)
+def test_parse_bonus_raises_like_constructor(data):
+    with pytest.raises((ValueError, TypeError)) as expected:
+        constructor_bonus(URL, "Alpha", "", "", data)
+    with pytest.raises(expected.type):
+        parse_bonus(URL, "Alpha", "", "", data)
+
+@pytest.mark.parametrize("data", DOWNLINES)
+def test_parse_downline_matches_constructor(data):
+    parsed = parse_downline(URL, data)
+    expected = constructor_downline(URL, data)
+    assert parsed == expected
+    assert [type(v) for v in parsed] == [type(v) for v in expected]
+
+def test_parse_downline_raises_like_constructor():
+    with pytest.raises(ValueError):
+        constructor_downline(URL, {"amount": "lots"})
+    with pytest.raises(ValueError):
+        parse_downline(URL, {"amount": "lots"})
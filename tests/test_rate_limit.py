@@ -0,0 +1,21 @@
+import asyncio
+from src.rate_limit import RateLimiter
+
+URL = "http://127.0.0.1:8080/site0"
+
+def test_throttle_pauses_a_key_without_a_bucket():
+    limiter = RateLimiter(backoff_base=0.5, backoff_max=1.0)
+    assert limiter.observe(URL, 429)
+    assert 0.4 < limiter.reserve(limiter.key_for(URL)) <= 0.5
+
+def test_retry_after_and_streak_reset():
+    limiter = RateLimiter(backoff_base=0.5, backoff_max=10.0)
+    assert limiter.observe(URL, 503, "2")
+    assert 1.9 < limiter.reserve(limiter.key_for(URL)) <= 2.0
+    assert not limiter.observe(URL, 200)
+    assert not limiter.observe(URL, 404)
+
+def test_platform_key_resolves_on_the_loop():
+    limiter = RateLimiter(key="platform")
+    key = asyncio.run(limiter.key_for_async(URL))
+    assert key == "127.0.0.1:8080" == limiter.key_for(URL) == RateLimiter.platform("http://127.0.0.1:8080")
@@ -0,0 +1,16 @@
+from src.scheduler import SiteScheduler
+
+def test_empty_runs_count_only_runs_that_answered():
+    entry = {"runs_scraped": 4, "empty_runs": 2}
+    assert SiteScheduler.history(entry, found=0) == {"runs_scraped": 5, "empty_runs": 3}
+    assert SiteScheduler.history(entry, found=0, errors=1) == {"runs_scraped": 5, "empty_runs": 2}
+    assert SiteScheduler.history(entry, found=7, errors=1) == {"runs_scraped": 5, "empty_runs": 0}
+    assert SiteScheduler.history({}, found=0, errors=1) == {"runs_scraped": 1, "empty_runs": 0}
+
+def test_failed_run_is_not_charged_the_empty_penalty():
+    failed = {"last_run_new_bonuses": 0, "last_run_new_errors": 1, "cumulative_total_errors": 1, "runs_scraped": 10, "last_scraped_run": 10}
+    empty = {"last_run_new_bonuses": 0, "last_run_new_errors": 0, "cumulative_total_errors": 0, "runs_scraped": 10, "last_scraped_run": 10}
+    scheduler = SiteScheduler({"failed": failed, "empty": empty, "legacy": {k: v for k, v in failed.items() if k != "runs_scraped"}}, run=11)
+    assert scheduler.score("failed") == -5.0 - 5.0 * 0.1
+    assert scheduler.score("empty") == -1.0
+    assert scheduler.score("legacy") == -5.0 - 5.0 * 0.1
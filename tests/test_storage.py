@@ -0,0 +1,24 @@
+import csv
+from datetime import date
+from src.models import parse_bonus
+from src.storage import BONUS_COLUMNS, CsvStorage
+
+LEGACY_COLUMNS = [c for c in BONUS_COLUMNS if c not in ("account", "categories")]
+
+def test_legacy_bonus_csv_is_rewritten_with_the_current_header(tmp_path):
+    storage = CsvStorage(date(2024, 1, 2), data_dir=str(tmp_path), downline_file=str(tmp_path / "downlines.csv"))
+    with open(storage.bonus_file, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=LEGACY_COLUMNS)
+        writer.writeheader()
+        writer.writerow(dict.fromkeys(LEGACY_COLUMNS, "") | {"url": "https://alpha.example", "id": "1", "name": "Old"})
+
+    bonuses = [parse_bonus("https://alpha.example", "Alpha", "main", "O", {"id": "2", "name": "New"})]
+    assert storage.add_bonuses(bonuses) == 1
+    storage.commit()
+
+    with open(storage.bonus_file, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
+    assert reader.fieldnames == BONUS_COLUMNS
+    assert [(row["id"], row["account"]) for row in rows] == [("1", ""), ("2", "main")]
+    assert [p.name for p in tmp_path.iterdir() if p.name.startswith(".tmp-")] == []